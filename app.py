@@ -1,16 +1,49 @@
 import os
+from datetime import datetime, timezone
+import json
+import contextvars
+import hmac
+import threading
 import time
-from flask import Flask, render_template, request, jsonify, session
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 import requests
-from collections import defaultdict
 import firebase_admin
 from firebase_admin import credentials, firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
 
-from utils.scraper import detect_topic_and_scrape
-from utils.ollama_client import ask_ollama, check_ollama_connection
+from utils.scraper import classify_and_scrape, scrape_cache_stats
+from utils.ollama_client import check_ollama_connection
+from utils.model_router import ask_model, ask_model_stream, router as model_router
+from utils.intent_classifier import get_model as warm_intent_model, rank_locally
+from utils.http_client import outbound_stats
+from utils.firebase_auth import verify_firebase_user
+from utils.conversation_store import (
+    delete_conversation_messages,
+    get_messages_page,
+    get_recent_messages,
+    get_conversation_list,
+    get_conversation_state,
+    queue_messages,
+    write_journal_turns,
+    cache_conversation_created,
+    cache_conversation_updated,
+    cache_conversation_deleted,
+    cache_conversation_state,
+    cache_conversation_turn,
+    conversation_cache_stats,
+    CONVERSATION_TAIL_MESSAGES,
+    DEFAULT_PAGE_SIZE,
+)
+from utils.context_builder import build_chat_context, update_summary_in_background
+from utils.rate_limit import create_backend, SlidingWindowCounter, LoginLockout
+from utils.answer_cache import answer_cache
+from utils.search_tool import search_cache
+from utils.prefetch import PREFETCH_MODE, scheduler as prefetch_scheduler, snapshot_stats
+from utils.metrics import REQUEST_SECONDS, registry, server_timing_header, stage, start_request
+from utils.turn_journal import turn_journal
+from utils.deadline import CHAT_LLM_RESERVE, remaining, start_deadline
 
 load_dotenv()
 
@@ -31,17 +64,67 @@ except Exception as e:
     print(f"❌ Error al inicializar Firebase Admin: {e}")
     print("   El servidor continuará sin Firebase.")
 
+# Entrenamos el clasificador de intención local en segundo plano al arrancar
+threading.Thread(target=warm_intent_model, daemon=True).start()
+
+
+def write_pending_turns(turns):
+    """Escritor del journal de turnos: los manda a Firestore en batches."""
+    write_journal_turns(db, turns)
+
+
+# Los turnos se guardan primero en el journal local; este hilo los lleva a
+# Firestore (y al arrancar reenvía los que quedaron pendientes)
+if turn_journal is not None and firebase_initialized:
+    turn_journal.start(write_pending_turns)
+
+# Las capturas de los scrapers se refrescan en segundo plano (o en scripts/prefetch_worker.py)
+if PREFETCH_MODE == 'inline':
+    prefetch_scheduler.start()
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
-CORS(app)
+# asgi.py aplica las mismas opciones a las rutas de chat que atiende sin Flask
+CORS_OPTIONS = {}
+CORS(app, **CORS_OPTIONS)
 
-rate_limit_tracker = defaultdict(list)
-login_attempts = {}
 RATE_LIMIT_WINDOW = 60
 RATE_LIMIT_MAX_REQUESTS = 20
 LOGIN_ATTEMPT_LIMIT = 5
 LOGIN_LOCKOUT_DURATION = 900
 
+# Contadores O(1) con expiración; RATE_LIMIT_BACKEND decide si se comparten entre workers
+rate_limit_backend = create_backend()
+rate_limit_tracker = SlidingWindowCounter(rate_limit_backend, 'rate', RATE_LIMIT_WINDOW)
+login_attempts = LoginLockout(rate_limit_backend, LOGIN_ATTEMPT_LIMIT, LOGIN_LOCKOUT_DURATION)
+# Mensajes recientes que se leen de Firestore para darle contexto al modelo
+CHAT_HISTORY_MESSAGES = int(os.environ.get('CHAT_HISTORY_MESSAGES', '20'))
+# Hilos que clasifican localmente mientras se lee la conversación
+CHAT_PREPARE_WORKERS = int(os.environ.get('CHAT_PREPARE_WORKERS', '8'))
+_prepare_executor = ThreadPoolExecutor(max_workers=CHAT_PREPARE_WORKERS, thread_name_prefix='buho-prepare')
+# Token para leer /metrics ("Authorization: Bearer <token>"). Sin token, /metrics
+# solo responde a peticiones locales que no llegan a través de un proxy
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+@app.before_request
+def start_request_timer():
+    """Cada petición registra sus etapas para el header Server-Timing."""
+    g.request_start = time.perf_counter()
+    start_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, request.endpoint or 'unknown', response.status_code)
+    # En los streams el header sale antes de que Groq responda: solo trae el contexto
+    response.headers['Server-Timing'] = server_timing_header(total=elapsed)
+    return response
+
 
 @app.route('/')
 def index():
@@ -82,8 +165,23 @@ def create_conversation():
             'title': 'Nueva conversación',
             'createdAt': firestore.SERVER_TIMESTAMP,
             'updatedAt': firestore.SERVER_TIMESTAMP,
+            'messageCount': 0
+        })
+
+        now = datetime.now(timezone.utc)
+        cache_conversation_state(doc_ref.id, {
+            'userId': user_id,
+            'title': 'Nueva conversación',
+            'createdAt': now,
+            'updatedAt': now,
             'messageCount': 0,
-            'messages': []
+        })
+        cache_conversation_created(user_id, {
+            'id': doc_ref.id,
+            'title': 'Nueva conversación',
+            'messageCount': 0,
+            'updatedAt': now,
+            'createdAt': now,
         })
 
         return jsonify({'conversationId': doc_ref.id}), 201
@@ -95,7 +193,10 @@ def create_conversation():
 
 @app.route('/api/conversations', methods=['GET'])
 def get_conversations():
-    """Obtiene la lista de conversaciones del usuario."""
+    """
+    Obtiene las conversaciones del usuario, de la más reciente a la más vieja.
+    Parámetros opcionales: ?cursor=<id de la última conversación>&limit=<n>.
+    """
     if 'user_id' not in session:
         return jsonify({'error': 'No autenticado'}), 401
     
@@ -105,27 +206,20 @@ def get_conversations():
     user_id = session['user_id']
 
     try:
-        conv_ref = db.collection('conversations')
-        query = conv_ref.where(filter=FieldFilter('userId', '==', user_id))
-        convs = query.stream()
-
-        conversation_list = []
-        for conv in convs:
-            data = conv.to_dict()
-            created_at = data.get('createdAt')
-            updated_at = data.get('updatedAt', created_at)
-            conversation_list.append({
-                'id': conv.id,
-                'title': data.get('title', 'Conversación'),
-                'messageCount': data.get('messageCount', 0),
-                'updatedAt': updated_at,
-                'createdAt': created_at
-            })
-
-        conversation_list.sort(key=lambda x: x.get('updatedAt') or x.get('createdAt') or 0, reverse=True)
-        
-        return jsonify(conversation_list), 200
+        conversation_list, next_cursor = get_conversation_list(
+            db,
+            user_id,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+        )
+
+        return jsonify({
+            'conversations': conversation_list,
+            'nextCursor': next_cursor
+        }), 200
 
+    except ValueError:
+        return jsonify({'error': 'Cursor inválido'}), 400
     except Exception as e:
         print(f"❌ Error al obtener conversaciones: {e}")
         return jsonify({'error': 'Error al obtener las conversaciones'}), 500
@@ -133,7 +227,10 @@ def get_conversations():
 
 @app.route('/api/conversations/<conv_id>', methods=['GET'])
 def get_conversation_history(conv_id):
-    """Obtiene el historial completo de mensajes de una conversación."""
+    """
+    Obtiene los mensajes de una conversación, paginados desde el final.
+    Parámetros opcionales: ?before=<seq>&limit=<n>.
+    """
     if 'user_id' not in session:
         return jsonify({'error': 'No autenticado'}), 401
     
@@ -144,16 +241,33 @@ def get_conversation_history(conv_id):
 
     try:
         doc_ref = db.collection('conversations').document(conv_id)
-        doc = doc_ref.get()
+        state = get_conversation_state(doc_ref)
 
-        if not doc.exists:
+        if state is None:
             return jsonify({'error': 'Conversación no encontrada'}), 404
 
-        data = doc.to_dict()
+        data = dict(state['data'])
 
-        if not data or data.get('userId') != user_id:
+        if data.get('userId') != user_id:
             return jsonify({'error': 'Acceso no autorizado'}), 403
 
+        before = request.args.get('before', type=int)
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+
+        tail = state['messages']
+        if before is None and not data.get('messages') and (
+                len(tail) >= limit or len(tail) == data.get('messageCount', 0)):
+            # La última página ya está en memoria
+            messages = tail[-max(1, limit):]
+            next_before = messages[0]['seq'] if messages and messages[0]['seq'] > 0 else None
+        else:
+            messages, next_before = get_messages_page(doc_ref, data, before=before, limit=limit)
+
+        data.pop('messages', None)
+        data['messages'] = messages
+        data['hasMore'] = next_before is not None
+        data['nextBefore'] = next_before
+
         return jsonify(data), 200
 
     except Exception as e:
@@ -174,17 +288,17 @@ def delete_conversation(conv_id):
 
     try:
         doc_ref = db.collection('conversations').document(conv_id)
-        doc = doc_ref.get()
+        state = get_conversation_state(doc_ref)
 
-        if not doc.exists:
+        if state is None:
             return jsonify({'error': 'Conversación no encontrada'}), 404
 
-        data = doc.to_dict()
-        
-        if not data or data.get('userId') != user_id:
+        if state['data'].get('userId') != user_id:
             return jsonify({'error': 'Acceso no autorizado'}), 403
 
+        delete_conversation_messages(db, doc_ref)
         doc_ref.delete()
+        cache_conversation_deleted(user_id, conv_id)
         return jsonify({'success': True}), 200
 
     except Exception as e:
@@ -194,52 +308,34 @@ def delete_conversation(conv_id):
 
 def check_rate_limit(user_id, endpoint):
     """Verifica límite de peticiones por usuario"""
-    now = time.time()
     key = f"{user_id}_{endpoint}"
-    
-    rate_limit_tracker[key] = [t for t in rate_limit_tracker[key] if now - t < RATE_LIMIT_WINDOW]
-    
-    if len(rate_limit_tracker[key]) >= RATE_LIMIT_MAX_REQUESTS:
+
+    if not rate_limit_tracker.hit(key, RATE_LIMIT_MAX_REQUESTS):
         return False, 'Demasiadas peticiones. Por favor, espera un momento.'
-    
-    rate_limit_tracker[key].append(now)
+
     return True, None
 
 
 def check_login_attempts(email):
     """Verifica y controla intentos de login"""
-    now = time.time()
-    
-    if email in login_attempts:
-        attempt_data = login_attempts[email]
-        
-        locked_until = attempt_data.get('locked_until')
-        if locked_until is not None and locked_until > now:
-            remaining_minutes = int((locked_until - now) / 60) + 1
-            return False, f'Cuenta bloqueada temporalmente. Intenta de nuevo en {remaining_minutes} minutos.'
-        
-        attempt_data['attempts'] = [t for t in attempt_data.get('attempts', []) if now - t < LOGIN_LOCKOUT_DURATION]
-        
-        if len(attempt_data['attempts']) >= LOGIN_ATTEMPT_LIMIT:
-            attempt_data['locked_until'] = now + LOGIN_LOCKOUT_DURATION
-            return False, 'Demasiados intentos fallidos. Cuenta bloqueada por 15 minutos.'
-    
+    locked_for = login_attempts.locked_for(email)
+    if locked_for > 0:
+        remaining_minutes = int(locked_for / 60) + 1
+        return False, f'Cuenta bloqueada temporalmente. Intenta de nuevo en {remaining_minutes} minutos.'
+
+    if login_attempts.too_many_failures(email):
+        login_attempts.lock(email)
+        return False, 'Demasiados intentos fallidos. Cuenta bloqueada por 15 minutos.'
+
     return True, None
 
 
 def record_login_attempt(email, success=False):
     """Registra un intento de login"""
-    now = time.time()
-    
-    if email not in login_attempts:
-        login_attempts[email] = {'attempts': [], 'locked_until': None}
-    
     if success:
-        login_attempts[email] = {'attempts': [], 'locked_until': None}
+        login_attempts.reset(email)
     else:
-        if 'attempts' not in login_attempts[email]:
-            login_attempts[email]['attempts'] = []
-        login_attempts[email]['attempts'].append(now)
+        login_attempts.record_failure(email)
 
 
 @app.route('/api/verify-token', methods=['POST'])
@@ -252,20 +348,15 @@ def verify_token():
         if not id_token:
             return jsonify({'error': 'Token no proporcionado'}), 400
 
-        firebase_api_key = os.environ.get('FIREBASE_API_KEY')
-        verify_url = f'https://identitytoolkit.googleapis.com/v1/accounts:lookup?key={firebase_api_key}'
-
-        response = requests.post(verify_url, json={'idToken': id_token})
+        user = verify_firebase_user(
+            id_token,
+            project_id=os.environ.get('FIREBASE_PROJECT_ID'),
+            api_key=os.environ.get('FIREBASE_API_KEY'),
+        )
 
-        if response.status_code != 200:
+        if user is None:
             return jsonify({'error': 'Token inválido'}), 401
 
-        user_data = response.json()
-
-        if 'users' not in user_data or len(user_data['users']) == 0:
-            return jsonify({'error': 'Usuario no encontrado'}), 401
-
-        user = user_data['users'][0]
         email = user.get('email', '')
 
         can_login, error_message = check_login_attempts(email)
@@ -327,6 +418,131 @@ def check_session_route():
     return jsonify({'authenticated': False}), 200
 
 
+def prepare_chat_turn(user_id, data):
+    """
+    Valida la petición de chat, verifica la conversación y arma el prompt.
+    Retorna (turno, None) o (None, respuesta_de_error).
+    """
+    user_message_text = data.get('message')
+    conversation_id = data.get('conversationId')
+
+    if not user_message_text or not conversation_id:
+        return None, (jsonify({'error': 'Falta el mensaje o el ID de la conversación'}), 400)
+
+    # La clasificación local no sale a la red: corre mientras se lee la
+    # conversación (copia el contexto: métricas y plazo). Groq y el scraping
+    # esperan a que se confirme que la conversación es del usuario.
+    ranked_future = _prepare_executor.submit(contextvars.copy_context().run,
+                                             rank_locally, user_message_text)
+
+    doc_ref = db.collection('conversations').document(conversation_id)
+    # En una conversación activa sale de memoria, sin leer Firestore
+    with stage('firestore_get'):
+        state = get_conversation_state(doc_ref)
+
+    if state is None:
+        return None, (jsonify({'error': 'Conversación no encontrada'}), 404)
+
+    conv_data = dict(state['data'])
+
+    if conv_data.get('userId') != user_id:
+        return None, (jsonify({'error': 'Acceso no autorizado'}), 403)
+
+    try:
+        ranked = ranked_future.result(timeout=remaining(CHAT_LLM_RESERVE))
+    except FutureTimeout:
+        # classify_and_scrape la vuelve a intentar (y respeta el plazo)
+        ranked = None
+    topic, scraped_data, snapshot = classify_and_scrape(user_message_text, ranked=ranked)
+
+    enhanced_prompt = user_message_text
+    if scraped_data:
+        enhanced_prompt = f"""Pregunta del usuario: {user_message_text}
+
+[Información actualizada extraída de sitios oficiales de la UNAL]
+{scraped_data}
+
+Responde basándote en la información proporcionada. Si es relevante, menciona las fuentes oficiales de la UNAL."""
+
+    first_turn = conv_data.get('messageCount', 0) == 0 and not conv_data.get('messages')
+    with stage('history'):
+        if first_turn:
+            history = []
+        elif CHAT_HISTORY_MESSAGES <= CONVERSATION_TAIL_MESSAGES and not conv_data.get('messages'):
+            history = state['messages'][-CHAT_HISTORY_MESSAGES:]
+        else:
+            history = get_recent_messages(doc_ref, conv_data, CHAT_HISTORY_MESSAGES)
+        # Resumen + turnos recientes dentro del presupuesto de tokens
+        ollama_history = build_chat_context(enhanced_prompt, history, conv_data)
+
+    # Preguntas frecuentes de primer turno: se reutiliza la respuesta si el contenido no cambió
+    cached_answer = None
+    if first_turn and snapshot:
+        cached_answer = answer_cache.lookup(user_message_text, topic, snapshot)
+        if cached_answer:
+            print(f"💾 Respuesta en caché para [{topic}]")
+
+    return {
+        'user_id': user_id,
+        'doc_ref': doc_ref,
+        'conv_data': conv_data,
+        'user_message': user_message_text,
+        'prompt': enhanced_prompt,
+        'history': ollama_history,
+        'recent_messages': history,
+        'scraped': bool(scraped_data),
+        'topic': topic,
+        'snapshot': snapshot,
+        'first_turn': first_turn,
+        'cached_answer': cached_answer,
+    }, None
+
+
+def save_chat_turn(turn, assistant_message_text):
+    """Guarda en Firestore el mensaje del usuario y la respuesta del asistente."""
+    user_message_text = turn['user_message']
+    conv_data = turn['conv_data']
+
+    new_messages = [
+        {'role': 'user', 'content': user_message_text},
+        {'role': 'assistant', 'content': assistant_message_text},
+    ]
+
+    extra_updates = {}
+    if conv_data.get('messageCount', 0) == 0 and not conv_data.get('messages'):
+        title = user_message_text[:50] + ('...' if len(user_message_text) > 50 else '')
+        extra_updates['title'] = title
+
+    # Va al journal local; un hilo lo escribe en Firestore sin demorar la respuesta
+    with stage('save_turn'):
+        message_count = queue_messages(db, turn['doc_ref'], conv_data, new_messages, extra_updates)
+
+    if turn['first_turn'] and turn['snapshot'] and not turn['cached_answer']:
+        answer_cache.store(user_message_text, turn['topic'], turn['snapshot'], assistant_message_text)
+
+    cache_conversation_updated(
+        turn['user_id'],
+        turn['doc_ref'].id,
+        messageCount=message_count,
+        updatedAt=datetime.now(timezone.utc),
+        **extra_updates,
+    )
+
+    # Los turnos que salen de la ventana reciente se van al resumen, en segundo plano
+    first_seq = message_count - len(new_messages)
+    now = datetime.now(timezone.utc)
+    saved = [dict(msg, seq=first_seq + i, id=f"local-{first_seq + i}", createdAt=now)
+             for i, msg in enumerate(new_messages)]
+    cache_conversation_turn(turn['doc_ref'].id, saved, message_count, updatedAt=now, **extra_updates)
+    update_summary_in_background(turn['doc_ref'], conv_data, turn['recent_messages'] + saved)
+
+
+def sse_event(payload, event=None):
+    """Formatea un evento Server-Sent Events con datos JSON."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Endpoint principal para el chat con IA usando Ollama + Scraping"""
@@ -342,85 +558,119 @@ def chat():
     if not can_proceed:
         return jsonify({'error': error_message}), 429
 
+    # Plazo de toda la petición: cada etapa usa solo lo que queda de él
+    start_deadline()
+
     try:
-        data = request.get_json()
-        user_message_text = data.get('message')
-        conversation_id = data.get('conversationId')
+        turn, error_response = prepare_chat_turn(user_id, request.get_json())
+        if error_response:
+            return error_response
 
-        if not user_message_text or not conversation_id:
-            return jsonify({'error': 'Falta el mensaje o el ID de la conversación'}), 400
+        if turn['cached_answer']:
+            assistant_message_text = turn['cached_answer']
+        else:
+            ollama_response = ask_model(turn['prompt'], history=turn['history'], topic=turn['topic'])
 
-        doc_ref = db.collection('conversations').document(conversation_id)
-        doc = doc_ref.get()
+            if not ollama_response.get('success'):
+                return jsonify({
+                    'error': 'Error al procesar con Ollama',
+                    'details': ollama_response.get('error')
+                }), 500
 
-        if not doc.exists:
-            return jsonify({'error': 'Conversación no encontrada'}), 404
+            assistant_message_text = ollama_response.get('content', '')
 
-        conv_data = doc.to_dict()
+        save_chat_turn(turn, assistant_message_text)
 
-        if not conv_data or conv_data.get('userId') != user_id:
-            return jsonify({'error': 'Acceso no autorizado'}), 403
+        return jsonify({
+            'success': True,
+            'message': assistant_message_text,
+            'scraped': turn['scraped'],
+            'cached': bool(turn['cached_answer'])
+        }), 200
 
-        scraped_data = detect_topic_and_scrape(user_message_text)
-        
-        enhanced_prompt = user_message_text
-        if scraped_data:
-            enhanced_prompt = f"""Pregunta del usuario: {user_message_text}
+    except requests.RequestException as e:
+        print(f"❌ Error de conexión: {str(e)}")
+        return jsonify({'error': 'Error de conexión'}), 500
+    except Exception as e:
+        print(f"❌ Error en /api/chat: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
 
-[Información actualizada extraída de sitios oficiales de la UNAL]
-{scraped_data}
 
-Responde basándote en la información proporcionada. Si es relevante, menciona las fuentes oficiales de la UNAL."""
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Variante de /api/chat que envía la respuesta token a token como
+    Server-Sent Events. Al terminar el stream guarda el turno en Firestore.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autenticado'}), 401
 
-        history = conv_data.get('messages', [])
-        ollama_history = []
-        for msg in history:
-            role = msg.get('role', 'user')
-            content = msg.get('content', '')
-            ollama_history.append({'role': role, 'content': content})
+    if not firebase_initialized or db is None:
+        return jsonify({'error': 'Firebase no está configurado'}), 503
 
-        ollama_response = ask_ollama(enhanced_prompt, history=ollama_history)
+    user_id = session['user_id']
 
-        if not ollama_response.get('success'):
-            return jsonify({
-                'error': 'Error al procesar con Ollama',
-                'details': ollama_response.get('error')
-            }), 500
-
-        assistant_message_text = ollama_response.get('content', '')
-
-        current_messages = conv_data.get('messages', [])
-        
-        new_user_message = {'role': 'user', 'content': user_message_text}
-        new_assistant_message = {'role': 'assistant', 'content': assistant_message_text}
-        
-        message_count = len(current_messages) + 2
-        
-        update_data = {
-            'messages': firestore.ArrayUnion([new_user_message, new_assistant_message]),
-            'updatedAt': firestore.SERVER_TIMESTAMP,
-            'messageCount': message_count
-        }
-        
-        if len(current_messages) == 0:
-            title = user_message_text[:50] + ('...' if len(user_message_text) > 50 else '')
-            update_data['title'] = title
-        
-        doc_ref.update(update_data)
+    can_proceed, error_message = check_rate_limit(user_id, 'chat')
+    if not can_proceed:
+        return jsonify({'error': error_message}), 429
 
-        return jsonify({
-            'success': True,
-            'message': assistant_message_text,
-            'scraped': bool(scraped_data)
-        }), 200
+    # Plazo de toda la petición: cada etapa usa solo lo que queda de él
+    start_deadline()
 
+    try:
+        turn, error_response = prepare_chat_turn(user_id, request.get_json())
+        if error_response:
+            return error_response
     except requests.RequestException as e:
         print(f"❌ Error de conexión: {str(e)}")
         return jsonify({'error': 'Error de conexión'}), 500
     except Exception as e:
-        print(f"❌ Error en /api/chat: {str(e)}")
+        print(f"❌ Error en /api/chat/stream: {str(e)}")
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+    def generate():
+        parts = []
+        try:
+            if turn['cached_answer']:
+                tokens = [turn['cached_answer']]
+            else:
+                tokens = ask_model_stream(turn['prompt'], history=turn['history'], topic=turn['topic'])
+            for token in tokens:
+                parts.append(token)
+                yield sse_event({'token': token})
+        except Exception as e:
+            print(f"❌ Error en streaming con Groq: {str(e)}")
+            yield sse_event({'error': 'Error al procesar con Ollama'}, event='error')
+            return
+
+        assistant_message_text = ''.join(parts)
+        try:
+            save_chat_turn(turn, assistant_message_text)
+        except Exception as e:
+            print(f"❌ Error al guardar el turno: {str(e)}")
+            yield sse_event({'error': 'Error al guardar la conversación'}, event='error')
+            return
+
+        yield sse_event({'success': True, 'scraped': turn['scraped'], 'cached': bool(turn['cached_answer'])}, event='done')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Latencias por etapa, fuentes de contexto y tokens de Groq (formato Prometheus)."""
+    if METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(supplied, f'Bearer {METRICS_TOKEN}'.encode()):
+            return jsonify({'error': 'No autenticado'}), 401
+    elif request.remote_addr not in ('127.0.0.1', '::1') or 'X-Forwarded-For' in request.headers:
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -430,7 +680,15 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'ollama_connected': ollama_status,
-        'firebase_initialized': firebase_initialized
+        'firebase_initialized': firebase_initialized,
+        'scrape_cache': scrape_cache_stats(),
+        'snapshots': snapshot_stats(),
+        'outbound': outbound_stats(),
+        'answer_cache': answer_cache.stats(),
+        'search_cache': search_cache.stats(),
+        'turn_journal': turn_journal.stats() if turn_journal is not None else None,
+        'conversation_cache': conversation_cache_stats(),
+        'llm_routing': model_router.stats()
     }), 200
 
 
@@ -0,0 +1,266 @@
+"""
+Punto de entrada ASGI para atender muchos chats en paralelo con un solo proceso:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+/api/chat y /api/chat/stream se atienden de forma asíncrona: la llamada a Groq
+usa el cliente async y Firestore/scraping (librerías síncronas) corren en un
+pool de hilos acotado, así el event loop queda libre mientras se espera I/O.
+El resto de rutas pasan a la app Flask sin cambios.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+from flask_cors.core import get_cors_headers, get_cors_options
+from itsdangerous import BadSignature
+from werkzeug.datastructures import Headers
+
+import app as flask_module
+from app import app as flask_app
+from utils.deadline import start_deadline
+from utils.metrics import REQUEST_SECONDS, server_timing_header, start_request
+from utils.model_router import ask_model_async, ask_model_stream_async
+
+# Hilos para las etapas bloqueantes (Firestore, scraping)
+ASGI_BLOCKING_WORKERS = int(os.environ.get('ASGI_BLOCKING_WORKERS', '32'))
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_BLOCKING_WORKERS, thread_name_prefix='buho-io')
+_wsgi_application = WsgiToAsgi(flask_app)
+
+ASYNC_ROUTES = {
+    '/api/chat': False,
+    '/api/chat/stream': True,
+}
+# Nombre del endpoint de Flask de cada ruta: las métricas usan la misma etiqueta
+# que cuando la atiende Flask ('chat', 'chat_stream')
+_url_adapter = flask_app.url_map.bind('')
+ASYNC_ENDPOINTS = {path: _url_adapter.match(path, method='POST')[0] for path in ASYNC_ROUTES}
+# Las mismas opciones que CORS(app) en app.py
+_cors_options = get_cors_options(flask_app, flask_module.CORS_OPTIONS)
+
+
+async def run_blocking(func, *args):
+    """Ejecuta una función síncrona de app.py en el pool, dentro del app context de Flask."""
+    def call():
+        with flask_app.app_context():
+            return func(*args)
+
+    # run_in_executor no copia los contextvars: sin esto las etapas medidas
+    # en el hilo no llegarían al Server-Timing de la petición
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_executor, context.run, call)
+
+
+def load_session(scope):
+    """Lee la cookie de sesión firmada de Flask a partir de los headers ASGI."""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if serializer is None:
+        return {}
+
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    for name, value in scope.get('headers', []):
+        if name != b'cookie':
+            continue
+        cookie = SimpleCookie()
+        cookie.load(value.decode('latin-1'))
+        if cookie_name in cookie:
+            max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+            try:
+                return serializer.loads(cookie[cookie_name].value, max_age=max_age)
+            except BadSignature:
+                return {}
+    return {}
+
+
+async def read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body or b'null')
+    except ValueError:
+        return None
+
+
+def cors_headers(scope):
+    """Headers CORS que Flask-CORS le pondría a esta petición."""
+    request_headers = Headers([(name.decode('latin-1'), value.decode('latin-1'))
+                               for name, value in scope.get('headers', [])])
+    headers = get_cors_headers(_cors_options, request_headers, scope['method'])
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items(multi=True)]
+
+
+def timing_header():
+    return (b'server-timing', server_timing_header().encode('latin-1', 'replace'))
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                    timing_header()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_flask_response(send, error_response):
+    """Envía una respuesta de error (Response, status) armada por app.py."""
+    response, status = error_response
+    body = response.get_data()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', response.mimetype.encode()), (b'content-length', str(len(body)).encode()),
+                    timing_header()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def handle_chat(scope, receive, send, stream):
+    """Versión asíncrona de chat() / chat_stream() en app.py."""
+    session = load_session(scope)
+    if 'user_id' not in session:
+        return await send_json(send, {'error': 'No autenticado'}, 401)
+
+    if not flask_module.firebase_initialized or flask_module.db is None:
+        return await send_json(send, {'error': 'Firebase no está configurado'}, 503)
+
+    user_id = session['user_id']
+
+    # Con RATE_LIMIT_BACKEND sqlite o redis esto hace I/O: fuera del event loop
+    can_proceed, error_message = await run_blocking(flask_module.check_rate_limit, user_id, 'chat')
+    if not can_proceed:
+        return await send_json(send, {'error': error_message}, 429)
+
+    # run_blocking copia el contexto, así el plazo llega a las etapas en el pool
+    start_deadline()
+
+    data = await read_json(receive)
+    if not isinstance(data, dict):
+        return await send_json(send, {'error': 'Falta el mensaje o el ID de la conversación'}, 400)
+
+    try:
+        turn, error_response = await run_blocking(flask_module.prepare_chat_turn, user_id, data)
+    except Exception as e:
+        print(f"❌ Error en {scope['path']} (async): {str(e)}")
+        return await send_json(send, {'error': 'Error interno del servidor'}, 500)
+
+    if error_response:
+        return await send_flask_response(send, error_response)
+
+    if not stream:
+        if turn['cached_answer']:
+            assistant_message_text = turn['cached_answer']
+        else:
+            ollama_response = await ask_model_async(turn['prompt'], history=turn['history'], topic=turn['topic'])
+            if not ollama_response.get('success'):
+                return await send_json(send, {
+                    'error': 'Error al procesar con Ollama',
+                    'details': ollama_response.get('error')
+                }, 500)
+
+            assistant_message_text = ollama_response.get('content', '')
+        try:
+            await run_blocking(flask_module.save_chat_turn, turn, assistant_message_text)
+        except Exception as e:
+            print(f"❌ Error al guardar el turno (async): {str(e)}")
+            return await send_json(send, {'error': 'Error interno del servidor'}, 500)
+
+        return await send_json(send, {
+            'success': True,
+            'message': assistant_message_text,
+            'scraped': turn['scraped'],
+            'cached': bool(turn['cached_answer'])
+        })
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            timing_header(),
+        ],
+    })
+
+    async def emit(payload, event=None, last=False):
+        await send({
+            'type': 'http.response.body',
+            'body': flask_module.sse_event(payload, event=event).encode(),
+            'more_body': not last,
+        })
+
+    parts = []
+    try:
+        if turn['cached_answer']:
+            parts.append(turn['cached_answer'])
+            await emit({'token': turn['cached_answer']})
+        else:
+            async for token in ask_model_stream_async(turn['prompt'], history=turn['history'], topic=turn['topic']):
+                parts.append(token)
+                await emit({'token': token})
+    except Exception as e:
+        print(f"❌ Error en streaming con Groq (async): {str(e)}")
+        return await emit({'error': 'Error al procesar con Ollama'}, event='error', last=True)
+
+    try:
+        await run_blocking(flask_module.save_chat_turn, turn, ''.join(parts))
+    except Exception as e:
+        print(f"❌ Error al guardar el turno (async): {str(e)}")
+        return await emit({'error': 'Error al guardar la conversación'}, event='error', last=True)
+
+    await emit({'success': True, 'scraped': turn['scraped'], 'cached': bool(turn['cached_answer'])},
+               event='done', last=True)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in ASYNC_ROUTES:
+        start_request()
+        start = time.perf_counter()
+        status = {}
+        extra_headers = cors_headers(scope)
+
+        async def send_and_track(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                message = dict(message, headers=list(message.get('headers', [])) + extra_headers)
+            await send(message)
+
+        try:
+            return await handle_chat(scope, receive, send_and_track, stream=ASYNC_ROUTES[scope['path']])
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, ASYNC_ENDPOINTS[scope['path']],
+                                    status.get('code', 500))
+
+    # WsgiToAsgi deja su AsyncToSync.executors.current (ya cerrado) en el contexto
+    # de la conexión, y con keep-alive la petición siguiente fallaba con
+    # "CurrentThreadExecutor already quit": cada petición corre en un contexto limpio
+    return await asyncio.create_task(_wsgi_application(scope, receive, send), context=contextvars.Context())
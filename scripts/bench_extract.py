@@ -0,0 +1,143 @@
+"""
+Compara la extracción de HTML anterior (BeautifulSoup + html.parser) con la
+de utils/html_extract.py (lxml, un solo parseo y selectores declarados por
+scraper) sobre páginas guardadas en scripts/fixtures/html/.
+
+Uso:
+    python -m scripts.bench_extract [--repeat 20] [--fetch]
+
+--fetch reemplaza los fixtures por la versión actual de cada página de la
+UNAL antes de medir. Se reporta la mediana del tiempo de extracción y el pico
+de memoria (tracemalloc) de una extracción. Ojo: tracemalloc solo ve la
+memoria de objetos Python; los nodos que libxml2 reserva en C no cuentan, así
+que el pico de lxml es una cota inferior.
+"""
+import argparse
+import os
+import statistics
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from utils.html_extract import page_text_blocks, select_texts
+from utils.http_client import http_get
+from utils.scraper import (
+    ADMISIONES_SELECTORS,
+    MATERIAS_SELECTORS,
+    POSGRADOS_SELECTORS,
+    PROGRAMAS_SELECTORS,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'html')
+
+
+# --- Extracción anterior, tal como estaba en utils/scraper.py ---
+def legacy_select(html, selector):
+    soup = BeautifulSoup(html, "html.parser")
+    return [t.get_text(strip=True) for t in soup.select(selector)]
+
+
+def legacy_page(html):
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "nav", "footer", "header"]):
+        element.decompose()
+    content = []
+    for table in soup.find_all("table"):
+        for row in table.find_all("tr"):
+            cols = [ele.get_text(strip=True) for ele in row.find_all(["td", "th"])]
+            if cols:
+                content.append(" | ".join(cols))
+    for p in soup.find_all(["p", "li", "h2", "h3"]):
+        text = p.get_text(strip=True)
+        if len(text) > 20:
+            content.append(text)
+    return content
+
+
+# fixture -> (URL de origen, extracción anterior, extracción nueva)
+CASES = {
+    'admisiones.html': (
+        'https://admisiones.unal.edu.co/',
+        lambda html: legacy_select(html, ".list-group-item"),
+        lambda html: select_texts(html, ADMISIONES_SELECTORS),
+    ),
+    'posgrados.html': (
+        'https://posgrados.unal.edu.co/',
+        lambda html: legacy_select(html, "h3, h4, p, .list-group-item"),
+        lambda html: select_texts(html, POSGRADOS_SELECTORS),
+    ),
+    'programas.html': (
+        'https://admisiones.unal.edu.co/pregrado/oferta-de-programas-curriculares/',
+        lambda html: legacy_select(html, ".list-group-item"),
+        lambda html: select_texts(html, PROGRAMAS_SELECTORS),
+    ),
+    'sia.html': (
+        'https://sia.unal.edu.co/',
+        lambda html: legacy_select(html, "h3, h4, a, p, .list-group-item"),
+        lambda html: select_texts(html, MATERIAS_SELECTORS),
+    ),
+    'calendario.html': (
+        'https://unal.edu.co/calendario-academico',
+        legacy_page,
+        page_text_blocks,
+    ),
+    'seguridad.html': (
+        'https://dfa.bogota.unal.edu.co/division-vigilancia-seguridad/',
+        legacy_page,
+        page_text_blocks,
+    ),
+}
+
+
+def measure(func, content, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times) * 1000, peak / 1024, result
+
+
+def same_text(a, b):
+    """Compara ignorando espacios: lxml separa palabras que get_text(strip=True) pegaba."""
+    squash = lambda items: ["".join(t.split()) for t in items if t.strip()]
+    return squash(a) == squash(b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--fetch', action='store_true', help='Descarga de nuevo las páginas de la UNAL')
+    args = parser.parse_args()
+
+    if args.fetch:
+        for name, (url, _, _) in CASES.items():
+            response = http_get(url, timeout=10)
+            response.raise_for_status()
+            with open(os.path.join(FIXTURES_DIR, name), 'wb') as f:
+                f.write(response.content)
+            print(f"💾 {name} <- {url} ({len(response.content) / 1024:.0f} KB)")
+
+    print(f"{'fixture':<18}{'KB':>6}{'antes ms':>10}{'ahora ms':>10}{'x':>6}"
+          f"{'antes KB':>11}{'ahora KB':>10}  igual")
+    total_old = total_new = 0.0
+    for name, (_, legacy, current) in CASES.items():
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+            content = f.read()
+        old_ms, old_kb, old_result = measure(legacy, content.decode('utf-8', 'replace'), args.repeat)
+        new_ms, new_kb, new_result = measure(current, content, args.repeat)
+        total_old += old_ms
+        total_new += new_ms
+        print(f"{name:<18}{len(content) / 1024:>6.0f}{old_ms:>10.2f}{new_ms:>10.2f}{old_ms / new_ms:>6.1f}"
+              f"{old_kb:>11.0f}{new_kb:>10.0f}  {'sí' if same_text(old_result, new_result) else 'no'}")
+    print(f"\nTotal: {total_old:.1f} ms -> {total_new:.1f} ms ({total_old / total_new:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+"""
+Dobles locales para el benchmark (scripts/loadtest.py): un servidor falso de
+Groq (chat completions, con y sin streaming), un Firestore en memoria y un
+servidor de fixtures que hace de sitios de la UNAL. Nada de esto sale a la red.
+"""
+import datetime
+import itertools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import transforms
+from requests.adapters import HTTPAdapter
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'html')
+
+
+def _serve(server, name):
+    thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+    thread.start()
+    return server
+
+
+# --- Groq ---
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        config = self.server.config
+        model = body.get('model', 'fake')
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+
+        # El clasificador pide max_tokens=16: se le responde con una categoría
+        if (body.get('max_tokens') or 0) <= 16:
+            words = [config['classify_label']]
+        else:
+            words = [f"palabra{i}" for i in range(min(config['tokens'], body.get('max_tokens') or 1024))]
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(words),
+                 'total_tokens': prompt_tokens + len(words)}
+        base = {'id': f"chatcmpl-{next(self.server.ids)}", 'created': int(time.time()), 'model': model}
+
+        time.sleep(config['latency'])
+        if body.get('stream'):
+            self._stream(base, words, usage, config['tokens_per_second'])
+            return
+
+        time.sleep(len(words) / config['tokens_per_second'])
+        payload = dict(base, object='chat.completion', usage=usage, choices=[{
+            'index': 0, 'finish_reason': 'stop',
+            'message': {'role': 'assistant', 'content': ' '.join(words)},
+        }])
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def _stream(self, base, words, usage, tokens_per_second):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        base = dict(base, object='chat.completion.chunk')
+        for i, word in enumerate(words):
+            delta = {'content': word if i == 0 else f" {word}"}
+            if i == 0:
+                delta['role'] = 'assistant'
+            chunk = dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}])
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(1 / tokens_per_second)
+        # Como Groq: el último fragmento trae finish_reason y x_groq.usage
+        last = dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                    x_groq={'id': base['id'], 'usage': usage})
+        self._chunk(f"data: {json.dumps(last)}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+
+def start_fake_groq(latency=0.3, tokens=120, tokens_per_second=400.0, classify_label='NINGUNO'):
+    """
+    Servidor de chat completions compatible con el SDK de Groq en 127.0.0.1.
+    `latency` es la espera antes del primer token y `tokens_per_second` el
+    ritmo de generación. Usar su `base_url` como GROQ_BASE_URL.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGroqHandler)
+    server.daemon_threads = True
+    server.ids = itertools.count()
+    server.config = {'latency': latency, 'tokens': tokens,
+                     'tokens_per_second': tokens_per_second, 'classify_label': classify_label}
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    return _serve(server, 'fake-groq')
+
+
+# --- Sitios de la UNAL ---
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.lstrip('/').split('?')[0]
+        path = os.path.join(FIXTURES_DIR, os.path.basename(name))
+        time.sleep(self.server.latency)
+        if not name or not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fixture_server(latency=0.05):
+    """Sirve scripts/fixtures/html/<archivo> con `latency` segundos de espera por página."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    return _serve(server, 'fixture-sites')
+
+
+class FixtureAdapter(HTTPAdapter):
+    """
+    Adapter de requests que manda las URLs de la UNAL al servidor de fixtures:
+    `pages` es {url original: archivo del fixture}; las demás dan 404.
+    """
+
+    def __init__(self, base_url, pages, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.pages = {url.rstrip('/'): name for url, name in pages.items()}
+
+    def send(self, request, **kwargs):
+        name = self.pages.get(request.url.rstrip('/'), 'missing')
+        request.url = f"{self.base_url}/{name}"
+        return super().send(request, **kwargs)
+
+
+def route_sites(session, base_url, pages):
+    """Monta FixtureAdapter en `session` para cada host de `pages`."""
+    adapter = FixtureAdapter(base_url, pages)
+    for prefix in {'/'.join(url.split('/')[:3]) for url in pages}:
+        session.mount(prefix, adapter)
+
+
+# --- Firestore ---
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _apply(current, data):
+    for key, value in data.items():
+        if value is transforms.SERVER_TIMESTAMP:
+            current[key] = _now()
+        elif value is transforms.DELETE_FIELD:
+            current.pop(key, None)
+        elif isinstance(value, transforms.Maximum):
+            current[key] = max(current.get(key, value.value), value.value)
+        elif isinstance(value, transforms.Increment):
+            current[key] = current.get(key, 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            existing = current.get(key, [])
+            current[key] = existing + [v for v in value.values if v not in existing]
+        else:
+            current[key] = value
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def get(self, transaction=None):
+        with self._db.operation():
+            data = self._db.docs.get(self.path)
+            return FakeSnapshot(self, None if data is None else dict(data), self._db.update_times.get(self.path))
+
+    def _set(self, data, merge=False):
+        current = dict(self._db.docs.get(self.path) or {}) if merge else {}
+        _apply(current, data)
+        self._db.docs[self.path] = current
+        self._db.update_times[self.path] = _now()
+
+    def _update(self, data):
+        if self.path not in self._db.docs:
+            raise NotFound(f"No existe el documento {self.path}")
+        _apply(self._db.docs[self.path], data)
+        self._db.update_times[self.path] = _now()
+
+    def set(self, data, merge=False):
+        with self._db.operation():
+            self._set(data, merge)
+
+    def update(self, data):
+        with self._db.operation():
+            self._update(data)
+
+    def delete(self):
+        with self._db.operation():
+            self._db.docs.pop(self.path, None)
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+}
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), order=None, limit=None, after=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes):
+        args = dict(filters=self._filters, order=self._order, limit=self._limit, after=self._after)
+        args.update(changes)
+        return FakeQuery(self._collection, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(order=(field_path, direction))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def stream(self):
+        db = self._collection._db
+        prefix = self._collection.path + '/'
+        with db.operation():
+            docs = [(path, dict(data)) for path, data in db.docs.items()
+                    if path.startswith(prefix) and '/' not in path[len(prefix):]]
+        for field, op, value in self._filters:
+            docs = [(p, d) for p, d in docs if _OPERATORS[op](d.get(field), value)]
+        if self._order:
+            field, direction = self._order
+            docs.sort(key=lambda item: item[1].get(field), reverse=direction == 'DESCENDING')
+        if self._after is not None:
+            paths = [p for p, _ in docs]
+            docs = docs[paths.index(self._after.reference.path) + 1:]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return iter([FakeSnapshot(FakeDocument(db, p), d) for p, d in docs])
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        super().__init__(self)
+
+    def document(self, document_id=None):
+        return FakeDocument(self._db, f"{self.path}/{document_id or self._db.new_id()}")
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return _now(), reference
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: reference._set(data, merge))
+
+    def update(self, reference, data):
+        self._writes.append(lambda: reference._update(data))
+
+    def delete(self, reference):
+        self._writes.append(lambda: self._db.docs.pop(reference.path, None))
+
+    def commit(self):
+        with self._db.operation():
+            for write in self._writes:
+                write()
+
+
+class FakeTransaction(FakeBatch):
+    """
+    Transacción para @firestore.transactional: las escrituras se aplican al
+    confirmar y, como en el SDK de servidor, las transacciones se ejecutan
+    una a la vez (el bloqueo se toma al empezar y se suelta al terminar).
+    """
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._id = None
+
+    def _clean_up(self):
+        self._writes = []
+
+    def _begin(self, retry_id=None):
+        self._db._transactions.acquire()
+        self._id = self._db.new_id().encode()
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._finish()
+
+    def _rollback(self):
+        self._writes = []
+        self._finish()
+
+    def _finish(self):
+        if self._id is not None:
+            self._id = None
+            self._db._transactions.release()
+
+
+class FakeFirestore:
+    """
+    Firestore en memoria con lo que usa app.py (documentos, subcolecciones,
+    consultas con where/order_by/limit/start_after, batches y transacciones).
+    Cada operación espera `latency` segundos para simular el viaje de ida y vuelta.
+    """
+
+    def __init__(self, latency=0.02):
+        self.docs = {}
+        self.update_times = {}
+        self.latency = latency
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._transactions = threading.Lock()
+
+    def new_id(self):
+        return f"bench{next(self._ids):08d}"
+
+    def operation(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._lock
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
@@ -0,0 +1,231 @@
+"""
+Rastrea los sitios de la UNAL que Búho tiene permitido citar (los enlaces de
+PERSONALIDAD_BUHO) y construye el índice BM25 que usa el scraper para
+responder sin salir a la red.
+
+Uso:
+    python -m scripts.build_index [--full] [--max-pages 150] [--max-depth 3]
+
+Por defecto es incremental: reutiliza lo rastreado la vez anterior
+(data/search_index/pages.json) y pide cada página con If-None-Match /
+If-Modified-Since, así que las que no cambiaron no se vuelven a descargar ni
+a procesar. El índice nuevo se escribe completo (postings incluidos) en su
+propia carpeta y se publica al final cambiando CURRENT, de modo que el
+servidor nunca lee uno a medias; si ninguna página cambió, no se reescribe.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from collections import deque
+from urllib.parse import urldefrag, urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from lxml import etree
+
+from utils.html_extract import compile_selectors, drop_noise, node_text, parse_html
+from utils.http_client import http_get
+from utils.ollama_client import PERSONALIDAD_BUHO
+from utils.search_index import SEARCH_INDEX_DIR, chunk_blocks, publish_index, write_index
+
+# Extensiones que no son HTML y no vale la pena descargar
+SKIP_EXTENSIONS = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.zip', '.rar', '.doc', '.docx',
+    '.xls', '.xlsx', '.ppt', '.pptx', '.mp3', '.mp4', '.css', '.js', '.ico', '.xml',
+)
+# Versiones del índice que se conservan en disco
+KEEP_BUILDS = 2
+
+
+def seed_urls(text=PERSONALIDAD_BUHO):
+    """Los enlaces oficiales que aparecen en la personalidad de Búho."""
+    return list(dict.fromkeys(url.rstrip('.,)') for url in re.findall(r"https?://[^\s,]+", text)))
+
+
+def normalize_url(url):
+    """Sin fragmento ni query, para no rastrear la misma página varias veces."""
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path or '/'}"
+
+
+_PAGE_BLOCKS = compile_selectors("h1, h2, h3, h4, p, li, tr")
+_ROW_CELLS = etree.XPath("./td | ./th")
+_LINKS = etree.XPath("//a/@href")
+_NESTED_BLOCKS = etree.XPath(".//p | .//li | .//table")
+
+
+def page_blocks(content):
+    """Título de la página, sus bloques de texto en orden ('heading'|'text', texto) y sus enlaces."""
+    root = parse_html(content)
+    links = [str(href) for href in _LINKS(root)]
+    title_node = root.find('.//title')
+    title = node_text(title_node) if title_node is not None else ''
+    drop_noise(root)
+
+    blocks = []
+    for node in _PAGE_BLOCKS(root):
+        if node.tag == 'tr':
+            text = " | ".join(t for t in (node_text(c) for c in _ROW_CELLS(node)) if t)
+        elif _NESTED_BLOCKS(node):
+            continue  # el texto ya sale de los bloques internos
+        else:
+            text = node_text(node)
+        if not text:
+            continue
+        if node.tag in ('h1', 'h2', 'h3', 'h4'):
+            blocks.append(('heading', text))
+        elif len(text) > 20:
+            blocks.append(('text', text))
+    return title, blocks, links
+
+
+class Crawler:
+    def __init__(self, seeds, previous=None, max_pages=150, max_depth=3, delay=0.5):
+        self.seeds = [normalize_url(u) for u in seeds]
+        self.hosts = {urlsplit(u).hostname for u in self.seeds}
+        self.previous = previous or {}
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.delay = delay
+        self._robots = {}
+        self.stats = {'fetched': 0, 'not_modified': 0, 'skipped': 0, 'errors': 0}
+
+    def allowed(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or parts.hostname not in self.hosts:
+            return False
+        if parts.path.lower().endswith(SKIP_EXTENSIONS):
+            return False
+        robots = self._robots.get(parts.netloc)
+        if robots is None:
+            robots = self._robots[parts.netloc] = RobotFileParser()
+            try:
+                response = http_get(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=5)
+                robots.parse(response.text.splitlines() if response.status_code == 200 else [])
+            except Exception:
+                robots.parse([])
+        return robots.can_fetch('*', url)
+
+    def fetch(self, url):
+        """Descarga la página; retorna el registro nuevo, el anterior si no cambió, o None."""
+        old = self.previous.get(url)
+        headers = {}
+        if old and old.get('etag'):
+            headers['If-None-Match'] = old['etag']
+        if old and old.get('last_modified'):
+            headers['If-Modified-Since'] = old['last_modified']
+
+        try:
+            response = http_get(url, timeout=10, headers=headers)
+        except Exception as e:
+            print(f"❌ {url}: {e}")
+            self.stats['errors'] += 1
+            return old
+
+        if response.status_code == 304 and old:
+            self.stats['not_modified'] += 1
+            return old
+        if response.status_code != 200 or 'html' not in response.headers.get('Content-Type', ''):
+            self.stats['skipped'] += 1
+            return None
+
+        self.stats['fetched'] += 1
+        # Bytes: así se respeta el <meta charset> de la página
+        title, blocks, links = page_blocks(response.content)
+        return {
+            'title': title,
+            'chunks': chunk_blocks(blocks),
+            'links': links,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+        }
+
+    def crawl(self):
+        """Recorrido en anchura desde las semillas, con tope de páginas por host."""
+        pages = {}
+        per_host = {}
+        queue = deque((url, 0) for url in self.seeds)
+        seen = set(self.seeds)
+
+        while queue:
+            url, depth = queue.popleft()
+            host = urlsplit(url).hostname
+            if per_host.get(host, 0) >= self.max_pages or not self.allowed(url):
+                continue
+            per_host[host] = per_host.get(host, 0) + 1
+
+            page = self.fetch(url)
+            if self.delay:
+                time.sleep(self.delay)
+            if page is None:
+                continue
+            pages[url] = page
+            print(f"📄 [{depth}] {url} ({len(page['chunks'])} fragmentos)")
+
+            if depth >= self.max_depth:
+                continue
+            for href in page.get('links', []):
+                link = normalize_url(urljoin(url, href))
+                if link not in seen and urlsplit(link).hostname in self.hosts:
+                    seen.add(link)
+                    queue.append((link, depth + 1))
+        return pages
+
+
+def prune_builds(root, keep=KEEP_BUILDS):
+    builds = sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name)) and name[0].isdigit()
+    )
+    for name in builds[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=SEARCH_INDEX_DIR)
+    parser.add_argument('--seed', action='append', help='URL inicial (por defecto, las de PERSONALIDAD_BUHO)')
+    parser.add_argument('--full', action='store_true', help='Ignora el rastreo anterior y descarga todo')
+    parser.add_argument('--max-pages', type=int, default=150, help='Páginas por host')
+    parser.add_argument('--max-depth', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=0.5, help='Pausa entre peticiones (segundos)')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, 'pages.json')
+    previous = {}
+    if not args.full and os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    start = time.perf_counter()
+    crawler = Crawler(args.seed or seed_urls(), previous, args.max_pages, args.max_depth, args.delay)
+    pages = crawler.crawl()
+
+    if previous and pages.keys() == previous.keys() and not crawler.stats['fetched']:
+        print(f"\nSin cambios en {len(pages)} páginas; se conserva el índice actual")
+        return
+
+    build = time.strftime('%Y%m%d-%H%M%S')
+    while os.path.exists(os.path.join(args.output, build)):
+        build += '-1'
+    write_index(os.path.join(args.output, build), pages)
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(pages, f, ensure_ascii=False)
+    os.replace(tmp, manifest_path)
+    publish_index(args.output, build)
+    prune_builds(args.output)
+
+    chunks = sum(len(p['chunks']) for p in pages.values())
+    print(f"\nPáginas: {len(pages)} ({crawler.stats})")
+    print(f"Fragmentos indexados: {chunks}")
+    print(f"✅ Índice {build} publicado en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Evaluación offline del clasificador de intención local (rank_locally, el que
+usa el chat: uno o varios temas por pregunta) contra etiquetas de referencia.
+
+Uso:
+    # 1. (Opcional) Etiquetar mensajes con Groq (un mensaje por línea)
+    python -m scripts.evaluate_intent --label-with-llm mensajes.txt -o etiquetados.jsonl
+
+    # 2. Medir acuerdo local vs. referencia
+    python -m scripts.evaluate_intent etiquetados.jsonl --threshold 0.6
+
+El archivo etiquetado es JSONL con {"message": ..., "labels": [...]} (temas
+en orden de prioridad) o {"message": ..., "label": ...}. Por defecto se usa
+scripts/fixtures/intent_holdout.jsonl, que no se usa para entrenar: medir
+sobre utils/intent_examples.jsonl da la precisión en entrenamiento.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from utils.intent_classifier import INTENT_LABELS, INTENT_MAX_TOPICS, get_model, rank_locally
+
+HOLDOUT_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'intent_holdout.jsonl')
+
+
+def load_labeled(path=HOLDOUT_PATH):
+    """Lee pares (mensaje, [temas]) de un archivo JSONL."""
+    examples = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                labels = row.get('labels') or [row['label']]
+                examples.append((row['message'], labels))
+    return examples
+
+
+def label_with_llm(input_path, output_path):
+    """Etiqueta cada mensaje del archivo con classify_user_intents (Groq)."""
+    from utils.ollama_client import classify_user_intents
+
+    with open(input_path, encoding='utf-8') as src, open(output_path, 'w', encoding='utf-8') as dst:
+        for line in src:
+            message = line.strip()
+            if not message:
+                continue
+            labels = classify_user_intents(message)
+            dst.write(json.dumps({'message': message, 'labels': labels}, ensure_ascii=False) + '\n')
+    print(f"✅ Mensajes etiquetados guardados en {output_path}")
+
+
+def evaluate(examples, threshold, max_topics=INTENT_MAX_TOPICS):
+    get_model()
+
+    confusion = defaultdict(Counter)
+    per_label = defaultdict(lambda: [0, 0])
+    by_source = Counter()
+    top1 = hit = exact = confident = confident_top1 = 0
+    precision = recall = 0.0
+    elapsed = 0.0
+
+    for message, gold in examples:
+        start = time.perf_counter()
+        topics, source = rank_locally(message, max_topics)
+        elapsed += time.perf_counter() - start
+        predicted = [label for label, _ in topics]
+
+        by_source[source] += 1
+        # La matriz y el detalle por categoría comparan el tema principal
+        confusion[gold[0]][predicted[0]] += 1
+        per_label[gold[0]][1] += 1
+        if predicted[0] == gold[0]:
+            top1 += 1
+            per_label[gold[0]][0] += 1
+        hit += gold[0] in predicted
+        exact += set(predicted) == set(gold)
+        common = len(set(predicted) & set(gold))
+        precision += common / len(predicted)
+        recall += common / len(gold)
+        if topics[0][1] >= threshold:
+            confident += 1
+            confident_top1 += predicted[0] == gold[0]
+
+    total = len(examples) or 1
+    return {
+        'total': len(examples),
+        'threshold': threshold,
+        'max_topics': max_topics,
+        'top1': top1 / total,
+        'hit_at_k': hit / total,
+        'exact_topics': exact / total,
+        'topic_precision': precision / total,
+        'topic_recall': recall / total,
+        'coverage': confident / total,
+        'top1_when_local': confident_top1 / (confident or 1),
+        'avg_latency_us': elapsed / total * 1e6,
+        'by_source': dict(by_source),
+        'per_label': {label: {'agree': a, 'total': t, 'rate': a / t} for label, (a, t) in per_label.items()},
+        'confusion': {gold: dict(row) for gold, row in confusion.items()},
+    }
+
+
+def print_report(report):
+    k = report['max_topics']
+    print(f"Mensajes evaluados:        {report['total']}")
+    print(f"Tema principal correcto:   {report['top1']:.1%}")
+    print(f"Principal entre los {k}:     {report['hit_at_k']:.1%}")
+    print(f"Mismos temas exactos:      {report['exact_topics']:.1%}")
+    print(f"Temas: precisión/recall:   {report['topic_precision']:.1%} / {report['topic_recall']:.1%}")
+    print(f"Cobertura local (≥{report['threshold']}):  {report['coverage']:.1%}")
+    print(f"Principal en lo cubierto:  {report['top1_when_local']:.1%}")
+    print(f"Latencia media:            {report['avg_latency_us']:.0f} µs")
+    print(f"Origen de la decisión:     {report['by_source']}")
+    print("\nPor categoría (tema principal):")
+    for label in INTENT_LABELS:
+        row = report['per_label'].get(label)
+        if row:
+            print(f"  {label:<11} {row['agree']:>4}/{row['total']:<4} {row['rate']:.1%}")
+    print("\nMatriz de confusión del tema principal (fila = referencia, columna = local):")
+    print("  " + " ".join(f"{label[:5]:>6}" for label in INTENT_LABELS))
+    for gold in INTENT_LABELS:
+        row = report['confusion'].get(gold, {})
+        print(f"  {gold[:5]:<5}" + " ".join(f"{row.get(label, 0):>6}" for label in INTENT_LABELS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dataset', nargs='?', default=HOLDOUT_PATH,
+                        help='JSONL etiquetado (por defecto, scripts/fixtures/intent_holdout.jsonl)')
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--max-topics', type=int, default=INTENT_MAX_TOPICS)
+    parser.add_argument('--json', action='store_true', help='Imprime el reporte como JSON')
+    parser.add_argument('--label-with-llm', metavar='MENSAJES', help='Archivo de texto a etiquetar con Groq')
+    parser.add_argument('-o', '--output', default='etiquetados.jsonl')
+    args = parser.parse_args()
+
+    if args.label_with_llm:
+        label_with_llm(args.label_with_llm, args.output)
+        return
+
+    report = evaluate(load_labeled(args.dataset), args.threshold, args.max_topics)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,495 @@
+"""
+Prueba de carga de /api/chat sin salir a la red: levanta la app (Flask o
+ASGI) contra dobles locales de Groq, Firestore y los sitios de la UNAL
+(scripts/bench_fakes.py), simula usuarios concurrentes y reporta p50/p95/p99,
+throughput y memoria por endpoint.
+
+Uso:
+    python -m scripts.loadtest [--users 20] [--requests 10] [--server flask|asgi]
+                               [--context snapshot|live] [--output resultado.json]
+                               [--compare base.json]
+
+Cada escenario (chat, stream, history, list) corre por separado para poder
+atribuirle la memoria. El resultado se guarda en JSON (por defecto en
+data/bench/) y --compare imprime la diferencia contra una corrida anterior.
+Las latencias de Groq, Firestore y los sitios se configuran con --groq-latency,
+--groq-tps, --firestore-latency y --site-latency. Con --firestore-emulator
+HOST:PUERTO se usa el emulador de Firestore en lugar del doble en memoria.
+
+Ojo: la memoria es la RSS de todo el proceso (app, dobles y clientes), así que
+sirve para comparar corridas entre sí, no como medida absoluta.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from scripts.bench_fakes import FakeFirestore, route_sites, start_fake_groq, start_fixture_server
+
+SCENARIOS = ('chat', 'stream', 'history', 'list')
+RESULTS_DIR = os.path.join('data', 'bench')
+
+# Preguntas de los usuarios simulados: mezcla de temas con y sin scraping
+QUESTIONS = [
+    "¿Cuándo empiezan las clases este semestre?",
+    "¿Cuáles son las fechas del calendario académico?",
+    "¿Cómo me inscribo al examen de admisión?",
+    "¿Qué puntaje necesito para pasar a la UNAL?",
+    "¿Qué maestrías ofrece la universidad?",
+    "¿Hay doctorados en ingeniería?",
+    "¿Qué carreras de ingeniería hay en Bogotá?",
+    "¿Dónde veo el plan de estudios de medicina?",
+    "¿Cuántos créditos tiene cálculo diferencial?",
+    "¿Cómo inscribo materias en el SIA?",
+    "¿A qué número llamo si hay una emergencia en el campus?",
+    "¿Dónde reporto un objeto perdido?",
+    "Hola, ¿cómo estás?",
+    "Cuéntame un chiste de ingenieros",
+    "¿Quién eres?",
+]
+
+
+def configure_environment(args, workdir, groq_url):
+    """Variables que leen los módulos de utils/ al importarse: van antes de importar app."""
+    os.environ.update({
+        'GROQ_API_KEY': 'bench',
+        'GROQ_BASE_URL': groq_url,
+        'PREFETCH_MODE': 'worker' if args.context == 'snapshot' else 'off',
+        'SCRAPE_SNAPSHOT_DIR': os.path.join(workdir, 'snapshots'),
+        'SEARCH_INDEX_DIR': os.path.join(workdir, 'search_index'),
+        'SEARCH_CACHE_PATH': os.path.join(workdir, 'search_cache.db'),
+        'SCRAPE_HTTP_CACHE': '',
+        'TURN_JOURNAL_PATH': os.path.join(workdir, 'turn_journal.db'),
+        'RATE_LIMIT_BACKEND': 'memory',
+    })
+    if not args.answer_cache:
+        os.environ['ANSWER_CACHE_MAX_ENTRIES'] = '0'
+    if args.firestore_emulator:
+        os.environ['FIRESTORE_EMULATOR_HOST'] = args.firestore_emulator
+
+
+def route_unal_sites(fixtures):
+    """Manda las peticiones a la UNAL al servidor de fixtures y fija la URL del calendario."""
+    from scripts.bench_extract import CASES
+    from utils.http_client import get_scrape_session, get_session
+    from utils.scraper import CALENDARIO_PIN_KEY
+    from utils.search_cache import SEARCH_CACHE_PATH, SearchCache
+
+    pages = {url: name for name, (url, _, _) in CASES.items()}
+    for session in (get_session(), get_scrape_session()):
+        route_sites(session, fixtures.base_url, pages)
+
+    # La "búsqueda web" del calendario devuelve siempre la página del fixture
+    calendar_url = next(url for url, name in pages.items() if name == 'calendario.html')
+    SearchCache(SEARCH_CACHE_PATH, searcher=lambda query, max_results: [
+        {'href': calendar_url, 'title': 'Calendario académico', 'body': 'Calendario de la sede Bogotá'}
+    ]).resolve_url(CALENDARIO_PIN_KEY, 'benchmark')
+
+
+def build_database(args):
+    if args.firestore_emulator:
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud import firestore as cloud_firestore
+
+        return cloud_firestore.Client(project='buho-bench', credentials=AnonymousCredentials())
+    return FakeFirestore(latency=args.firestore_latency)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind):
+    """Levanta la app en un hilo. Retorna (base_url, función para detenerla)."""
+    if kind == 'asgi':
+        import uvicorn
+
+        import asgi
+
+        config = uvicorn.Config(asgi.application, host='127.0.0.1', port=_free_port(),
+                                log_level='warning', lifespan='on')
+        server = uvicorn.Server(config)
+        threading.Thread(target=server.run, name='bench-asgi', daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+
+        def stop():
+            server.should_exit = True
+        return f"http://127.0.0.1:{config.port}", stop
+
+    from werkzeug.serving import make_server
+
+    import app as app_module
+
+    # Sin una línea de log por petición
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-flask', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def session_cookie(flask_app, user_id):
+    """Cookie de sesión firmada como la que deja /api/verify-token."""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    return flask_app.config['SESSION_COOKIE_NAME'], serializer.dumps({'user_id': user_id})
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_server_timing(header):
+    """'firestore_get;dur=3.1, llm;desc="x";dur=200' -> {'firestore_get': 3.1, 'llm': 200}"""
+    stages = {}
+    for entry in (header or '').split(','):
+        parts = [p.strip() for p in entry.split(';')]
+        name = parts[0]
+        for part in parts[1:]:
+            if part.startswith('dur=') and name and name != 'total':
+                stages[name] = stages.get(name, 0.0) + float(part[4:])
+    return stages
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss es el pico (KB en Linux, bytes en macOS): mejor que nada
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class MemorySampler:
+    """Muestrea la RSS del proceso cada `interval` segundos mientras corre un escenario."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self._stop = threading.Event()
+        self.start_rss = self.peak_rss = self.end_rss = 0
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = _rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end_rss = _rss_bytes()
+        self.peak_rss = max(self.peak_rss, self.end_rss)
+
+    def report(self):
+        mb = 1024 * 1024
+        return {'rss_start_mb': round(self.start_rss / mb, 1), 'rss_peak_mb': round(self.peak_rss / mb, 1),
+                'rss_end_mb': round(self.end_rss / mb, 1)}
+
+
+class Recorder:
+    """Latencias, errores y etapas (Server-Timing) por endpoint, compartido entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.first_token = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.cached = defaultdict(int)
+        self.stages = defaultdict(lambda: defaultdict(list))
+
+    def record(self, endpoint, seconds, ok, response=None, first_token=None, cached=False):
+        timing = parse_server_timing(response.headers.get('Server-Timing')) if response is not None else {}
+        with self._lock:
+            if not ok:
+                self.errors[endpoint] += 1
+                return
+            self.latencies[endpoint].append(seconds * 1000)
+            if first_token is not None:
+                self.first_token[endpoint].append(first_token * 1000)
+            if cached:
+                self.cached[endpoint] += 1
+            for name, ms in timing.items():
+                self.stages[endpoint][name].append(ms)
+
+    def summary(self, duration):
+        def stats(values):
+            values = sorted(values)
+            return {
+                'p50_ms': round(percentile(values, 50), 1),
+                'p95_ms': round(percentile(values, 95), 1),
+                'p99_ms': round(percentile(values, 99), 1),
+                'mean_ms': round(sum(values) / len(values), 1),
+                'max_ms': round(values[-1], 1),
+            }
+
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[endpoint]
+            entry = {'count': len(values), 'errors': self.errors[endpoint],
+                     'throughput_rps': round(len(values) / duration, 2) if duration else None}
+            if values:
+                entry.update(stats(values))
+            if self.first_token[endpoint]:
+                entry['first_token'] = stats(self.first_token[endpoint])
+            if self.cached[endpoint]:
+                entry['cached'] = self.cached[endpoint]
+            if self.stages[endpoint]:
+                entry['stages_mean_ms'] = {name: round(sum(v) / len(v), 2)
+                                           for name, v in sorted(self.stages[endpoint].items())}
+            endpoints[endpoint] = entry
+        return endpoints
+
+
+class SimulatedUser:
+    """Un usuario con su propia sesión HTTP (keep-alive) y sus conversaciones."""
+
+    def __init__(self, base_url, cookie, recorder, rng, turns_per_conversation):
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.http.cookies.set(*cookie)
+        self.recorder = recorder
+        self.rng = rng
+        self.turns_per_conversation = turns_per_conversation
+        self.conversations = []
+        self._turns = 0
+
+    def _timed(self, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=120, **kwargs)
+        except requests.RequestException as e:
+            print(f"❌ {endpoint}: {e}")
+            self.recorder.record(endpoint, time.perf_counter() - start, ok=False)
+            return None
+        elapsed = time.perf_counter() - start
+        ok = response.status_code < 400
+        body = response.json() if ok and 'json' in response.headers.get('Content-Type', '') else {}
+        self.recorder.record(endpoint, elapsed, ok, response, cached=body.get('cached', False))
+        return body if ok else None
+
+    def conversation(self):
+        """Conversación actual; se empieza una nueva cada `turns_per_conversation` mensajes."""
+        if not self.conversations or self._turns >= self.turns_per_conversation:
+            body = self._timed('POST /api/conversations', 'POST', '/api/conversations')
+            if body is None:
+                return None
+            self.conversations.append(body['conversationId'])
+            self._turns = 0
+        self._turns += 1
+        return self.conversations[-1]
+
+    def chat(self):
+        conversation_id = self.conversation()
+        if conversation_id:
+            self._timed('POST /api/chat', 'POST', '/api/chat',
+                        json={'message': self.rng.choice(QUESTIONS), 'conversationId': conversation_id})
+
+    def stream(self):
+        conversation_id = self.conversation()
+        if not conversation_id:
+            return
+        endpoint = 'POST /api/chat/stream'
+        start = time.perf_counter()
+        first_token = None
+        ok = cached = False
+        try:
+            with self.http.post(self.base_url + '/api/chat/stream', stream=True, timeout=120,
+                                json={'message': self.rng.choice(QUESTIONS),
+                                      'conversationId': conversation_id}) as response:
+                # Los tokens llegan sin "event:"; al final viene "event: done" o "event: error"
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith('event: '):
+                        event = line[7:]
+                    elif line.startswith('data: '):
+                        if event is None and first_token is None:
+                            first_token = time.perf_counter() - start
+                        elif event == 'done':
+                            ok = response.status_code == 200
+                            cached = json.loads(line[6:]).get('cached', False)
+                        event = None
+        except requests.RequestException as e:
+            print(f"❌ {endpoint}: {e}")
+            response = None
+        self.recorder.record(endpoint, time.perf_counter() - start, ok, response, first_token, cached)
+
+    def history(self):
+        if not self.conversations:
+            self.chat()
+        self._timed('GET /api/conversations/<id>', 'GET',
+                    f"/api/conversations/{self.rng.choice(self.conversations)}")
+
+    def list(self):
+        self._timed('GET /api/conversations', 'GET', '/api/conversations')
+
+
+def run_scenario(name, users, requests_per_user):
+    """Corre `requests_per_user` acciones `name` por usuario, todos a la vez."""
+    recorder = Recorder()
+    for user in users:
+        user.recorder = recorder
+    barrier = threading.Barrier(len(users) + 1)
+
+    def drive(user):
+        barrier.wait()
+        for _ in range(requests_per_user):
+            getattr(user, name)()
+
+    threads = [threading.Thread(target=drive, args=(user,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    with MemorySampler() as memory:
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+    return {'duration_s': round(duration, 2), 'memory': memory.report(),
+            'endpoints': recorder.summary(duration)}
+
+
+def print_results(results):
+    print(f"\n{'escenario':<10}{'endpoint':<30}{'n':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>8}{'RSS pico':>10}")
+    for scenario, data in results['scenarios'].items():
+        for endpoint, entry in data['endpoints'].items():
+            print(f"{scenario:<10}{endpoint:<30}{entry['count']:>6}{entry['errors']:>5}"
+                  f"{entry.get('p50_ms', 0):>9.1f}{entry.get('p95_ms', 0):>9.1f}{entry.get('p99_ms', 0):>9.1f}"
+                  f"{entry['throughput_rps'] or 0:>8.1f}{data['memory']['rss_peak_mb']:>9.0f}M")
+
+
+def compare(results, baseline):
+    """Diferencia porcentual de latencias y throughput contra una corrida anterior."""
+    print(f"\nComparación contra {baseline['meta'].get('git_commit') or 'la corrida base'}:")
+    print(f"{'escenario':<10}{'endpoint':<30}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}")
+    for scenario, data in results['scenarios'].items():
+        base_endpoints = baseline.get('scenarios', {}).get(scenario, {}).get('endpoints', {})
+        for endpoint, entry in data['endpoints'].items():
+            base = base_endpoints.get(endpoint)
+            if not base:
+                continue
+            deltas = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+                old, new = base.get(key), entry.get(key)
+                deltas.append(f"{(new - old) / old * 100:+8.1f}%" if old and new is not None else f"{'-':>9}")
+            print(f"{scenario:<10}{endpoint:<30}{''.join(deltas)}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='Usuarios concurrentes')
+    parser.add_argument('--requests', type=int, default=10, help='Peticiones por usuario y escenario')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Escenarios separados por coma')
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask')
+    parser.add_argument('--context', choices=('snapshot', 'live'), default='snapshot',
+                        help='snapshot: capturas en disco (PREFETCH_MODE=worker); live: scraping en la petición')
+    parser.add_argument('--turns', type=int, default=4, help='Mensajes por conversación')
+    parser.add_argument('--answer-cache', action='store_true', help='Deja activa la caché de respuestas')
+    parser.add_argument('--groq-latency', type=float, default=0.3, help='Segundos hasta el primer token')
+    parser.add_argument('--groq-tps', type=float, default=400.0, help='Tokens por segundo')
+    parser.add_argument('--groq-tokens', type=int, default=120, help='Tokens por respuesta')
+    parser.add_argument('--firestore-latency', type=float, default=0.02, help='Segundos por operación')
+    parser.add_argument('--firestore-emulator', metavar='HOST:PUERTO', help='Usa el emulador de Firestore')
+    parser.add_argument('--site-latency', type=float, default=0.05, help='Segundos por página de la UNAL')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help=f'Archivo JSON de resultados (por defecto en {RESULTS_DIR}/)')
+    parser.add_argument('--compare', metavar='BASE.json', help='Corrida anterior contra la cual comparar')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='buho-bench-')
+    groq = start_fake_groq(args.groq_latency, args.groq_tokens, args.groq_tps)
+    fixtures = start_fixture_server(args.site_latency)
+    configure_environment(args, workdir, groq.base_url)
+    route_unal_sites(fixtures)
+
+    import app as app_module
+    from utils.intent_classifier import get_model
+
+    app_module.db = build_database(args)
+    app_module.firebase_initialized = True
+    app_module.RATE_LIMIT_MAX_REQUESTS = 10 ** 9
+    if app_module.turn_journal is not None:
+        app_module.turn_journal.start(app_module.write_pending_turns)
+    get_model()
+
+    if args.context == 'snapshot':
+        from utils.prefetch import scheduler
+        for topic in scheduler.scrapers:
+            scheduler.refresh(topic)
+
+    base_url, stop_server = start_server(args.server)
+    rng = random.Random(args.seed)
+    users = [
+        SimulatedUser(base_url, session_cookie(app_module.app, f"bench-user-{i}"), None,
+                      random.Random(rng.random()), args.turns)
+        for i in range(args.users)
+    ]
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'scenarios': {},
+    }
+    try:
+        for scenario in scenarios:
+            print(f"\n⏱️  Escenario {scenario}: {args.users} usuarios x {args.requests} peticiones")
+            results['scenarios'][scenario] = run_scenario(scenario, users, args.requests)
+    finally:
+        stop_server()
+        groq.shutdown()
+        fixtures.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print_results(results)
+    print(f"\n💾 Resultados en {output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
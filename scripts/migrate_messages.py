@@ -0,0 +1,52 @@
+"""
+Migra las conversaciones antiguas (mensajes en el arreglo `messages` del
+documento) a la subcolección conversations/{id}/messages.
+
+Uso:
+    python -m scripts.migrate_messages [--dry-run] [--credentials serviceAccountKey.json]
+
+Es idempotente: los mensajes migrados usan IDs deterministas y el arreglo se
+borra al final, así que se puede volver a ejecutar si se interrumpe.
+"""
+import argparse
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from utils.conversation_store import migrate_legacy_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--credentials', default='serviceAccountKey.json')
+    parser.add_argument('--dry-run', action='store_true', help='Solo cuenta lo que se migraría')
+    args = parser.parse_args()
+
+    firebase_admin.initialize_app(credentials.Certificate(args.credentials))
+    db = firestore.client()
+
+    conversations = migrated = messages = 0
+    for snapshot in db.collection('conversations').stream():
+        conversations += 1
+        data = snapshot.to_dict() or {}
+        legacy = data.get('messages')
+        if not legacy:
+            continue
+
+        migrated += 1
+        if args.dry_run:
+            messages += len(legacy)
+            print(f"🔎 {snapshot.id}: {len(legacy)} mensajes por migrar")
+            continue
+
+        moved = migrate_legacy_messages(db, snapshot.reference, data)
+        messages += moved
+        print(f"✅ {snapshot.id}: {moved} mensajes migrados")
+
+    action = 'por migrar' if args.dry_run else 'migrados'
+    print(f"\nConversaciones revisadas: {conversations}")
+    print(f"Conversaciones {action}: {migrated} ({messages} mensajes)")
+
+
+if __name__ == '__main__':
+    main()
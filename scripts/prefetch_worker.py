@@ -0,0 +1,36 @@
+"""
+Refresca las capturas de los scrapers en un proceso aparte, para que los
+workers del servidor (con PREFETCH_MODE=worker) solo lean de disco.
+
+Uso:
+    PREFETCH_MODE=worker python -m scripts.prefetch_worker [--once]
+
+--once refresca todos los temas una vez y termina (útil para cron o para
+calentar las capturas antes de desplegar).
+"""
+import argparse
+
+from utils.prefetch import scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='Refresca cada tema una vez y termina')
+    args = parser.parse_args()
+
+    if args.once:
+        failed = [topic for topic in scheduler.scrapers if not scheduler.refresh(topic)]
+        print(f"\n✅ Capturas actualizadas: {len(scheduler.scrapers) - len(failed)}/{len(scheduler.scrapers)}")
+        if failed:
+            print(f"⚠️  Fallaron: {', '.join(failed)}")
+        return
+
+    print(f"🔄 Programador de capturas corriendo ({len(scheduler.scrapers)} temas)")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
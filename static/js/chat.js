@@ -10,6 +10,8 @@ class ChatViewModel {
         this.chatSidebar = document.getElementById('chat-sidebar');
 
         this.currentConversationId = null;
+        this.olderMessagesCursor = null;
+        this.conversationsCursor = null;
         this.isProcessing = false;
 
         this.setupEventListeners();
@@ -71,20 +73,59 @@ class ChatViewModel {
                 return;
             }
 
-            const conversations = await response.json();
-            this.displayConversations(conversations);
+            const data = await response.json();
+            this.displayConversations(data.conversations || []);
+            this.setConversationsCursor(data.nextCursor);
         } catch (error) {
             console.error('Error al cargar conversaciones:', error);
         }
     }
 
-    displayConversations(conversations) {
+    async loadMoreConversations() {
+        if (!this.conversationsCursor) return;
+
+        try {
+            const response = await fetch(`/api/conversations?cursor=${encodeURIComponent(this.conversationsCursor)}`);
+
+            if (!response.ok) {
+                return;
+            }
+
+            const data = await response.json();
+            this.displayConversations(data.conversations || [], true);
+            this.setConversationsCursor(data.nextCursor);
+        } catch (error) {
+            console.error('Error al cargar más conversaciones:', error);
+        }
+    }
+
+    // Muestra (o quita) el botón "Cargar más" al final de la lista
+    setConversationsCursor(nextCursor) {
+        this.conversationsCursor = nextCursor || null;
+        const existing = document.getElementById('load-more-conversations');
+        if (existing) existing.remove();
+
+        if (!this.conversationsCursor || !this.conversationsList) return;
+
+        const button = document.createElement('button');
+        button.id = 'load-more-conversations';
+        button.className = 'w-full text-xs text-gray-500 hover:text-gray-700 py-2';
+        button.textContent = 'Cargar más';
+        button.addEventListener('click', () => this.loadMoreConversations());
+        this.conversationsList.appendChild(button);
+    }
+
+    displayConversations(conversations, append = false) {
         if (!this.conversationsList) return;
 
-        this.conversationsList.innerHTML = '';
+        if (!append) {
+            this.conversationsList.innerHTML = '';
+        }
 
         if (conversations.length === 0) {
-            this.conversationsList.innerHTML = '<p class="text-gray-500 text-sm text-center py-4">No hay conversaciones</p>';
+            if (!append) {
+                this.conversationsList.innerHTML = '<p class="text-gray-500 text-sm text-center py-4">No hay conversaciones</p>';
+            }
             return;
         }
 
@@ -146,6 +187,7 @@ class ChatViewModel {
                     this.addBotMessage(msg.content, false);
                 }
             });
+            this.setOlderMessagesCursor(data.hasMore ? data.nextBefore : null);
 
             await this.loadConversations();
 
@@ -160,6 +202,57 @@ class ChatViewModel {
         }
     }
 
+    // Muestra (o quita) el botón para cargar la página anterior de mensajes
+    setOlderMessagesCursor(nextBefore) {
+        this.olderMessagesCursor = nextBefore;
+        const existing = document.getElementById('load-older-messages');
+        if (existing) existing.remove();
+
+        if (nextBefore === null || nextBefore === undefined) return;
+
+        const button = document.createElement('button');
+        button.id = 'load-older-messages';
+        button.className = 'block mx-auto my-2 text-xs text-gray-500 hover:text-gray-700';
+        button.textContent = 'Cargar mensajes anteriores';
+        button.addEventListener('click', () => this.loadOlderMessages());
+        this.chatContainer.prepend(button);
+    }
+
+    async loadOlderMessages() {
+        const convId = this.currentConversationId;
+        if (!convId || this.olderMessagesCursor === null) return;
+
+        try {
+            const response = await fetch(`/api/conversations/${convId}?before=${this.olderMessagesCursor}`);
+            if (!response.ok) {
+                throw new Error('Error al cargar mensajes anteriores');
+            }
+
+            const data = await response.json();
+            if (convId !== this.currentConversationId) return;
+
+            const previousHeight = this.chatContainer.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            (data.messages || []).forEach(msg => {
+                if (msg.role === 'user') {
+                    fragment.appendChild(this.createUserMessageElement(msg.content, false));
+                } else if (msg.role === 'assistant') {
+                    fragment.appendChild(this.createBotMessageElement(msg.content, false));
+                }
+            });
+
+            const button = document.getElementById('load-older-messages');
+            if (button) button.remove();
+            this.chatContainer.prepend(fragment);
+            this.setOlderMessagesCursor(data.hasMore ? data.nextBefore : null);
+
+            // Mantenemos la posición de lectura al insertar arriba
+            this.chatContainer.scrollTop += this.chatContainer.scrollHeight - previousHeight;
+        } catch (error) {
+            console.error('Error al cargar mensajes anteriores:', error);
+        }
+    }
+
     // CORRECCIÓN 2 PARTE A: Modificado para aceptar parámetro 'force' (sin preguntar)
     async deleteConversation(convId, force = false) {
         if (!force && !confirm('¿Estás seguro de que quieres eliminar esta conversación?')) {
@@ -213,8 +306,10 @@ class ChatViewModel {
         this.showTypingIndicator();
         this.setProcessing(true);
 
+        let streamingMessage = null;
+
         try {
-            const response = await fetch('/api/chat', {
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -223,20 +318,39 @@ class ChatViewModel {
                 })
             });
 
-            this.hideTypingIndicator();
-
             if (!response.ok) {
+                this.hideTypingIndicator();
                 const errorData = await response.json();
                 throw new Error(errorData.error || 'Error al enviar mensaje');
             }
 
-            const data = await response.json();
-            this.addBotMessage(data.message);
+            let fullText = '';
+            await this.readEventStream(response, (event, payload) => {
+                if (event === 'error') {
+                    throw new Error(payload.error || 'Error al procesar el mensaje');
+                }
+                if (event === 'message' && payload.token) {
+                    if (!streamingMessage) {
+                        this.hideTypingIndicator();
+                        streamingMessage = this.addStreamingBotMessage();
+                    }
+                    fullText += payload.token;
+                    streamingMessage.update(fullText);
+                }
+            });
+
+            this.hideTypingIndicator();
+            if (!streamingMessage) {
+                this.addBotMessage(fullText);
+            }
 
             await this.loadConversations();
         } catch (error) {
             console.error('Error al enviar mensaje:', error);
             this.hideTypingIndicator();
+            if (streamingMessage) {
+                streamingMessage.remove();
+            }
             this.addBotMessage('Lo siento, hubo un error al procesar tu mensaje. Por favor, intenta de nuevo.');
 
             // LÓGICA DE LIMPIEZA: Si era nueva y falló, la borramos
@@ -250,7 +364,43 @@ class ChatViewModel {
         }
     }
 
+    // Lee una respuesta text/event-stream y llama a onEvent(evento, datos) por cada frame
+    async readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+
+            for (const frame of frames) {
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+
     addUserMessage(message, animate = true) {
+        this.chatContainer.appendChild(this.createUserMessageElement(message, animate));
+        this.scrollToBottom();
+    }
+
+    createUserMessageElement(message, animate = true) {
         const userAvatar = window.userAvatarUrl || 'https://ui-avatars.com/api/?name=U&background=7b3238&color=fff';
         const messageDiv = document.createElement('div');
         messageDiv.className = `chat-message-user ${animate ? 'message-animate' : ''}`;
@@ -260,11 +410,15 @@ class ChatViewModel {
             </div>
             <img src="${userAvatar}" alt="User Avatar" class="chat-avatar">
         `;
-        this.chatContainer.appendChild(messageDiv);
-        this.scrollToBottom();
+        return messageDiv;
     }
 
     addBotMessage(message, animate = true) {
+        this.chatContainer.appendChild(this.createBotMessageElement(message, animate));
+        this.scrollToBottom();
+    }
+
+    createBotMessageElement(message, animate = true) {
         if (typeof marked === 'undefined') {
             console.error("marked.js no está cargada. Usando fallback de texto plano.");
             const fallbackDiv = document.createElement('div');
@@ -276,9 +430,7 @@ class ChatViewModel {
                     <p>${this.escapeHtml(message)}</p>
                 </div>
             `;
-            this.chatContainer.appendChild(fallbackDiv);
-            this.scrollToBottom();
-            return;
+            return fallbackDiv;
         }
 
         const messageDiv = document.createElement('div');
@@ -293,8 +445,34 @@ class ChatViewModel {
                 <div class="markdown-content">${renderedHtml}</div>
             </div>
         `;
+        return messageDiv;
+    }
+
+    // Crea una burbuja del bot vacía que se va rellenando mientras llegan los tokens
+    addStreamingBotMessage() {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'chat-message-bot message-animate';
+        messageDiv.innerHTML = `
+            <img src="https://i.ibb.co/chwxgYhY/New-Project-1.png" alt="Bot Avatar" class="chat-avatar">
+            <div class="message-bubble">
+                <p class="bot-name">BUHO</p>
+                <div class="markdown-content"></div>
+            </div>
+        `;
         this.chatContainer.appendChild(messageDiv);
-        this.scrollToBottom();
+        const content = messageDiv.querySelector('.markdown-content');
+
+        return {
+            update: (text) => {
+                if (typeof marked === 'undefined') {
+                    content.textContent = text;
+                } else {
+                    content.innerHTML = marked.parse(text);
+                }
+                this.scrollToBottom();
+            },
+            remove: () => messageDiv.remove()
+        };
     }
 
     showTypingIndicator() {
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+# Las pruebas no salen a la red ni escriben en data/: sin refresco de capturas
+# en segundo plano, sin journal de turnos y sin cachés en disco
+os.environ.setdefault('PREFETCH_MODE', 'off')
+os.environ.setdefault('TURN_JOURNAL_PATH', '')
+os.environ.setdefault('SCRAPE_HTTP_CACHE', '')
+os.environ.setdefault('SEARCH_CACHE_PATH', '')
+
+from scripts.bench_fakes import FakeFirestore  # noqa: E402
+
+
+class FakeClock:
+    """Reloj que solo avanza cuando la prueba mueve `now`."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def firestore_db():
+    """Firestore en memoria, sin latencia simulada."""
+    return FakeFirestore(latency=0)
+
+
+@pytest.fixture
+def make_conversation(firestore_db):
+    """Crea conversations/{id} con messageCount 0 (y los campos que se pasen)."""
+    def make(conversation_id, **fields):
+        doc_ref = firestore_db.collection('conversations').document(conversation_id)
+        doc_ref.set(dict({'messageCount': 0}, **fields))
+        return doc_ref
+    return make
@@ -0,0 +1,37 @@
+import pytest
+
+from utils.answer_cache import AnswerCache
+
+
+def cached_for(stored, asked):
+    cache = AnswerCache()
+    cache.store(stored, 'CALENDARIO', 'v1', 'respuesta guardada')
+    return cache.lookup(asked, 'CALENDARIO', 'v1')
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ("¿Cuándo empiezan las inscripciones de pregrado?", "¿Cuándo terminan las inscripciones de pregrado?"),
+    ("¿Cuándo abren las inscripciones?", "¿Cuándo cierran las inscripciones?"),
+    ("fechas del semestre 2025-1", "fechas del semestre 2025-2"),
+    ("¿Cuándo empieza el semestre 2025-1?", "¿Cuándo empieza el semestre 2026-1?"),
+    ("¿Cuándo empieza el semestre?", "¿Cuándo empieza el semestre de posgrado?"),
+])
+def test_preguntas_distintas_no_reutilizan_respuesta(stored, asked):
+    assert cached_for(stored, asked) is None
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ("¿Cuándo empieza el semestre?", "fecha inicio de clases"),
+    ("¿Cuándo empieza el semestre?", "cuando comienza el semestre"),
+    ("¿Cuándo empieza el semestre?", "¿cuándo inicia el semestre?"),
+    ("¿Cuándo empiezan las inscripciones de pregrado?", "cuando abren las inscripciones para pregrado"),
+])
+def test_parafrasis_reutilizan_respuesta(stored, asked):
+    assert cached_for(stored, asked) == 'respuesta guardada'
+
+
+def test_otra_version_del_contenido_no_reutiliza_respuesta():
+    cache = AnswerCache()
+    cache.store("¿Cuándo empieza el semestre?", 'CALENDARIO', 'v1', 'respuesta vieja')
+    assert cache.lookup("¿Cuándo empieza el semestre?", 'CALENDARIO', 'v2') is None
+    assert cache.stats()['invalidations'] == 1
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import asgi
+import app as flask_module
+from utils.metrics import REQUEST_SECONDS
+
+
+def post(path, headers=()):
+    """POST sin sesión a una ruta nativa de asgi.py; retorna (status, headers)."""
+    sent = []
+    messages = [{'type': 'http.request', 'body': b'{}', 'more_body': False}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'headers': list(headers)}
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent[0]['status'], dict(sent[0]['headers'])
+
+
+def flask_post(path, headers=None):
+    response = flask_module.app.test_client().post(path, json={}, headers=headers or {})
+    return response.status_code, response.headers
+
+
+def test_cors_igual_que_flask():
+    for path in asgi.ASYNC_ROUTES:
+        status, headers = post(path)
+        flask_status, flask_headers = flask_post(path)
+        assert status == flask_status == 401
+        assert headers[b'access-control-allow-origin'].decode() == flask_headers['Access-Control-Allow-Origin']
+
+        status, headers = post(path, [(b'origin', b'https://buho.example')])
+        _, flask_headers = flask_post(path, {'Origin': 'https://buho.example'})
+        assert headers[b'access-control-allow-origin'] == b'https://buho.example'
+        assert headers[b'vary'].decode() == flask_headers['Vary']
+
+
+def test_metricas_con_el_nombre_del_endpoint():
+    assert asgi.ASYNC_ENDPOINTS == {'/api/chat': 'chat', '/api/chat/stream': 'chat_stream'}
+    post('/api/chat/stream')
+    series = REQUEST_SECONDS.render()
+    assert any('endpoint="chat_stream",status="401"' in line for line in series)
+    assert not any('endpoint="/api/chat' in line for line in series)
+
+
+def test_rate_limit_fuera_del_event_loop(monkeypatch):
+    threads = []
+
+    def check_rate_limit(user_id, endpoint):
+        threads.append(threading.current_thread())
+        return False, 'Demasiadas peticiones'
+
+    monkeypatch.setattr(asgi, 'load_session', lambda scope: {'user_id': 'uid-123'})
+    monkeypatch.setattr(flask_module, 'firebase_initialized', True)
+    monkeypatch.setattr(flask_module, 'db', object())
+    monkeypatch.setattr(flask_module, 'check_rate_limit', check_rate_limit)
+
+    status, _ = post('/api/chat')
+    assert status == 429
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,33 @@
+from utils.context_builder import HISTORY_TOKEN_BUDGET, build_chat_context, estimate_tokens
+
+
+def messages(count, words):
+    text = ' '.join(['palabra'] * words)
+    return [{'seq': i, 'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'{i} {text}'}
+            for i in range(count)]
+
+
+def contents(history):
+    return [m['content'].split()[0] for m in history if m['role'] != 'system']
+
+
+def test_mensajes_sin_resumir_no_se_pierden():
+    # Más que la ventana reciente, pero sin resumen todavía (o el resumen falló)
+    history = messages(8, HISTORY_TOKEN_BUDGET // 8)
+    assert sum(estimate_tokens(m['content']) for m in history) > HISTORY_TOKEN_BUDGET
+    assert contents(build_chat_context('¿y luego?', history, {})) == [str(i) for i in range(8)]
+
+
+def test_lo_resumido_no_se_repite():
+    history = messages(8, 20)
+    conv_data = {'summary': 'Preguntó por el calendario.', 'summarizedThrough': 3}
+    result = build_chat_context('¿y luego?', history, conv_data)
+    assert result[0]['role'] == 'system'
+    assert contents(result) == ['4', '5', '6', '7']
+
+
+def test_respeta_el_presupuesto_total():
+    history = messages(40, 200)
+    result = build_chat_context('¿y luego?', history, {}, budget=3000)
+    assert contents(result)[-1] == '39'
+    assert sum(estimate_tokens(m['content']) for m in result) <= 3000
@@ -0,0 +1,32 @@
+from utils.context_builder import estimate_tokens
+from utils.context_select import select_context, split_chunks
+
+FILLER = "Información general de la universidad sobre trámites, sedes y dependencias administrativas."
+
+
+def test_respeta_el_presupuesto_con_muchos_rotulos():
+    lines = []
+    for i in range(200):
+        lines.append(f"FUENTE: https://unal.edu.co/pagina-{i}")
+        lines.append(f"{FILLER} Párrafo {i}.")
+    text = "\n".join(lines)
+    selected = select_context("¿dónde queda la sede?", text, budget=300)
+    assert estimate_tokens(selected) <= 300
+    assert selected.startswith("FUENTE: https://unal.edu.co/pagina-0")
+
+
+def test_linea_larga_en_mayusculas_no_es_rotulo():
+    long_line = "INSCRIPCIONES: " + " ".join(["texto"] * 400)
+    assert split_chunks(f"FUENTE: https://unal.edu.co\n{long_line}")[0] == (True, "FUENTE: https://unal.edu.co")
+    assert not any(is_label for is_label, _ in split_chunks(long_line))
+
+    text = "\n".join(["FUENTE: https://unal.edu.co", long_line, "Inicio de clases: 4 de agosto de 2025."])
+    selected = select_context("¿cuándo es el inicio de clases?", text, budget=100)
+    assert estimate_tokens(selected) <= 100
+    assert "Inicio de clases: 4 de agosto" in selected
+    assert "FUENTE: https://unal.edu.co" in selected
+
+
+def test_texto_corto_no_cambia():
+    text = "FUENTE: https://unal.edu.co\nInicio de clases: 4 de agosto."
+    assert select_context("¿cuándo empiezan las clases?", text) == text
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.conversation_store import append_messages, get_messages_page
+
+
+def test_turnos_simultaneos_no_repiten_seq(firestore_db, make_conversation):
+    db = firestore_db
+    # Un poco de latencia para que los turnos se intercalen
+    db.latency = 0.001
+    doc_ref = make_conversation('conv-1', userId='uid-123')
+    # Todos parten de la misma copia vieja, como si vinieran de la caché
+    stale = {'userId': 'uid-123', 'messageCount': 0}
+
+    def turn(i):
+        return append_messages(db, doc_ref, dict(stale), [
+            {'role': 'user', 'content': f'pregunta {i}'},
+            {'role': 'assistant', 'content': f'respuesta {i}'},
+        ])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = list(pool.map(turn, range(8)))
+
+    assert sorted(counts) == list(range(2, 17, 2))
+    assert doc_ref.get().to_dict()['messageCount'] == 16
+    page, next_before = get_messages_page(doc_ref, {'messageCount': 16}, limit=50)
+    assert [m['seq'] for m in page] == list(range(16))
+    assert next_before is None
+    # Cada turno quedó con seq consecutivos
+    for message in page[::2]:
+        i = message['content'].split()[-1]
+        assert page[message['seq'] + 1]['content'] == f'respuesta {i}'
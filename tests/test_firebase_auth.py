@@ -0,0 +1,172 @@
+import datetime
+import time
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from utils.firebase_auth import MIN_REFRESH_INTERVAL, SigningKeyCache, verify_id_token_locally
+
+PROJECT_ID = 'buho-test'
+
+
+def make_key_pair():
+    """Llave RSA y certificado autofirmado en PEM, como los que publica Google."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'securetoken.test')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+@pytest.fixture(scope='module')
+def key_a():
+    return make_key_pair()
+
+
+@pytest.fixture(scope='module')
+def key_b():
+    return make_key_pair()
+
+
+class FakeFetcher:
+    """Sirve los certificados de `certs` y cuenta las descargas."""
+
+    def __init__(self, certs, max_age=3600):
+        self.certs = certs
+        self.max_age = max_age
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.certs), self.max_age
+
+
+def make_token(private_key, kid, **overrides):
+    now = int(time.time())
+    claims = {
+        'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+        'aud': PROJECT_ID,
+        'sub': 'uid-123',
+        'iat': now,
+        'exp': now + 3600,
+        'auth_time': now,
+        'email': 'estudiante@unal.edu.co',
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+@pytest.fixture
+def make_keys(clock):
+    """SigningKeyCache con el reloj de la prueba; sus llaves las sirve un FakeFetcher."""
+    def make(certs):
+        fetcher = FakeFetcher(certs)
+        return SigningKeyCache(fetcher=fetcher, clock=clock), fetcher
+    return make
+
+
+def test_token_valido(key_a, make_keys):
+    private_key, cert = key_a
+    keys, _ = make_keys({'a': cert})
+    claims = verify_id_token_locally(make_token(private_key, 'a'), PROJECT_ID, keys)
+    assert claims['sub'] == 'uid-123'
+    assert claims['email'] == 'estudiante@unal.edu.co'
+
+
+def test_audiencia_equivocada(key_a, make_keys):
+    private_key, cert = key_a
+    keys, _ = make_keys({'a': cert})
+    with pytest.raises(jwt.InvalidAudienceError):
+        verify_id_token_locally(make_token(private_key, 'a', aud='otro-proyecto'), PROJECT_ID, keys)
+
+
+def test_emisor_equivocado(key_a, make_keys):
+    private_key, cert = key_a
+    keys, _ = make_keys({'a': cert})
+    token = make_token(private_key, 'a', iss='https://securetoken.google.com/otro-proyecto')
+    with pytest.raises(jwt.InvalidIssuerError):
+        verify_id_token_locally(token, PROJECT_ID, keys)
+
+
+def test_token_vencido(key_a, make_keys):
+    private_key, cert = key_a
+    keys, _ = make_keys({'a': cert})
+    now = int(time.time())
+    token = make_token(private_key, 'a', iat=now - 7200, exp=now - 3600, auth_time=now - 7200)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verify_id_token_locally(token, PROJECT_ID, keys)
+
+
+def test_firma_de_otra_llave(key_a, key_b, make_keys):
+    _, cert_a = key_a
+    private_b, _ = key_b
+    keys, _ = make_keys({'a': cert_a})
+    with pytest.raises(jwt.InvalidSignatureError):
+        verify_id_token_locally(make_token(private_b, 'a'), PROJECT_ID, keys)
+
+
+def test_algoritmo_distinto_de_rs256(key_a, make_keys):
+    _, cert = key_a
+    keys, fetcher = make_keys({'a': cert})
+    token = jwt.encode({'sub': 'uid-123', 'aud': PROJECT_ID}, 'secreto-compartido-de-al-menos-32-bytes',
+                       algorithm='HS256', headers={'kid': 'a'})
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        verify_id_token_locally(token, PROJECT_ID, keys)
+    # Se rechaza antes de buscar la llave
+    assert fetcher.calls == 0
+
+
+def test_kid_desconocido_vuelve_a_descargar(key_a, key_b, make_keys, clock):
+    private_a, cert_a = key_a
+    private_b, cert_b = key_b
+    keys, fetcher = make_keys({'a': cert_a})
+    verify_id_token_locally(make_token(private_a, 'a'), PROJECT_ID, keys)
+    assert fetcher.calls == 1
+
+    # Google publica una llave nueva antes de que venza nuestra copia
+    fetcher.certs = {'a': cert_a, 'b': cert_b}
+    clock.now += MIN_REFRESH_INTERVAL
+    claims = verify_id_token_locally(make_token(private_b, 'b'), PROJECT_ID, keys)
+    assert claims['sub'] == 'uid-123'
+    assert fetcher.calls == 2
+
+
+def test_kid_desconocido_no_descarga_en_cada_peticion(key_a, key_b, make_keys, clock):
+    private_a, cert_a = key_a
+    private_b, _ = key_b
+    keys, fetcher = make_keys({'a': cert_a})
+    verify_id_token_locally(make_token(private_a, 'a'), PROJECT_ID, keys)
+
+    clock.now += MIN_REFRESH_INTERVAL
+    for _ in range(3):
+        with pytest.raises(jwt.InvalidKeyError):
+            verify_id_token_locally(make_token(private_b, 'desconocido'), PROJECT_ID, keys)
+    # Una sola recarga forzada dentro de MIN_REFRESH_INTERVAL
+    assert fetcher.calls == 2
+
+
+def test_rotacion_de_llaves(key_a, key_b, make_keys, clock):
+    private_a, cert_a = key_a
+    private_b, cert_b = key_b
+    keys, fetcher = make_keys({'a': cert_a})
+    verify_id_token_locally(make_token(private_a, 'a'), PROJECT_ID, keys)
+
+    # Al vencer el max-age se recargan las llaves y la vieja deja de servir
+    fetcher.certs = {'b': cert_b}
+    clock.now += fetcher.max_age
+    verify_id_token_locally(make_token(private_b, 'b'), PROJECT_ID, keys)
+    assert fetcher.calls == 2
+    with pytest.raises(jwt.InvalidKeyError):
+        verify_id_token_locally(make_token(private_a, 'a'), PROJECT_ID, keys)
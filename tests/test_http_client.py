@@ -0,0 +1,52 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils import http_client, scraper
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Responde con el código de la ruta: /200, /404, /503..."""
+
+    def do_GET(self):
+        status = int(self.path.strip('/').split('/')[0])
+        body = f"<html><body><p>Página de respuesta {status} con texto suficiente.</p></body></html>".encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url(monkeypatch):
+    # Sin la caché HTTP en disco, para no escribir en data/
+    monkeypatch.setattr(http_client, 'get_scrape_session', requests.Session)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_pagina_ok(base_url):
+    page = http_client.fetch_page(f"{base_url}/200")
+    assert page.status_code == 200
+    assert b'respuesta 200' in page.content
+
+
+@pytest.mark.parametrize('status', [403, 404, 500, 503])
+def test_pagina_de_error_lanza(base_url, status):
+    with pytest.raises(requests.HTTPError):
+        http_client.fetch_page(f"{base_url}/{status}")
+
+
+def test_pagina_de_error_no_llega_al_scraper_ni_a_la_cache(base_url):
+    url = f"{base_url}/503/seguridad"
+    assert scraper.visit_and_scrape_url(url) is None
+    assert scraper.parsed_pages.peek((url, None)) is None
@@ -0,0 +1,28 @@
+import pytest
+
+from utils.intent_classifier import rank_locally
+
+
+@pytest.mark.parametrize('message', [
+    "mi papa quiere saber donde queda la u",
+    "mi papá quiere saber dónde queda la U",
+])
+def test_papa_no_es_el_promedio(message):
+    topics, source = rank_locally(message)
+    assert (topics[0][0], source) != ("MATERIAS", 'rules')
+
+
+@pytest.mark.parametrize('message', [
+    "cómo se calcula el p.a.p.a",
+    "cuál es mi P.A.P.A.?",
+    "mi papa promedio",
+    "cómo subo el promedio académico",
+])
+def test_promedio_academico_es_materias(message):
+    assert rank_locally(message) == ([("MATERIAS", 0.95)], 'rules')
+
+
+def test_pregunta_con_dos_temas():
+    topics, source = rank_locally("¿qué posgrados hay y cuándo abren inscripciones?")
+    assert [label for label, _ in topics] == ["POSGRADOS", "ADMISIONES"]
+    assert source == 'rules'
@@ -0,0 +1,23 @@
+import app as flask_module
+
+
+def get_metrics(headers=None, remote_addr='127.0.0.1'):
+    client = flask_module.app.test_client()
+    return client.get('/metrics', headers=headers or {}, environ_base={'REMOTE_ADDR': remote_addr})
+
+
+def test_sin_token_solo_responde_localmente(monkeypatch):
+    monkeypatch.setattr(flask_module, 'METRICS_TOKEN', '')
+    assert get_metrics().status_code == 200
+    assert get_metrics(remote_addr='10.0.0.7').status_code == 403
+    # Por el proxy de la misma máquina llega como local, pero con X-Forwarded-For
+    assert get_metrics({'X-Forwarded-For': '203.0.113.9'}).status_code == 403
+
+
+def test_con_token_lo_exige(monkeypatch):
+    monkeypatch.setattr(flask_module, 'METRICS_TOKEN', 'secreto')
+    assert get_metrics().status_code == 401
+    assert get_metrics({'Authorization': 'Bearer otro'}).status_code == 401
+    response = get_metrics({'Authorization': 'Bearer secreto'}, remote_addr='10.0.0.7')
+    assert response.status_code == 200
+    assert b'buho_' in response.data
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from utils import model_router
+from utils.model_router import GROQ_MODEL, GROQ_SMALL_MODEL, ModelRouter
+
+
+def failure(model):
+    return {'success': False, 'error': f'falló {model}', 'retryable': True, 'model': model}
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """Router con hedging inmediato: el respaldo sale a los 10 ms."""
+    fresh = ModelRouter()
+    monkeypatch.setattr(model_router, 'router', fresh)
+    monkeypatch.setattr(fresh, 'choose', lambda *args, **kwargs: (GROQ_MODEL, 'default'))
+    monkeypatch.setattr(fresh, 'hedge_delay', lambda model: 0.01)
+    return fresh
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """El modelo grande falla último (a los 200 ms); el pequeño, enseguida."""
+    calls = []
+    delays = {GROQ_MODEL: 0.2, GROQ_SMALL_MODEL: 0.05}
+
+    def ask(prompt, history, model):
+        calls.append(model)
+        time.sleep(delays[model])
+        return failure(model)
+
+    async def ask_async(prompt, history, model):
+        calls.append(model)
+        await asyncio.sleep(delays[model])
+        return failure(model)
+
+    monkeypatch.setattr(model_router, '_timed_ask', ask)
+    monkeypatch.setattr(model_router, '_timed_ask_async', ask_async)
+    return calls
+
+
+def outcomes(router):
+    return {(model, outcome): n for (model, _, outcome), n in router._outcomes.items()}
+
+
+def test_si_fallan_los_dos_se_registra_cada_modelo(router, calls):
+    response = model_router.ask_model('hola')
+    assert response['model'] == GROQ_MODEL
+    assert outcomes(router) == {(GROQ_SMALL_MODEL, 'error'): 1, (GROQ_MODEL, 'error'): 1}
+    # El respaldo ya corrió en paralelo: no se repite
+    assert sorted(calls) == sorted([GROQ_MODEL, GROQ_SMALL_MODEL])
+
+
+def test_si_fallan_los_dos_se_registra_cada_modelo_async(router, calls):
+    response = asyncio.run(model_router.ask_model_async('hola'))
+    assert response['model'] == GROQ_MODEL
+    assert outcomes(router) == {(GROQ_SMALL_MODEL, 'error'): 1, (GROQ_MODEL, 'error'): 1}
+    assert sorted(calls) == sorted([GROQ_MODEL, GROQ_SMALL_MODEL])
@@ -0,0 +1,23 @@
+import contextvars
+
+from groq import Groq
+
+from utils.deadline import start_deadline
+from utils.ollama_client import _with_timeout
+
+
+def test_sin_plazo_conserva_los_reintentos_del_sdk():
+    client = Groq(api_key='gsk-prueba')
+    assert _with_timeout(client, 15).max_retries == client.max_retries == 2
+    assert _with_timeout(client, None) is client
+
+
+def test_con_plazo_justo_deja_un_reintento():
+    client = Groq(api_key='gsk-prueba')
+
+    def within_request():
+        start_deadline(40)
+        return _with_timeout(client, 5).max_retries, _with_timeout(client, 15).max_retries
+
+    # El plazo queda en una copia del contexto y no se filtra a otras pruebas
+    assert contextvars.copy_context().run(within_request) == (2, 1)
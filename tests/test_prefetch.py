@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from utils.prefetch import PrefetchScheduler
+from utils.scraper import DegradedScrape, is_valid_scrape
+from utils.snapshots import SnapshotStore
+
+
+@pytest.fixture
+def make_scheduler(tmp_path):
+    """Programador de CALENDARIO con `scraper`, guardando en tmp_path."""
+    def make(scraper):
+        store = SnapshotStore(root=str(tmp_path))
+        return PrefetchScheduler(scrapers={'CALENDARIO': scraper}, store=store), store
+    return make
+
+
+def test_resultado_parcial_no_es_valido():
+    assert is_valid_scrape("FUENTE: https://unal.edu.co\n\nInicio de clases: 4 de agosto")
+    assert not is_valid_scrape(DegradedScrape("No pude leer la página completa, pero Google dice esto: ..."))
+    assert not is_valid_scrape("Error buscando calendario.")
+    assert not is_valid_scrape("")
+
+
+def test_resultado_parcial_conserva_la_ultima_captura_buena(tmp_path, make_scheduler):
+    results = iter([
+        "FUENTE: https://unal.edu.co\n\nInicio de clases: 4 de agosto",
+        DegradedScrape("No pude leer la página completa, pero Google dice esto: calendario (Link: x)"),
+        "Error buscando calendario.",
+    ])
+    scheduler, store = make_scheduler(lambda: next(results))
+
+    assert scheduler.refresh('CALENDARIO')
+    good = store.get('CALENDARIO')
+    assert not scheduler.refresh('CALENDARIO')
+    assert not scheduler.refresh('CALENDARIO')
+
+    assert store.get('CALENDARIO') == good
+    assert SnapshotStore(root=str(tmp_path)).get('CALENDARIO')['version'] == good['version']
+    assert scheduler.stats()['CALENDARIO']['failures'] == 2
+
+
+def test_un_solo_programador_por_carpeta(make_scheduler):
+    first, _ = make_scheduler(lambda: "Inicio de clases: 4 de agosto")
+    second, _ = make_scheduler(lambda: "Inicio de clases: 4 de agosto")
+    assert first.acquire_host_lock()
+    assert first.is_leader
+    assert not second.acquire_host_lock()
+    assert not second.is_leader
+
+
+def test_guardar_no_deja_temporales(tmp_path, make_scheduler):
+    _, store = make_scheduler(None)
+    store.save('CALENDARIO', "versión 1")
+    store.save('CALENDARIO', "versión 2")
+    names = sorted(os.listdir(tmp_path / 'CALENDARIO'))
+    assert 'latest.json' in names
+    assert not [name for name in names if name.endswith('.tmp')]
+    assert SnapshotStore(root=str(tmp_path)).get('CALENDARIO')['data'] == "versión 2"
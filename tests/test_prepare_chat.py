@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as flask_module
+from utils import scraper
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch, firestore_db):
+    monkeypatch.setattr(flask_module, 'db', firestore_db)
+    return firestore_db
+
+
+@pytest.fixture
+def scrape_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(flask_module, 'classify_and_scrape',
+                        lambda message, ranked=None: calls.append(message) or ('NINGUNO', None, None))
+    return calls
+
+
+def prepare(user_id, conversation_id):
+    with flask_module.app.test_request_context():
+        turn, error = flask_module.prepare_chat_turn(
+            user_id, {'message': '¿Cuándo empieza el semestre?', 'conversationId': conversation_id})
+        return turn, error and error[1]
+
+
+def test_conversacion_ajena_no_clasifica_ni_scrapea(make_conversation, scrape_calls):
+    make_conversation('conv-1', userId='otro')
+    assert prepare('uid-123', 'conv-1') == (None, 403)
+    assert prepare('uid-123', 'no-existe') == (None, 404)
+    assert scrape_calls == []
+
+
+def test_conversacion_propia_arma_el_contexto(make_conversation, scrape_calls):
+    make_conversation('conv-2', userId='uid-123')
+    turn, error = prepare('uid-123', 'conv-2')
+    assert error is None and turn is not None
+    assert scrape_calls == ['¿Cuándo empieza el semestre?']
+
+
+def guess_then(final_topics):
+    """detect_intents falso: adivina CALENDARIO, 'le pregunta a Groq' y responde `final_topics`."""
+    def detect(message, before_llm=None, ranked=None):
+        before_llm('CALENDARIO')
+        return final_topics
+    return detect
+
+
+def test_contexto_adelantado_respeta_el_timeout(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(scraper, 'detect_intents', guess_then(['CALENDARIO']))
+    monkeypatch.setattr(scraper, 'topic_context', lambda message, topic, share=1: release.wait() and ('x', 'v'))
+    monkeypatch.setattr(scraper, 'SCRAPE_TOPIC_TIMEOUT', 0.1)
+    started = time.monotonic()
+    try:
+        assert scraper.classify_and_scrape('¿Cuándo empieza el semestre?') == ('CALENDARIO', None, None)
+        assert time.monotonic() - started < 2
+    finally:
+        release.set()
+
+
+def test_adivinanza_descartada_se_cancela(monkeypatch):
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    submitted = []
+    original_submit = executor.submit
+
+    def submit(*args, **kwargs):
+        future = original_submit(*args, **kwargs)
+        submitted.append(future)
+        return future
+
+    monkeypatch.setattr(executor, 'submit', submit)
+    monkeypatch.setattr(scraper, '_scrape_executor', executor)
+    monkeypatch.setattr(scraper, 'detect_intents', guess_then(['NINGUNO']))
+    monkeypatch.setattr(scraper, 'topic_context', lambda message, topic, share=1: (None, None))
+    # El único hilo del pool está ocupado: la adivinanza queda en cola
+    busy = original_submit(release.wait)
+    try:
+        assert scraper.classify_and_scrape('hola') == ('NINGUNO', None, None)
+        [speculative] = submitted
+        assert speculative.cancelled()
+    finally:
+        release.set()
+        busy.result()
+        executor.shutdown()
@@ -0,0 +1,106 @@
+import pytest
+
+from utils.rate_limit import (
+    LoginLockout, MemoryBackend, SQLiteBackend, SlidingWindowCounter, create_backend,
+)
+
+WINDOW = 60
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path, clock):
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'rate_limits.db'), clock=clock)
+    return MemoryBackend(clock=clock)
+
+
+@pytest.fixture
+def counter(backend, clock):
+    # Empieza justo al inicio de una ventana
+    clock.now = 1_000_020.0
+    assert clock.now % WINDOW == 0
+    return SlidingWindowCounter(backend, 'rate', WINDOW, clock=clock)
+
+
+def test_limite_dentro_de_la_ventana(counter):
+    assert all(counter.hit('uid', 10) for _ in range(10))
+    assert not counter.hit('uid', 10)
+    # Lo rechazado no cuenta
+    assert counter.count('uid') == 10
+    assert counter.hit('otro', 10)
+
+
+def test_la_ventana_anterior_pesa_lo_que_se_solapa(counter, clock):
+    for _ in range(10):
+        counter.hit('uid', 10)
+
+    # A mitad de la ventana siguiente, la anterior cuenta la mitad
+    clock.now += WINDOW * 1.5
+    assert counter.count('uid') == pytest.approx(5)
+    assert all(counter.hit('uid', 10) for _ in range(5))
+    assert not counter.hit('uid', 10)
+
+    # Justo al empezar otra ventana, la anterior (con 5) cuenta completa
+    clock.now += WINDOW / 2
+    assert counter.count('uid') == pytest.approx(5)
+    # Dos ventanas después ya no queda nada
+    clock.now += WINDOW * 2
+    assert counter.count('uid') == 0
+
+
+def test_reset_borra_el_conteo(counter):
+    for _ in range(10):
+        counter.hit('uid', 10)
+    counter.reset('uid')
+    assert counter.count('uid') == 0
+    assert counter.hit('uid', 10)
+
+
+def test_bloqueo_de_login_y_reset(backend, clock):
+    lockout = LoginLockout(backend, max_attempts=3, duration=900, clock=clock)
+    for _ in range(2):
+        lockout.record_failure('estudiante@unal.edu.co')
+    assert not lockout.too_many_failures('estudiante@unal.edu.co')
+    lockout.record_failure('estudiante@unal.edu.co')
+    assert lockout.too_many_failures('estudiante@unal.edu.co')
+
+    lockout.lock('estudiante@unal.edu.co')
+    assert lockout.locked_for('estudiante@unal.edu.co') == 900
+    clock.now += 899
+    assert lockout.locked_for('estudiante@unal.edu.co') == 1
+    clock.now += 1
+    assert lockout.locked_for('estudiante@unal.edu.co') == 0
+
+    lockout.lock('estudiante@unal.edu.co')
+    lockout.reset('estudiante@unal.edu.co')
+    assert lockout.locked_for('estudiante@unal.edu.co') == 0
+    assert not lockout.too_many_failures('estudiante@unal.edu.co')
+
+
+def test_sqlite_vence_y_se_comparte_entre_procesos(tmp_path, clock):
+    path = str(tmp_path / 'rate_limits.db')
+    first = SQLiteBackend(path, clock=clock)
+    second = SQLiteBackend(path, clock=clock)
+
+    assert first.incr('k', 1, ttl=10) == 1
+    assert second.incr('k', 2, ttl=10) == 3
+    assert first.get('k') == 3
+
+    # Al vencer, el contador vuelve a empezar (y con un TTL nuevo)
+    clock.now += 10
+    assert first.get('k') == 0
+    assert second.incr('k', 1, ttl=10) == 1
+    clock.now += 5
+    assert first.get('k') == 1
+
+    first.set('lock', 42, ttl=5)
+    assert second.get('lock') == 42
+    second.delete('lock', 'k')
+    assert first.get('lock') == 0 and first.get('k') == 0
+
+
+def test_create_backend(tmp_path):
+    assert isinstance(create_backend('memory'), MemoryBackend)
+    backend = create_backend(f"sqlite:///{tmp_path / 'rate_limits.db'}")
+    assert isinstance(backend, SQLiteBackend)
+    assert backend.path == str(tmp_path / 'rate_limits.db')
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts.build_index import Crawler
+from utils.search_index import SearchIndex, publish_index, current_index_path, write_index
+
+PAGES = {
+    '/': """<html><head><title>Inicio</title></head><body>
+        <nav><a href="/admisiones">Admisiones</a> <a href="/posgrados">Posgrados</a></nav>
+        <p>Bienvenidos al portal de pruebas de la Universidad Nacional de Colombia.</p>
+        </body></html>""",
+    '/admisiones': """<html><head><title>Admisiones</title></head><body>
+        <h2>Inscripciones de pregrado</h2>
+        <p>Las inscripciones para el examen de admisión de pregrado abren el 3 de febrero.</p>
+        <a href="/">Inicio</a></body></html>""",
+    '/posgrados': """<html><head><title>Posgrados</title></head><body>
+        <h2>Maestrías y doctorados</h2>
+        <p>La convocatoria de maestrías en ingeniería recibe documentos hasta el 15 de marzo.</p>
+        </body></html>""",
+}
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Sitio de prueba con ETag: responde 304 si la página no cambió."""
+
+    def do_GET(self):
+        site = self.server.site
+        body = site.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        site.requests.append(self.path)
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()[:12]
+        if self.headers.get('If-None-Match') == etag:
+            site.not_modified.append(self.path)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    server.site = site_state = type('Site', (), {})()
+    site_state.pages = dict(PAGES)
+    site_state.requests = []
+    site_state.not_modified = []
+    site_state.base_url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield site_state
+    server.shutdown()
+    server.server_close()
+
+
+def build(site, root, name, previous=None):
+    crawler = Crawler([site.base_url + '/'], previous, max_pages=10, max_depth=2, delay=0)
+    pages = crawler.crawl()
+    write_index(str(root / name), pages)
+    publish_index(str(root), name)
+    return pages, crawler.stats, SearchIndex(current_index_path(str(root)))
+
+
+def test_construye_y_consulta(site, tmp_path):
+    pages, stats, index = build(site, tmp_path, 'v1')
+    assert set(pages) == {site.base_url + p for p in PAGES}
+    assert stats['fetched'] == 3
+
+    results = index.search('¿cuándo abren las inscripciones de pregrado?', k=1)
+    assert results[0][1]['url'] == site.base_url + '/admisiones'
+    assert results[0][1]['heading'] == 'Inscripciones de pregrado'
+
+    posgrados = index.pages_with_prefix((site.base_url + '/posgrados',))
+    results = index.search('documentos maestrías', pages=posgrados)
+    assert [chunk['url'] for _, chunk in results] == [site.base_url + '/posgrados']
+    index.close()
+
+
+def test_rastreo_incremental_usa_etag(site, tmp_path):
+    pages, _, index = build(site, tmp_path, 'v1')
+    index.close()
+
+    # Nada cambió: todas las páginas responden 304 y se reutiliza lo anterior
+    site.requests.clear()
+    again, stats, index = build(site, tmp_path, 'v2', previous=pages)
+    index.close()
+    assert stats['fetched'] == 0 and stats['not_modified'] == 3
+    assert sorted(site.not_modified) == sorted(PAGES)
+    assert again == pages
+
+    # Cambia una página: solo esa se descarga y el índice nuevo la refleja
+    site.not_modified.clear()
+    site.pages['/posgrados'] = PAGES['/posgrados'].replace('15 de marzo', '30 de abril')
+    _, stats, index = build(site, tmp_path, 'v3', previous=again)
+    assert stats['fetched'] == 1 and stats['not_modified'] == 2
+    assert '/posgrados' not in site.not_modified
+    [(_, chunk)] = index.search('convocatoria maestrías', k=1)
+    assert '30 de abril' in chunk['text']
+    assert index.version == 'v3'
+    index.close()
@@ -0,0 +1,44 @@
+import pytest
+
+from utils.conversation_store import write_journal_turns
+from utils.turn_journal import TURN_JOURNAL_FAILED_DAYS, TURN_JOURNAL_MAX_ATTEMPTS, TurnJournal
+
+TURN = [{'role': 'user', 'content': 'hola'}, {'role': 'assistant', 'content': '¡Hola!'}]
+
+
+@pytest.fixture
+def journal(tmp_path, clock):
+    return TurnJournal(str(tmp_path / 'journal.db'), clock=clock)
+
+
+def test_conversacion_borrada_se_descarta_sin_reintentar(journal, firestore_db, make_conversation):
+    db = firestore_db
+    make_conversation('viva')
+    journal.append('viva', 0, TURN)
+    journal.append('borrada', 0, TURN)
+
+    assert journal.flush(lambda turns: write_journal_turns(db, turns)) == 1
+
+    stats = journal.stats()
+    assert stats['dropped'] == 1 and stats['retries'] == 0
+    assert stats['pending'] == 0 and stats['failed_pending'] == 0
+    assert db.collection('conversations').document('viva').get().to_dict()['messageCount'] == 2
+
+
+def test_turnos_fallidos_se_borran_al_vencer(journal, clock):
+    journal.append('c1', 0, TURN)
+
+    def broken(turns):
+        raise RuntimeError('Firestore no responde')
+
+    for _ in range(TURN_JOURNAL_MAX_ATTEMPTS):
+        journal.flush(broken)
+        clock.now += 3600
+    assert journal.stats()['failed_pending'] == 1
+
+    # Un turno fallido se conserva unos días para revisarlo y luego se borra
+    clock.now += TURN_JOURNAL_FAILED_DAYS * 86400
+    journal.append('c2', 0, TURN)
+    journal.flush(lambda turns: None)
+    stats = journal.stats()
+    assert stats['failed_pending'] == 0 and stats['pending'] == 0
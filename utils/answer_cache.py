@@ -0,0 +1,152 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from utils.intent_classifier import char_ngrams, normalize_text
+
+# Respuestas guardadas como máximo (LRU) y su vida máxima en segundos
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', '500'))
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', str(24 * 3600)))
+# Similitud coseno mínima (n-gramas de caracteres) para considerar dos preguntas iguales;
+# además deben tener las mismas cifras y las mismas palabras de contenido (ver _guard)
+ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', '0.8'))
+
+
+def normalize_question(text):
+    """Pregunta en minúsculas, sin tildes ni signos de puntuación."""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize_text(text)).split())
+
+
+# Palabras que no aportan al significado de la pregunta
+_STOPWORDS = {
+    'a', 'al', 'como', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'me', 'mi', 'para', 'por', 'que', 'se', 'son', 'su', 'un', 'una', 'y', 'hay',
+    'puedo', 'quiero', 'saber', 'dime', 'cual', 'cuales', 'unal', 'universidad', 'nacional',
+}
+# Sinónimos frecuentes en las preguntas de los estudiantes
+_SYNONYMS = {
+    'cuando': 'fecha', 'fechas': 'fecha', 'dia': 'fecha',
+    'empieza': 'inicio', 'empiezan': 'inicio', 'comienza': 'inicio', 'comienzan': 'inicio',
+    'inicia': 'inicio', 'inician': 'inicio', 'arranca': 'inicio', 'abren': 'inicio', 'abre': 'inicio',
+    'termina': 'fin', 'terminan': 'fin', 'acaba': 'fin', 'acaban': 'fin', 'finaliza': 'fin',
+    'cierran': 'fin', 'cierra': 'fin', 'final': 'fin',
+    'clases': 'semestre', 'periodo': 'semestre',
+    'inscribirme': 'inscripcion', 'inscripciones': 'inscripcion', 'inscribo': 'inscripcion',
+    'carreras': 'carrera', 'pregrados': 'carrera', 'programas': 'carrera',
+    'maestrias': 'maestria', 'doctorados': 'doctorado', 'posgrado': 'posgrados',
+}
+
+
+def canonical_question(normalized):
+    """Palabras de contenido con sinónimos unificados; es lo que se compara."""
+    words = [_SYNONYMS.get(w, w) for w in normalized.split() if w not in _STOPWORDS]
+    return " ".join(words) or normalized
+
+
+def _guard(canonical):
+    """
+    Lo que debe coincidir exactamente para reutilizar una respuesta parecida:
+    las cifras (años, semestres) y el conjunto de palabras de contenido. Así
+    "empiezan" y "terminan", o "2025-1" y "2025-2", nunca se confunden.
+    """
+    return tuple(re.findall(r"\d+", canonical)), frozenset(canonical.split())
+
+
+def snapshot_version(scraped_data):
+    """Huella del contenido extraído; si la página cambia, cambia la huella."""
+    return hashlib.sha1((scraped_data or '').encode('utf-8')).hexdigest()[:16]
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class AnswerCache:
+    """
+    Caché de respuestas para preguntas de primer turno. Cada respuesta queda
+    asociada al tema y a la versión del contenido extraído con que se generó;
+    cuando el contenido de un tema cambia, sus respuestas viejas se descartan.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL,
+                 similarity=ANSWER_CACHE_SIMILARITY, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._clock = clock
+        self._entries = OrderedDict()  # (tema, versión, pregunta) -> (respuesta, vector, creada, guarda)
+        self._versions = {}            # tema -> versión vigente
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0,
+                       'evictions': 0, 'invalidations': 0}
+
+    def _invalidate_topic(self, topic, version):
+        """Si el contenido del tema cambió, borra las respuestas de la versión anterior."""
+        if self._versions.get(topic) == version:
+            return
+        self._versions[topic] = version
+        stale = [key for key in self._entries if key[0] == topic and key[1] != version]
+        for key in stale:
+            del self._entries[key]
+        self._stats['invalidations'] += len(stale)
+
+    def lookup(self, question, topic, version):
+        """Retorna la respuesta guardada para la pregunta (o una parecida), o None."""
+        normalized = normalize_question(question)
+        now = self._clock()
+        with self._lock:
+            self._invalidate_topic(topic, version)
+
+            key = (topic, version, normalized)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+
+            canonical = canonical_question(normalized)
+            vector, guard = char_ngrams(canonical), _guard(canonical)
+            best_key, best_score = None, self.similarity
+            for other_key, (_, other_vector, created, other_guard) in self._entries.items():
+                if other_key[0] != topic or other_key[1] != version or now - created >= self.ttl:
+                    continue
+                if other_guard != guard:
+                    continue
+                score = _cosine(vector, other_vector)
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+
+            if best_key is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self._stats['similar_hits'] += 1
+            return self._entries[best_key][0]
+
+    def store(self, question, topic, version, answer):
+        if not answer:
+            return
+        normalized = normalize_question(question)
+        with self._lock:
+            self._invalidate_topic(topic, version)
+            key = (topic, version, normalized)
+            canonical = canonical_question(normalized)
+            self._entries[key] = (answer, char_ngrams(canonical), self._clock(), _guard(canonical))
+            self._entries.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+answer_cache = AnswerCache()
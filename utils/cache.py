@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """Una carga en curso; los demás hilos esperan su resultado."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.discard = False  # se invalidó la clave mientras se cargaba
+
+
+class TTLCache:
+    """
+    Caché en memoria con TTL por entrada, tamaño acotado (LRU),
+    stale-while-revalidate y coalescencia de cargas concurrentes
+    (single-flight): si 50 hilos piden la misma clave vencida,
+    solo uno ejecuta el loader y el resto espera su resultado.
+    """
+
+    def __init__(self, max_entries=64, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, fetched_at, ttl, stale_ttl)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'refreshes': 0,
+            'errors': 0,
+            'evictions': 0,
+        }
+
+    def get_or_load(self, key, loader, ttl, stale_ttl=0, cache_if=bool, wait_timeout=None):
+        """
+        Devuelve el valor de `key`, cargándolo con `loader()` si hace falta.
+
+        - Dentro de `ttl` segundos: se devuelve lo guardado.
+        - Entre `ttl` y `ttl + stale_ttl`: se devuelve lo guardado y se
+          refresca en segundo plano.
+        - Después: se carga de forma síncrona (una sola vez por clave).
+
+        Solo se guardan los valores para los que `cache_if(valor)` es True.
+        Si otro hilo ya está cargando la clave, se le espera como mucho
+        `wait_timeout` segundos (TimeoutError al vencer; la carga sigue).
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fetched_at, _, _ = entry
+                age = now - fetched_at
+                if age < ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                if age < ttl + stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['stale_hits'] += 1
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight()
+                        self._stats['refreshes'] += 1
+                        threading.Thread(
+                            target=self._run_flight,
+                            args=(key, flight, loader, ttl, stale_ttl, cache_if),
+                            daemon=True,
+                        ).start()
+                    return value
+
+            self._stats['misses'] += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                owner = False
+            else:
+                flight = self._flights[key] = _Flight()
+                owner = True
+
+        if owner:
+            self._run_flight(key, flight, loader, ttl, stale_ttl, cache_if)
+        else:
+            if not flight.event.wait(wait_timeout):
+                raise TimeoutError(f"la carga de {key!r} sigue en curso")
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run_flight(self, key, flight, loader, ttl, stale_ttl, cache_if):
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if flight.error is not None:
+                    self._stats['errors'] += 1
+                elif not flight.discard and cache_if(flight.value):
+                    self._store(key, flight.value, ttl, stale_ttl)
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _store(self, key, value, ttl, stale_ttl):
+        self._entries[key] = (value, self._clock(), ttl, stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def peek(self, key):
+        """Valor guardado aunque esté vencido (None si no hay); no cuenta como acierto."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """Guarda un valor directamente (por ejemplo, desde un refresco externo)."""
+        with self._lock:
+            self._store(key, value, ttl, stale_ttl)
+
+    def patch(self, key, func):
+        """
+        Modifica en sitio un valor guardado: `func(valor)` devuelve el valor
+        nuevo, o None para descartar la entrada. No cambia su antigüedad.
+        Retorna True si la clave estaba en caché.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.discard = True
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            value, fetched_at, ttl, stale_ttl = entry
+            new_value = func(value)
+            if new_value is None:
+                del self._entries[key]
+            else:
+                self._entries[key] = (new_value, fetched_at, ttl, stale_ttl)
+            return True
+
+    def invalidate(self, key=None):
+        """Borra una clave, o toda la caché si `key` es None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                for flight in self._flights.values():
+                    flight.discard = True
+            else:
+                self._entries.pop(key, None)
+                flight = self._flights.get(key)
+                if flight is not None:
+                    flight.discard = True
+
+    def stats(self):
+        """Contadores globales y edad/TTL de cada entrada, para ajustar los TTL."""
+        now = self._clock()
+        with self._lock:
+            entries = {
+                str(key): {
+                    'age_seconds': round(now - fetched_at, 1),
+                    'ttl': ttl,
+                    'stale_ttl': stale_ttl,
+                    'fresh': now - fetched_at < ttl,
+                }
+                for key, (_, fetched_at, ttl, stale_ttl) in self._entries.items()
+            }
+            return dict(self._stats, size=len(self._entries), entries=entries)
@@ -0,0 +1,116 @@
+import os
+import threading
+
+from utils.conversation_store import cache_conversation_fields
+from utils.ollama_client import PERSONALIDAD_BUHO, summarize_conversation
+
+# Presupuesto total de tokens del prompt (personalidad + resumen + historial + pregunta)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '6000'))
+# Tokens de turnos recientes que se envían textuales; lo anterior va al resumen
+# (mientras no entre al resumen se sigue enviando, si cabe en el presupuesto)
+HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', '1500'))
+# Mensajes pendientes de resumir a partir de los cuales se actualiza el resumen
+SUMMARY_MIN_MESSAGES = int(os.environ.get('SUMMARY_MIN_MESSAGES', '4'))
+
+SUMMARY_PREFIX = "Resumen de la conversación anterior (los mensajes más viejos ya no se muestran):\n"
+
+_summaries_in_progress = set()
+_summaries_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Estimación barata: ~4 caracteres por token en español."""
+    return len(text or '') // 4 + 1
+
+
+def _split_recent(messages, budget):
+    """Separa (anteriores, recientes): los recientes caben en `budget` tokens."""
+    used = 0
+    cut = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = estimate_tokens(messages[i].get('content', ''))
+        if used + cost > budget:
+            break
+        used += cost
+        cut = i
+    return messages[:cut], messages[cut:]
+
+
+def build_chat_context(prompt, messages, conv_data, budget=None):
+    """
+    Arma el historial para el modelo dentro del presupuesto de tokens:
+    el resumen guardado en la conversación + los turnos textuales que
+    todavía no están resumidos. Los que ya salieron de la ventana reciente
+    pero no entraron al resumen (son pocos o el resumen falló) también van,
+    mientras quepan: si no, el modelo los perdería.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    summary = conv_data.get('summary')
+    summarized_through = conv_data.get('summarizedThrough', -1)
+
+    available = budget - estimate_tokens(PERSONALIDAD_BUHO) - estimate_tokens(prompt)
+    if summary:
+        available -= estimate_tokens(summary)
+
+    pending = [m for m in messages if m.get('seq', -1) > summarized_through]
+    _, unsummarized = _split_recent(pending, max(0, available))
+
+    history = []
+    if summary:
+        history.append({'role': 'system', 'content': SUMMARY_PREFIX + summary})
+    for msg in unsummarized:
+        history.append({'role': msg.get('role', 'user'), 'content': msg.get('content', '')})
+    return history
+
+
+def messages_to_summarize(messages, conv_data):
+    """Mensajes no resumidos que ya no caben entre los turnos recientes."""
+    summarized_through = conv_data.get('summarizedThrough', -1)
+    pending = [m for m in messages if m.get('seq', -1) > summarized_through]
+    older, _ = _split_recent(pending, HISTORY_TOKEN_BUDGET)
+    return older
+
+
+def update_summary(doc_ref, conv_data, messages):
+    """
+    Fusiona en el resumen los mensajes que salieron de la ventana reciente y lo
+    guarda en la conversación. Retorna True si se actualizó.
+    """
+    older = messages_to_summarize(messages, conv_data)
+    if len(older) < SUMMARY_MIN_MESSAGES:
+        return False
+
+    summary = summarize_conversation(conv_data.get('summary'), older)
+    if not summary:
+        return False
+
+    summarized_through = older[-1]['seq']
+    doc_ref.update({'summary': summary, 'summarizedThrough': summarized_through})
+    conv_data['summary'] = summary
+    conv_data['summarizedThrough'] = summarized_through
+    cache_conversation_fields(doc_ref.id, summary=summary, summarizedThrough=summarized_through)
+    print(f"📝 Resumen actualizado hasta el mensaje {summarized_through}")
+    return True
+
+
+def update_summary_in_background(doc_ref, conv_data, messages):
+    """Actualiza el resumen fuera del camino de la respuesta (uno por conversación)."""
+    if len(messages_to_summarize(messages, conv_data)) < SUMMARY_MIN_MESSAGES:
+        return
+
+    key = doc_ref.id
+    with _summaries_lock:
+        if key in _summaries_in_progress:
+            return
+        _summaries_in_progress.add(key)
+
+    def run():
+        try:
+            update_summary(doc_ref, dict(conv_data), messages)
+        except Exception as e:
+            print(f"❌ Error al guardar el resumen: {e}")
+        finally:
+            with _summaries_lock:
+                _summaries_in_progress.discard(key)
+
+    threading.Thread(target=run, daemon=True).start()
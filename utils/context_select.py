@@ -0,0 +1,110 @@
+import math
+import os
+import re
+
+from utils.cache import TTLCache
+from utils.context_builder import estimate_tokens
+from utils.search_index import BM25_B, BM25_K1, CHUNK_WORDS, tokenize
+
+# Tokens del contenido de los sitios que van en el prompt (antes: los primeros 4000 caracteres)
+SCRAPED_CONTEXT_TOKENS = int(os.environ.get('SCRAPED_CONTEXT_TOKENS', '1000'))
+
+# Textos ya partidos y tokenizados (uno por captura o resultado de scraper vigente)
+PREPARED_TTL = 24 * 3600
+_prepared = TTLCache(max_entries=16)
+
+# Rótulos que ponen los scrapers ('FUENTE: url', 'CONTENIDO EXTRAÍDO DE LA PÁGINA:'): se
+# conservan en orden mientras quepan en su parte del presupuesto. Una línea larga que
+# empieza en mayúsculas no es un rótulo sino contenido, y compite como las demás.
+_LABEL = re.compile(r"[A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ ]*:")
+LABEL_MAX_WORDS = 12
+LABEL_BUDGET_SHARE = 0.25
+
+
+def split_chunks(text, size=CHUNK_WORDS):
+    """
+    Parte el texto de un scraper en fragmentos: cada línea es una fila de
+    tabla, un párrafo o un ítem, y las muy largas se cortan en trozos de
+    ~`size` palabras. Retorna una lista de (es_rótulo, texto) en orden.
+    """
+    chunks = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        words = line.split()
+        if _LABEL.match(line) and len(words) <= LABEL_MAX_WORDS:
+            chunks.append((True, line))
+            continue
+        for start in range(0, len(words), size):
+            chunks.append((False, ' '.join(words[start:start + size])))
+    return chunks
+
+
+def _prepare(text):
+    """Fragmentos del texto con sus términos ya contados y el df de cada término."""
+    chunks = split_chunks(text)
+    counts, df = [], {}
+    for is_label, chunk in chunks:
+        terms = {}
+        if not is_label:
+            for term in tokenize(chunk):
+                terms[term] = terms.get(term, 0) + 1
+            for term in terms:
+                df[term] = df.get(term, 0) + 1
+        counts.append((terms, sum(terms.values())))
+    documents = sum(1 for is_label, _ in chunks if not is_label)
+    avg_length = (sum(length for _, length in counts) / documents) if documents else 1.0
+    return {'chunks': chunks, 'counts': counts, 'df': df, 'documents': documents,
+            'avg_length': avg_length or 1.0}
+
+
+def _bm25(query, prepared):
+    """Puntaje BM25 de cada fragmento, con el IDF calculado entre los fragmentos del mismo texto."""
+    n, df, avg_length = prepared['documents'], prepared['df'], prepared['avg_length']
+    terms = [t for t in set(tokenize(query)) if t in df]
+    scores = []
+    for counts, length in prepared['counts']:
+        score = 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+        for term in terms:
+            tf = counts.get(term)
+            if tf:
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def select_context(question, text, budget=SCRAPED_CONTEXT_TOKENS):
+    """
+    Deja del texto scrapeado solo los fragmentos más relevantes para la
+    pregunta que quepan en `budget` tokens, en el orden de la página. Si
+    nada coincide con la pregunta, quedan los primeros (como antes).
+    """
+    if not text or estimate_tokens(text) <= budget:
+        return text
+
+    # La misma captura sirve a muchas preguntas: se parte y tokeniza una vez
+    prepared = _prepared.get_or_load(text, lambda: _prepare(text), ttl=PREPARED_TTL)
+    chunks = prepared['chunks']
+    scores = _bm25(question, prepared)
+
+    # Los rótulos también cuentan contra el presupuesto, con un tope propio
+    chosen, used = set(), 0
+    label_budget = int(budget * LABEL_BUDGET_SHARE)
+    for i, (is_label, chunk) in enumerate(chunks):
+        if is_label and used + estimate_tokens(chunk) <= label_budget:
+            chosen.add(i)
+            used += estimate_tokens(chunk)
+
+    ranked = sorted((-score, i) for i, score in enumerate(scores) if not chunks[i][0])
+    for _, i in ranked:
+        cost = estimate_tokens(chunks[i][1])
+        # Si no cabe, uno más corto y con menos puntaje todavía puede caber
+        if used + cost > budget:
+            continue
+        chosen.add(i)
+        used += cost
+
+    return '\n'.join(chunk for i, (_, chunk) in enumerate(chunks) if i in chosen)
@@ -0,0 +1,422 @@
+import os
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from utils.cache import TTLCache
+from utils.turn_journal import TurnDropped, turn_journal
+
+# Cada mensaje es un documento en conversations/{id}/messages con un número
+# de secuencia `seq` creciente, así se puede leer solo la cola o paginar.
+MESSAGES_SUBCOLLECTION = 'messages'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+BATCH_LIMIT = 450  # Firestore permite 500 operaciones por batch
+
+
+def messages_ref(doc_ref):
+    return doc_ref.collection(MESSAGES_SUBCOLLECTION)
+
+
+def _to_message(snapshot):
+    data = snapshot.to_dict() or {}
+    return {
+        'id': snapshot.id,
+        'seq': data.get('seq'),
+        'role': data.get('role', 'user'),
+        'content': data.get('content', ''),
+        'createdAt': data.get('createdAt'),
+    }
+
+
+def has_legacy_messages(conv_data):
+    """True si la conversación todavía guarda los mensajes en el arreglo antiguo."""
+    return bool(conv_data.get('messages'))
+
+
+def get_messages_page(doc_ref, conv_data, before=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Página de mensajes en orden cronológico que termina justo antes de `before`
+    (o en el último mensaje si no se indica). Retorna (mensajes, next_before),
+    donde next_before es el cursor para pedir la página anterior o None.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    if has_legacy_messages(conv_data):
+        legacy = [
+            {'seq': i, 'role': m.get('role', 'user'), 'content': m.get('content', '')}
+            for i, m in enumerate(conv_data['messages'])
+        ]
+        end = len(legacy) if before is None else max(0, min(int(before), len(legacy)))
+        start = max(0, end - limit)
+        return legacy[start:end], (start if start > 0 else None)
+
+    query = messages_ref(doc_ref).order_by('seq', direction=firestore.Query.DESCENDING)
+    if before is not None:
+        query = query.where(filter=FieldFilter('seq', '<', int(before)))
+    newest = [_to_message(s) for s in query.limit(limit + 1).stream()]
+
+    # Los turnos que siguen en el journal local también cuentan (sin duplicar
+    # los que el hilo de fondo ya alcanzó a escribir)
+    if turn_journal is not None:
+        pending = [m for m in turn_journal.pending_messages(doc_ref.id)
+                   if before is None or m['seq'] < int(before)]
+        if pending:
+            by_seq = {m['seq']: m for m in pending}
+            by_seq.update((m['seq'], m) for m in newest)
+            newest = sorted(by_seq.values(), key=lambda m: m['seq'], reverse=True)[:limit + 1]
+
+    has_more = len(newest) > limit
+    page = newest[:limit]
+    page.reverse()
+    next_before = page[0]['seq'] if has_more and page else None
+    return page, next_before
+
+
+def get_recent_messages(doc_ref, conv_data, limit):
+    """Los últimos `limit` mensajes, en orden cronológico."""
+    messages, _ = get_messages_page(doc_ref, conv_data, limit=limit)
+    return messages
+
+
+def migrate_legacy_messages(db, doc_ref, conv_data):
+    """
+    Pasa los mensajes del arreglo `messages` a la subcolección y borra el arreglo.
+    Usa IDs deterministas para poder repetirse sin duplicar. Retorna cuántos movió.
+    """
+    legacy = conv_data.get('messages') or []
+    if not legacy:
+        return 0
+
+    batch = db.batch()
+    pending = 0
+    for seq, msg in enumerate(legacy):
+        batch.set(messages_ref(doc_ref).document(f'legacy-{seq:06d}'), {
+            'seq': seq,
+            'role': msg.get('role', 'user'),
+            'content': msg.get('content', ''),
+            'createdAt': conv_data.get('createdAt') or firestore.SERVER_TIMESTAMP,
+        })
+        pending += 1
+        if pending >= BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    batch.update(doc_ref, {
+        'messages': firestore.DELETE_FIELD,
+        'messageCount': len(legacy),
+    })
+    batch.commit()
+
+    conv_data.pop('messages', None)
+    conv_data['messageCount'] = len(legacy)
+    return len(legacy)
+
+
+def append_messages(db, doc_ref, conv_data, new_messages, extra_updates=None):
+    """
+    Agrega mensajes al final de la conversación en una transacción junto con la
+    actualización del documento principal. El `seq` sale del messageCount que
+    se relee dentro de la transacción (conv_data puede venir de la caché), así
+    dos turnos a la vez no repiten números. Retorna el nuevo messageCount.
+    """
+    if has_legacy_messages(conv_data):
+        migrate_legacy_messages(db, doc_ref, conv_data)
+
+    return _append_in_transaction(db.transaction(), doc_ref, new_messages, extra_updates)
+
+
+@firestore.transactional
+def _append_in_transaction(transaction, doc_ref, new_messages, extra_updates):
+    snapshot = doc_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        raise NotFound(f"No existe la conversación {doc_ref.id}")
+    next_seq = (snapshot.to_dict() or {}).get('messageCount', 0)
+
+    for offset, msg in enumerate(new_messages):
+        transaction.set(messages_ref(doc_ref).document(), {
+            'seq': next_seq + offset,
+            'role': msg['role'],
+            'content': msg['content'],
+            'createdAt': firestore.SERVER_TIMESTAMP,
+        })
+
+    message_count = next_seq + len(new_messages)
+    update_data = {
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+        'messageCount': message_count,
+    }
+    if extra_updates:
+        update_data.update(extra_updates)
+    transaction.update(doc_ref, update_data)
+    return message_count
+
+
+def include_pending(conversation_id, conv_data):
+    """Ajusta el messageCount de conv_data con los turnos que siguen en el journal local."""
+    if turn_journal is not None:
+        conv_data['messageCount'] = max(conv_data.get('messageCount', 0),
+                                        turn_journal.message_count(conversation_id))
+    return conv_data
+
+
+def queue_messages(db, doc_ref, conv_data, new_messages, extra_updates=None):
+    """
+    Como append_messages, pero el turno queda en el journal local (durable) y
+    un hilo lo escribe en Firestore después, así la respuesta no espera ese
+    viaje. Sin journal (TURN_JOURNAL_PATH vacío) escribe de una vez.
+    Retorna el nuevo messageCount.
+    """
+    if turn_journal is None:
+        return append_messages(db, doc_ref, conv_data, new_messages, extra_updates)
+
+    if has_legacy_messages(conv_data):
+        migrate_legacy_messages(db, doc_ref, conv_data)
+
+    return turn_journal.append(doc_ref.id, conv_data.get('messageCount', 0), new_messages, extra_updates)
+
+
+def write_journal_turns(db, turns):
+    """
+    Escribe en Firestore los turnos que entrega el journal. Es idempotente:
+    los mensajes tienen ID fijo por turno y messageCount usa Maximum, así un
+    reintento o un turno que llega fuera de orden no duplica ni retrocede nada.
+    Si la conversación ya no existe (se borró con turnos pendientes), lanza
+    TurnDropped: reintentar no serviría de nada.
+    """
+    try:
+        _write_journal_batches(db, turns)
+    except NotFound as e:
+        raise TurnDropped(f"la conversación ya no existe: {e}") from e
+
+
+def _write_journal_batches(db, turns):
+    batch, operations = db.batch(), 0
+    for turn in turns:
+        doc_ref = db.collection('conversations').document(turn['conversation_id'])
+        created_at = datetime.fromtimestamp(turn['created_at'], timezone.utc)
+        for offset, msg in enumerate(turn['messages']):
+            batch.set(messages_ref(doc_ref).document(f"{turn['turn_id']}-{offset}"), {
+                'seq': turn['first_seq'] + offset,
+                'role': msg['role'],
+                'content': msg['content'],
+                'createdAt': created_at,
+            })
+        update_data = {
+            'updatedAt': firestore.SERVER_TIMESTAMP,
+            'messageCount': firestore.Maximum(turn['message_count']),
+        }
+        update_data.update(turn['updates'])
+        batch.update(doc_ref, update_data)
+
+        operations += len(turn['messages']) + 1
+        if operations >= BATCH_LIMIT:
+            batch.commit()
+            batch, operations = db.batch(), 0
+    if operations:
+        batch.commit()
+
+
+# --- ESTADO DE LA CONVERSACIÓN EN MEMORIA ---
+# Dueño, título, contadores, resumen y cola de mensajes de las conversaciones
+# activas, para que un turno no tenga que leer Firestore. Se actualiza con cada
+# escritura local; el TTL acota cuánto puede durar una escritura de otra máquina
+# sin verse, y al vencer se revalida con el update_time del documento.
+CONVERSATION_CACHE_ENTRIES = int(os.environ.get('CONVERSATION_CACHE_ENTRIES', '2000'))
+CONVERSATION_CACHE_TTL = int(os.environ.get('CONVERSATION_CACHE_TTL', '300'))
+# Mensajes más recientes que se guardan por conversación
+CONVERSATION_TAIL_MESSAGES = int(os.environ.get('CONVERSATION_TAIL_MESSAGES', '20'))
+
+conversation_state_cache = TTLCache(max_entries=CONVERSATION_CACHE_ENTRIES)
+
+
+def _load_state(doc_ref, previous):
+    doc = doc_ref.get()
+    if not doc.exists:
+        return None
+    data = include_pending(doc_ref.id, doc.to_dict() or {})
+    if (previous is not None and doc.update_time is not None
+            and previous['update_time'] == doc.update_time
+            and previous['data'].get('messageCount') == data.get('messageCount')):
+        # El documento no cambió desde la última lectura: la cola de mensajes tampoco
+        messages = previous['messages']
+    else:
+        messages = get_recent_messages(doc_ref, data, CONVERSATION_TAIL_MESSAGES)
+    return {'data': data, 'messages': messages, 'update_time': doc.update_time}
+
+
+def get_conversation_state(doc_ref):
+    """
+    Estado de la conversación: {'data': documento, 'messages': últimos mensajes,
+    'update_time': ...}, desde la caché o Firestore. None si no existe.
+    El valor es compartido: quien lo vaya a modificar debe copiarlo.
+    """
+    key = doc_ref.id
+
+    def load():
+        return _load_state(doc_ref, conversation_state_cache.peek(key))
+
+    def cacheable(state):
+        # Las conversaciones con el arreglo antiguo se migran en el próximo turno
+        return state is not None and not has_legacy_messages(state['data'])
+
+    state = conversation_state_cache.get_or_load(key, load, ttl=CONVERSATION_CACHE_TTL, cache_if=cacheable)
+    # Otro worker de esta máquina guardó un turno que esta copia no tiene
+    if (state is not None and turn_journal is not None
+            and turn_journal.message_count(key) > state['data'].get('messageCount', 0)):
+        conversation_state_cache.invalidate(key)
+        state = conversation_state_cache.get_or_load(key, load, ttl=CONVERSATION_CACHE_TTL,
+                                                     cache_if=cacheable)
+    return state
+
+
+def cache_conversation_state(conversation_id, data):
+    """Guarda el estado de una conversación recién creada (todavía sin mensajes)."""
+    conversation_state_cache.set(conversation_id, {'data': dict(data), 'messages': [], 'update_time': None},
+                                 ttl=CONVERSATION_CACHE_TTL)
+
+
+def cache_conversation_turn(conversation_id, messages, message_count, **fields):
+    """Agrega a la caché los mensajes de un turno recién guardado (con su `seq`)."""
+    def append(state):
+        first_seq = message_count - len(messages)
+        if state['data'].get('messageCount', 0) < first_seq:
+            # Falta un turno intermedio (de otro proceso): mejor recargar
+            return None
+        by_seq = {m['seq']: m for m in state['messages']}
+        by_seq.update((m['seq'], m) for m in messages)
+        tail = [by_seq[seq] for seq in sorted(by_seq)][-CONVERSATION_TAIL_MESSAGES:]
+        data = dict(state['data'], **fields)
+        data['messageCount'] = max(data.get('messageCount', 0), message_count)
+        data.pop('messages', None)
+        return dict(state, data=data, messages=tail)
+
+    conversation_state_cache.patch(conversation_id, append)
+
+
+def cache_conversation_fields(conversation_id, **fields):
+    """Actualiza campos del documento en la caché (por ejemplo, el resumen)."""
+    conversation_state_cache.patch(conversation_id, lambda state: dict(state, data=dict(state['data'], **fields)))
+
+
+def conversation_cache_stats():
+    stats = conversation_state_cache.stats()
+    stats.pop('entries')
+    return stats
+
+
+def delete_conversation_messages(db, doc_ref):
+    """Firestore no borra subcolecciones en cascada; lo hacemos por lotes."""
+    if turn_journal is not None:
+        turn_journal.discard(doc_ref.id)
+    while True:
+        snapshots = list(messages_ref(doc_ref).limit(BATCH_LIMIT).stream())
+        if not snapshots:
+            return
+        batch = db.batch()
+        for snapshot in snapshots:
+            batch.delete(snapshot.reference)
+        batch.commit()
+
+
+# --- LISTADO DE CONVERSACIONES ---
+# Requiere el índice compuesto (userId ASC, updatedAt DESC); ver firestore.indexes.json
+CONVERSATIONS_PAGE_SIZE = int(os.environ.get('CONVERSATIONS_PAGE_SIZE', '30'))
+CONVERSATIONS_CACHE_TTL = int(os.environ.get('CONVERSATIONS_CACHE_TTL', '30'))
+
+# Primera página del listado de cada usuario, parcheada en cada escritura local
+conversation_list_cache = TTLCache(max_entries=int(os.environ.get('CONVERSATIONS_CACHE_USERS', '1000')))
+
+
+def _to_summary(snapshot):
+    data = snapshot.to_dict() or {}
+    created_at = data.get('createdAt')
+    return {
+        'id': snapshot.id,
+        'title': data.get('title', 'Conversación'),
+        'messageCount': data.get('messageCount', 0),
+        'updatedAt': data.get('updatedAt', created_at),
+        'createdAt': created_at,
+    }
+
+
+def list_conversations(db, user_id, limit=None, cursor=None):
+    """
+    Página de conversaciones del usuario, de la más reciente a la más vieja.
+    `cursor` es el ID de la última conversación de la página anterior.
+    Retorna (conversaciones, next_cursor) o lanza ValueError si el cursor no es válido.
+    """
+    limit = max(1, min(int(limit or CONVERSATIONS_PAGE_SIZE), MAX_PAGE_SIZE))
+    collection = db.collection('conversations')
+    query = (collection
+             .where(filter=FieldFilter('userId', '==', user_id))
+             .order_by('updatedAt', direction=firestore.Query.DESCENDING))
+
+    if cursor:
+        cursor_doc = collection.document(cursor).get()
+        if not cursor_doc.exists or (cursor_doc.to_dict() or {}).get('userId') != user_id:
+            raise ValueError('Cursor inválido')
+        query = query.start_after(cursor_doc)
+
+    snapshots = list(query.limit(limit + 1).stream())
+    page = [_to_summary(s) for s in snapshots[:limit]]
+    next_cursor = page[-1]['id'] if len(snapshots) > limit else None
+    return page, next_cursor
+
+
+def get_conversation_list(db, user_id, limit=None, cursor=None):
+    """Como list_conversations, pero la primera página sale de la caché por usuario."""
+    if cursor or (limit and limit != CONVERSATIONS_PAGE_SIZE):
+        return list_conversations(db, user_id, limit, cursor)
+
+    page, next_cursor = conversation_list_cache.get_or_load(
+        user_id,
+        lambda: list_conversations(db, user_id),
+        ttl=CONVERSATIONS_CACHE_TTL,
+        cache_if=lambda value: value is not None,
+    )
+    return list(page), next_cursor
+
+
+def cache_conversation_created(user_id, conversation):
+    """Agrega una conversación nueva al principio del listado en caché."""
+    def add(value):
+        page, next_cursor = value
+        page = [conversation] + [c for c in page if c['id'] != conversation['id']]
+        if len(page) > CONVERSATIONS_PAGE_SIZE:
+            page = page[:CONVERSATIONS_PAGE_SIZE]
+            next_cursor = page[-1]['id']
+        return page, next_cursor
+
+    conversation_list_cache.patch(user_id, add)
+
+
+def cache_conversation_updated(user_id, conversation_id, **fields):
+    """Sube la conversación al principio del listado con los campos nuevos."""
+    def move_to_front(value):
+        page, next_cursor = value
+        current = next((c for c in page if c['id'] == conversation_id), None)
+        if current is None:
+            # No estaba en la primera página: mejor recargar desde Firestore
+            return None
+        updated = dict(current, **fields)
+        return [updated] + [c for c in page if c['id'] != conversation_id], next_cursor
+
+    conversation_list_cache.patch(user_id, move_to_front)
+
+
+def cache_conversation_deleted(user_id, conversation_id):
+    """Quita la conversación del listado en caché (y su estado)."""
+    conversation_state_cache.invalidate(conversation_id)
+
+    def remove(value):
+        page, next_cursor = value
+        if next_cursor is not None:
+            # La primera página quedaría corta; se recarga en la próxima petición
+            return None
+        return [c for c in page if c['id'] != conversation_id], next_cursor
+
+    conversation_list_cache.patch(user_id, remove)
@@ -0,0 +1,60 @@
+import os
+import time
+from contextvars import ContextVar
+
+# Tiempo total que tiene una petición de chat para empezar a responder (segundos)
+CHAT_DEADLINE = float(os.environ.get('CHAT_DEADLINE', '30'))
+# Parte del plazo que se guarda para Groq: clasificar, buscar y scrapear no pueden gastarla
+CHAT_LLM_RESERVE = float(os.environ.get('CHAT_LLM_RESERVE', '15'))
+# Con menos de esto no vale la pena empezar una etapa que sale a la red
+MIN_STAGE_BUDGET = 0.5
+
+
+class DeadlineExceeded(TimeoutError):
+    """No queda tiempo suficiente para la etapa."""
+
+
+class Deadline:
+    """Momento en que la petición debe haber respondido."""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self._clock())
+
+
+# Plazo de la petición actual; como los tiempos de utils/metrics.py, viaja en
+# el contexto (run_blocking y los hilos de hedging copian los contextvars)
+_current = ContextVar('buho_deadline', default=None)
+
+
+def start_deadline(seconds=CHAT_DEADLINE):
+    """Abre el plazo de esta petición."""
+    deadline = Deadline(seconds)
+    _current.set(deadline)
+    return deadline
+
+
+def remaining(reserve=0.0):
+    """Segundos que le quedan a la petición descontando `reserve`; None fuera de una petición."""
+    deadline = _current.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline.remaining() - reserve)
+
+
+def budget(default, reserve=0.0, minimum=MIN_STAGE_BUDGET):
+    """
+    Timeout para una etapa: `default` recortado a lo que le queda a la
+    petición menos `reserve` (lo que necesitan las etapas siguientes).
+    Fuera de una petición (prefetch, scripts) es `default`. Lanza
+    DeadlineExceeded si queda menos de `minimum`.
+    """
+    left = remaining(reserve)
+    if left is None:
+        return default
+    if left < minimum:
+        raise DeadlineExceeded(f"quedan {left:.2f} s")
+    return left if default is None else min(default, left)
@@ -0,0 +1,151 @@
+import os
+import re
+import threading
+import time
+
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+
+from utils.http_client import http_get, http_post
+
+# Certificados públicos con los que Firebase firma los ID tokens
+FIREBASE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+# "local" valida el JWT aquí mismo; "remote" consulta accounts:lookup en cada login
+FIREBASE_TOKEN_VERIFICATION = os.environ.get('FIREBASE_TOKEN_VERIFICATION', 'local')
+# Tolerancia de reloj al validar exp/iat (segundos)
+TOKEN_CLOCK_SKEW = 60
+# Si al token le falta alguno de estos campos, se completa con accounts:lookup
+REQUIRED_PROFILE_FIELDS = ('email', 'displayName')
+# Tiempo mínimo entre recargas forzadas por un `kid` desconocido
+MIN_REFRESH_INTERVAL = 30
+
+
+class SigningKeyCache:
+    """
+    Guarda las llaves públicas de Google por `kid` durante el max-age que
+    indica el header Cache-Control de la respuesta.
+    """
+
+    def __init__(self, url=FIREBASE_CERTS_URL, fetcher=None, clock=time.time):
+        self.url = url
+        self._fetcher = fetcher or self._fetch
+        self._clock = clock
+        self._keys = {}
+        self._expires_at = 0
+        self._last_refresh = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        response = http_get(self.url, timeout=5)
+        response.raise_for_status()
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else 3600
+        return response.json(), max_age
+
+    def _refresh(self):
+        certs, max_age = self._fetcher()
+        self._keys = {
+            kid: load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in certs.items()
+        }
+        now = self._clock()
+        self._expires_at = now + max_age
+        self._last_refresh = now
+
+    def get(self, kid):
+        with self._lock:
+            now = self._clock()
+            if now >= self._expires_at:
+                self._refresh()
+            elif kid not in self._keys and now - self._last_refresh >= MIN_REFRESH_INTERVAL:
+                # Google rotó las llaves antes de que venciera nuestra copia
+                self._refresh()
+            return self._keys.get(kid)
+
+
+signing_keys = SigningKeyCache()
+
+
+def verify_id_token_locally(id_token, project_id, keys=None):
+    """
+    Valida firma, audiencia, emisor y vigencia de un ID token de Firebase.
+    Retorna los claims o lanza jwt.InvalidTokenError.
+    """
+    if not project_id:
+        raise jwt.InvalidTokenError('FIREBASE_PROJECT_ID no está configurado')
+
+    keys = keys or signing_keys
+    header = jwt.get_unverified_header(id_token)
+    if header.get('alg') != 'RS256':
+        raise jwt.InvalidAlgorithmError('Algoritmo inesperado')
+
+    key = keys.get(header.get('kid'))
+    if key is None:
+        raise jwt.InvalidKeyError('Llave de firma desconocida')
+
+    claims = jwt.decode(
+        id_token,
+        key,
+        algorithms=['RS256'],
+        audience=project_id,
+        issuer=f'https://securetoken.google.com/{project_id}',
+        leeway=TOKEN_CLOCK_SKEW,
+        options={'require': ['exp', 'iat', 'sub', 'aud', 'iss']},
+    )
+
+    if not claims.get('sub'):
+        raise jwt.InvalidTokenError('El token no tiene sujeto')
+    if claims.get('auth_time', 0) > time.time() + TOKEN_CLOCK_SKEW:
+        raise jwt.ImmatureSignatureError('auth_time está en el futuro')
+    return claims
+
+
+def user_from_claims(claims):
+    """Convierte los claims del token al formato de accounts:lookup."""
+    user = {'localId': claims['sub']}
+    if claims.get('email'):
+        user['email'] = claims['email']
+    if claims.get('name'):
+        user['displayName'] = claims['name']
+    if claims.get('picture'):
+        user['photoUrl'] = claims['picture']
+    return user
+
+
+def lookup_account(id_token, api_key):
+    """
+    Consulta accounts:lookup de Identity Toolkit. Retorna el usuario o None
+    si el token no es válido. Lanza requests.RequestException si falla la red.
+    """
+    verify_url = f'https://identitytoolkit.googleapis.com/v1/accounts:lookup?key={api_key}'
+    response = http_post(verify_url, json={'idToken': id_token})
+
+    if response.status_code != 200:
+        return None
+
+    users = response.json().get('users') or []
+    return users[0] if users else None
+
+
+def verify_firebase_user(id_token, project_id, api_key):
+    """
+    Retorna el usuario (formato accounts:lookup) del ID token, o None si no es
+    válido. En modo local solo se sale a la red si faltan campos del perfil.
+    """
+    if FIREBASE_TOKEN_VERIFICATION != 'local':
+        return lookup_account(id_token, api_key)
+
+    try:
+        claims = verify_id_token_locally(id_token, project_id)
+    except jwt.InvalidTokenError as e:
+        print(f"⚠️  Token rechazado: {e}")
+        return None
+
+    user = user_from_claims(claims)
+    if all(user.get(field) for field in REQUIRED_PROFILE_FIELDS):
+        return user
+
+    remote = lookup_account(id_token, api_key)
+    if remote is None:
+        return user
+    return dict(remote, **user)
@@ -0,0 +1,95 @@
+import re
+
+from lxml import etree, html as lxml_html
+
+# Etiquetas que nunca aportan contenido (menús, scripts, estilos)
+NOISE_TAGS = ("script", "style", "nav", "footer", "header", "noscript")
+
+
+def _selector_to_xpath(selector):
+    """
+    Traduce un selector simple a XPath: 'p', '.clase' o 'tag.clase'.
+    Es todo lo que usan los scrapers; no hace falta un motor CSS completo.
+    """
+    match = re.fullmatch(r"([a-zA-Z][a-zA-Z0-9]*)?(?:\.([\w-]+))?", selector.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Selector no soportado: {selector!r}")
+    tag, cls = match.groups()
+    xpath = f"//{tag or '*'}"
+    if cls:
+        xpath += f"[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+    return xpath
+
+
+def compile_selectors(selectors):
+    """Compila 'h3, h4, .list-group-item' a un XPath que respeta el orden del documento."""
+    if isinstance(selectors, str):
+        selectors = selectors.split(",")
+    return etree.XPath(" | ".join(_selector_to_xpath(s) for s in selectors))
+
+
+def parse_html(content):
+    """
+    Árbol lxml del documento. Acepta str o bytes; con bytes se respeta el
+    <meta charset> y, si no lo hay, se asume UTF-8 cuando el contenido lo es.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+        parser = lxml_html.HTMLParser(encoding="utf-8")
+    else:
+        try:
+            content.decode("utf-8")
+            parser = lxml_html.HTMLParser(encoding="utf-8")
+        except UnicodeDecodeError:
+            parser = lxml_html.HTMLParser()
+    if not content.strip():
+        return lxml_html.fromstring("<html></html>")
+    return lxml_html.document_fromstring(content, parser=parser)
+
+
+def drop_noise(root, tags=NOISE_TAGS):
+    for element in list(root.iter(*tags)):
+        element.drop_tree()
+    return root
+
+
+def node_text(node):
+    """Texto del nodo con espacios colapsados."""
+    return " ".join(node.text_content().split())
+
+
+def select_texts(content, selectors, skip_noise=False):
+    """
+    Textos (no vacíos) de los nodos que coinciden con `selectors`, en el orden
+    del documento. `selectors` puede venir ya compilado con compile_selectors.
+    """
+    if not callable(selectors):
+        selectors = compile_selectors(selectors)
+    root = parse_html(content)
+    if skip_noise:
+        drop_noise(root)
+    return [text for text in (node_text(node) for node in selectors(root)) if text]
+
+
+_TABLE_ROWS = etree.XPath("//table//tr")
+_ROW_CELLS = etree.XPath("./td | ./th")
+_PAGE_BLOCKS = compile_selectors("p, li, h2, h3")
+
+
+def page_text_blocks(content, min_length=20):
+    """
+    Contenido útil de una página genérica, en un solo parseo: primero las
+    filas de las tablas ('celda | celda'), luego párrafos, ítems y títulos
+    con más de `min_length` caracteres.
+    """
+    root = drop_noise(parse_html(content))
+    blocks = []
+    for row in _TABLE_ROWS(root):
+        cols = [node_text(cell) for cell in _ROW_CELLS(row)]
+        if cols:
+            blocks.append(" | ".join(cols))
+    for node in _PAGE_BLOCKS(root):
+        text = node_text(node)
+        if len(text) > min_length:
+            blocks.append(text)
+    return blocks
@@ -0,0 +1,347 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from cachecontrol import CacheControlAdapter
+    from cachecontrol.cache import BaseCache
+except ImportError:
+    CacheControlAdapter = None
+    BaseCache = object
+
+# Configuración de los pools de conexiones salientes
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '10'))  # hosts distintos en caché
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '20'))          # conexiones keep-alive por host
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '10'))
+GROQ_TIMEOUT = float(os.environ.get('GROQ_TIMEOUT', '60'))
+GROQ_MAX_CONNECTIONS = int(os.environ.get('GROQ_MAX_CONNECTIONS', '20'))
+HTTP2_ENABLED = os.environ.get('HTTP2_ENABLED', '1') == '1'
+# Caché HTTP en disco de los scrapers ("" la desactiva) y topes de descarga
+SCRAPE_HTTP_CACHE = os.environ.get('SCRAPE_HTTP_CACHE', os.path.join('data', 'http_cache.db'))
+SCRAPE_MAX_BYTES = int(os.environ.get('SCRAPE_MAX_BYTES', str(2 * 1024 * 1024)))
+SCRAPE_READ_DEADLINE = float(os.environ.get('SCRAPE_READ_DEADLINE', '8'))
+
+DEFAULT_HEADERS = {
+    'User-Agent':
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class _HostStats:
+    """Contadores por host: peticiones, errores y latencias."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, host, elapsed, error=False):
+        with self._lock:
+            row = self._hosts.get(host)
+            if row is None:
+                row = self._hosts[host] = {
+                    'requests': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0
+                }
+            row['requests'] += 1
+            row['errors'] += int(error)
+            ms = elapsed * 1000
+            row['total_ms'] += ms
+            row['max_ms'] = max(row['max_ms'], ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                host: dict(row,
+                           total_ms=round(row['total_ms'], 1),
+                           max_ms=round(row['max_ms'], 1),
+                           avg_ms=round(row['total_ms'] / row['requests'], 1) if row['requests'] else 0.0)
+                for host, row in self._hosts.items()
+            }
+
+
+host_stats = _HostStats()
+
+class SQLiteHTTPCache(BaseCache):
+    """
+    Almacén de CacheControl en un archivo SQLite (modo WAL): las respuestas
+    sobreviven a reinicios y se comparten entre workers de la misma máquina.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS http_cache ('
+            ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)'
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM http_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, expires=None):
+        if isinstance(expires, datetime):
+            expires_at = expires.replace(tzinfo=expires.tzinfo or timezone.utc).timestamp()
+        elif expires:
+            expires_at = time.time() + expires
+        else:
+            expires_at = None
+        self._conn().execute(
+            'INSERT OR REPLACE INTO http_cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, expires_at),
+        )
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM http_cache WHERE key = ?', (key,))
+
+
+# Página descargada por fetch_page(). `from_cache` es True si no cambió desde
+# la última vez (respuesta guardada o revalidada con 304).
+FetchedPage = namedtuple('FetchedPage', 'url status_code headers content from_cache truncated')
+
+_session = None
+_scrape_session = None
+_groq_client = None
+_async_groq_client = None
+_init_lock = threading.Lock()
+
+
+def get_session():
+    """Sesión de requests compartida con conexiones keep-alive por host."""
+    global _session
+    if _session is None:
+        with _init_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                                      pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def get_scrape_session():
+    """
+    Sesión para los scrapers: mismo pool de conexiones, más una caché HTTP en
+    disco (CacheControl) que guarda las páginas y las revalida con
+    If-None-Match / If-Modified-Since.
+    """
+    global _scrape_session
+    if _scrape_session is None:
+        with _init_lock:
+            if _scrape_session is None:
+                session = requests.Session()
+                if CacheControlAdapter is not None and SCRAPE_HTTP_CACHE:
+                    adapter = CacheControlAdapter(cache=SQLiteHTTPCache(SCRAPE_HTTP_CACHE),
+                                                  pool_connections=HTTP_POOL_CONNECTIONS,
+                                                  pool_maxsize=HTTP_POOL_MAXSIZE)
+                else:
+                    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                                          pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _scrape_session = session
+    return _scrape_session
+
+
+def request(method, url, session=None, **kwargs):
+    """Hace una petición con la sesión compartida y registra la latencia del host."""
+    kwargs.setdefault('timeout', HTTP_TIMEOUT)
+    host = urlsplit(url).hostname or url
+    start = time.perf_counter()
+    try:
+        response = (session or get_session()).request(method, url, **kwargs)
+    except requests.RequestException:
+        host_stats.record(host, time.perf_counter() - start, error=True)
+        raise
+    host_stats.record(host, time.perf_counter() - start, error=response.status_code >= 500)
+    return response
+
+
+def http_get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def _response_socket(response):
+    """Socket de una respuesta en streaming (urllib3 -> http.client -> SocketIO)."""
+    fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+    return getattr(getattr(fp, 'raw', None), '_sock', None)
+
+
+def fetch_page(url, timeout=HTTP_TIMEOUT, max_bytes=SCRAPE_MAX_BYTES, deadline=SCRAPE_READ_DEADLINE):
+    """
+    Descarga una página para scraping pasando por la caché HTTP en disco.
+    El cuerpo se lee por partes y se corta al llegar a `max_bytes` o cuando
+    la lectura pasa de `deadline` segundos, para que una página enorme o un
+    servidor lento no bloqueen el worker. Las respuestas cortadas no se guardan.
+    Lanza requests.HTTPError si el servidor responde 4xx/5xx: una página de
+    error no es contenido y no debe llegar a los scrapers ni a las cachés.
+    """
+    response = request('GET', url, session=get_scrape_session(), timeout=timeout, stream=True)
+    if response.status_code >= 400:
+        response.close()
+        raise requests.HTTPError(f"{response.status_code} al descargar {url}", response=response)
+    # iter_content bloquea hasta llenar cada bloque; si el servidor manda gotas,
+    # el temporizador cierra la conexión al vencer el plazo
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        # close() no despierta un recv() bloqueado en otro hilo; shutdown() sí
+        sock = _response_socket(response)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    timer = threading.Timer(deadline, expire)
+    timer.daemon = True
+    timer.start()
+    chunks, size, truncated = [], 0, False
+    try:
+        for chunk in response.iter_content(16 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                truncated = True
+                break
+    except Exception:
+        if not expired.is_set():
+            raise
+    finally:
+        timer.cancel()
+        response.close()
+    truncated = truncated or expired.is_set()
+
+    if truncated:
+        print(f"⚠️  Descarga cortada en {size // 1024} KB: {url}")
+    return FetchedPage(
+        url=url,
+        status_code=response.status_code,
+        headers=response.headers,
+        content=b''.join(chunks)[:max_bytes],
+        from_cache=getattr(response, 'from_cache', False),
+        truncated=truncated,
+    )
+
+
+def _on_httpx_request(req):
+    req.extensions['buho_start'] = time.perf_counter()
+
+
+def _on_httpx_response(resp):
+    start = resp.request.extensions.get('buho_start')
+    if start is not None:
+        host_stats.record(resp.request.url.host, time.perf_counter() - start,
+                          error=resp.status_code >= 500)
+
+
+def _build_httpx_client():
+    limits = httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS,
+                          max_keepalive_connections=GROQ_MAX_CONNECTIONS)
+    hooks = {'request': [_on_httpx_request], 'response': [_on_httpx_response]}
+    try:
+        return httpx.Client(http2=HTTP2_ENABLED, limits=limits, timeout=GROQ_TIMEOUT, event_hooks=hooks)
+    except ImportError:
+        # Sin el paquete h2 no hay HTTP/2; seguimos con HTTP/1.1 keep-alive
+        return httpx.Client(limits=limits, timeout=GROQ_TIMEOUT, event_hooks=hooks)
+
+
+async def _on_async_httpx_request(req):
+    _on_httpx_request(req)
+
+
+async def _on_async_httpx_response(resp):
+    _on_httpx_response(resp)
+
+
+def _build_async_httpx_client():
+    limits = httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS,
+                          max_keepalive_connections=GROQ_MAX_CONNECTIONS)
+    hooks = {'request': [_on_async_httpx_request], 'response': [_on_async_httpx_response]}
+    try:
+        return httpx.AsyncClient(http2=HTTP2_ENABLED, limits=limits, timeout=GROQ_TIMEOUT, event_hooks=hooks)
+    except ImportError:
+        return httpx.AsyncClient(limits=limits, timeout=GROQ_TIMEOUT, event_hooks=hooks)
+
+
+def get_groq_client():
+    """Cliente de Groq único para todo el proceso (HTTP/2 + pool de conexiones)."""
+    global _groq_client
+    if _groq_client is None:
+        with _init_lock:
+            if _groq_client is None:
+                from groq import Groq
+                from utils.ollama_client import GROQ_API_KEY
+
+                _groq_client = Groq(api_key=GROQ_API_KEY, http_client=_build_httpx_client())
+    return _groq_client
+
+
+def get_async_groq_client():
+    """
+    Cliente asíncrono de Groq para el camino ASGI. Hay uno por proceso:
+    cada worker de uvicorn corre un solo event loop.
+    """
+    global _async_groq_client
+    if _async_groq_client is None:
+        with _init_lock:
+            if _async_groq_client is None:
+                from groq import AsyncGroq
+                from utils.ollama_client import GROQ_API_KEY
+
+                _async_groq_client = AsyncGroq(api_key=GROQ_API_KEY, http_client=_build_async_httpx_client())
+    return _async_groq_client
+
+
+def _pool_connections():
+    """Conexiones abiertas por host en el pool de requests."""
+    pools = {}
+    sessions = [session for session in (_session, _scrape_session) if session is not None]
+    for adapter in {a for session in sessions for a in session.adapters.values()}:
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                row = pools.setdefault(pool.host, {'connections_opened': 0, 'pool_requests': 0})
+                row['connections_opened'] += pool.num_connections
+                row['pool_requests'] += pool.num_requests
+    return pools
+
+
+def outbound_stats():
+    """Estadísticas de conexiones y latencias salientes, por host."""
+    stats = host_stats.snapshot()
+    for host, pool in _pool_connections().items():
+        stats.setdefault(host, {}).update(pool)
+    return stats
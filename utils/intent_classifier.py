@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+
+from utils.metrics import stage
+from utils.ollama_client import classify_user_intents
+
+INTENT_LABELS = [
+    "ADMISIONES",
+    "POSGRADOS",
+    "CALENDARIO",
+    "PROGRAMAS",
+    "MATERIAS",
+    "SEGURIDAD",
+    "NINGUNO",
+]
+
+# Por debajo de esta confianza se le pregunta al modelo de Groq
+LOCAL_CONFIDENCE_THRESHOLD = float(os.environ.get('INTENT_LOCAL_THRESHOLD', '0.6'))
+# Cuántos temas puede tocar una pregunta ("¿qué posgrados hay y cuándo abren inscripciones?")
+INTENT_MAX_TOPICS = int(os.environ.get('INTENT_MAX_TOPICS', '2'))
+# Probabilidad mínima del modelo local para sumar un segundo tema al principal
+INTENT_SECONDARY_MIN = float(os.environ.get('INTENT_SECONDARY_MIN', '0.3'))
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), 'intent_examples.jsonl')
+
+# Tabla de reglas: expresiones sobre el texto normalizado (minúsculas, sin tildes).
+# Si solo una categoría coincide, se responde sin consultar al modelo.
+INTENT_RULES = [
+    ("POSGRADOS", r"\b(maestria|maestrias|doctorado|doctorados|especializacion|especializaciones|posgrados?)\b"),
+    ("ADMISIONES", r"\b(admision|admitidos?|aspirantes?|inscripcion|inscripciones|pin de inscripcion|examen de admision|puntaje|paes|peama)\b"),
+    ("CALENDARIO", r"\b(calendario|inicio de clases|empieza el semestre|vacaciones|fecha limite|semana de parciales|examenes finales)\b"),
+    ("PROGRAMAS", r"\b(carreras?|pregrados?|pensum|plan de estudios|programas curriculares|ingenierias)\b"),
+    # "papa" sin acento también es "papá": el P.A.P.A. solo cuenta junto a "promedio"/"académico"
+    ("MATERIAS", r"\b(asignaturas?|materias?|creditos|sia|prerrequisitos?|historia academica|promedio academico"
+                 r"|papa (promedio|academico|acumulado)|promedio papa)\b|\bp\.a\.p\.a\b"),
+    ("SEGURIDAD", r"\b(emergencias?|vigilancia|robo|robaron|objetos perdidos|denuncia|denuncio|seguridad|acoso)\b"),
+    ("NINGUNO", r"^(hola|buenas?|buenos dias|buenas (tardes|noches)|gracias|muchas gracias|adios|chao|ok|jaja\w*|quien eres|como te llamas)\b[\s!.?]*$"),
+]
+_COMPILED_RULES = [(label, re.compile(pattern)) for label, pattern in INTENT_RULES]
+RULE_CONFIDENCE = 0.95
+
+
+def normalize_text(text):
+    """Minúsculas, sin tildes y con espacios colapsados."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[¿¡]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def char_ngrams(text, sizes=(2, 3, 4)):
+    """N-gramas de caracteres (con bordes de palabra) del texto normalizado."""
+    padded = f" {text} "
+    features = {}
+    for n in sizes:
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            features[gram] = features.get(gram, 0) + 1
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+
+class NgramIntentModel:
+    """
+    Regresión logística multiclase sobre n-gramas de caracteres,
+    entrenada con SGD. Es pequeña y se entrena en memoria al arrancar.
+    """
+
+    def __init__(self, labels=INTENT_LABELS):
+        self.labels = list(labels)
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+
+    def _scores(self, features):
+        return {
+            label: self.bias[label] + sum(self.weights[label].get(f, 0.0) * v for f, v in features.items())
+            for label in self.labels
+        }
+
+    def predict_proba(self, text):
+        scores = self._scores(char_ngrams(normalize_text(text)))
+        top = max(scores.values())
+        exps = {label: math.exp(s - top) for label, s in scores.items()}
+        total = sum(exps.values())
+        return {label: e / total for label, e in exps.items()}
+
+    def train(self, examples, epochs=30, learning_rate=0.5, l2=1e-4):
+        data = [(char_ngrams(normalize_text(m)), label) for m, label in examples if label in self.weights]
+        for epoch in range(epochs):
+            lr = learning_rate / (1 + epoch * 0.1)
+            for features, gold in data:
+                scores = self._scores(features)
+                top = max(scores.values())
+                exps = {label: math.exp(s - top) for label, s in scores.items()}
+                total = sum(exps.values())
+                for label in self.labels:
+                    grad = exps[label] / total - (1.0 if label == gold else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    w = self.weights[label]
+                    for f, v in features.items():
+                        w[f] = w.get(f, 0.0) * (1 - lr * l2) - lr * grad * v
+                    self.bias[label] -= lr * grad
+        return self
+
+
+def load_examples(path=EXAMPLES_PATH):
+    """Lee pares (mensaje, etiqueta) de un archivo JSONL."""
+    examples = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                examples.append((row['message'], row['label']))
+    return examples
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Entrena el modelo la primera vez que se necesita."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = NgramIntentModel().train(load_examples())
+    return _model
+
+
+def rank_locally(user_message, max_topics=None):
+    """
+    Clasifica sin salir a la red: los temas que toca la pregunta, del más
+    probable al menos. Retorna ([(categoría, confianza)...], origen) con
+    origen 'rules' o 'model'.
+    """
+    max_topics = INTENT_MAX_TOPICS if max_topics is None else max_topics
+    text = normalize_text(user_message)
+
+    matched = {label for label, rx in _COMPILED_RULES if rx.search(text)}
+    if len(matched) == 1:
+        return [(matched.pop(), RULE_CONFIDENCE)], 'rules'
+
+    proba = get_model().predict_proba(user_message)
+    if len(matched) > 1:
+        # Cada regla que coincide es un tema de la pregunta: el modelo solo los ordena
+        matched.discard("NINGUNO")
+        ranked = sorted(matched, key=proba.get, reverse=True)[:max_topics]
+        return [(label, RULE_CONFIDENCE) for label in ranked], 'rules'
+
+    ranked = sorted(proba, key=proba.get, reverse=True)
+    topics = [(ranked[0], proba[ranked[0]])]
+    for label in ranked[1:max_topics]:
+        if label == "NINGUNO" or topics[0][0] == "NINGUNO" or proba[label] < INTENT_SECONDARY_MIN:
+            break
+        topics.append((label, proba[label]))
+    return topics, 'model'
+
+
+def detect_intents(user_message, threshold=None, max_topics=None, before_llm=None, ranked=None):
+    """
+    Clasificador principal: los temas de la pregunta en orden de prioridad.
+    Primero reglas + modelo local (o `ranked`, si rank_locally ya corrió);
+    si el tema principal queda por debajo del umbral, se consulta a
+    classify_user_intents (Groq). Antes de eso se llama a
+    `before_llm(tema_local)`, para adelantar trabajo mientras responde.
+    """
+    threshold = LOCAL_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    max_topics = INTENT_MAX_TOPICS if max_topics is None else max_topics
+    topics, source = ranked or rank_locally(user_message, max_topics)
+    topics = topics[:max_topics]
+    if topics[0][1] >= threshold:
+        labels = [label for label, _ in topics]
+        print(f"⚡ Clasificador local ({source}): '{user_message}' -> {labels}")
+        return labels
+    if before_llm is not None:
+        before_llm(topics[0][0])
+    with stage('classify_llm'):
+        labels = [label for label in classify_user_intents(user_message) if label in INTENT_LABELS]
+    topics = [label for label in labels if label != "NINGUNO"]
+    return topics[:max_topics] or ["NINGUNO"]
+
+
+def detect_intent(user_message, threshold=None):
+    """El tema principal de la pregunta (ver detect_intents)."""
+    return detect_intents(user_message, threshold, max_topics=1)[0]
@@ -0,0 +1,163 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Límites de los buckets de latencia (segundos), como los de Prometheus
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histograma acumulado por etiquetas: observar cuesta un bisect y un lock."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # etiquetas -> [conteos por bucket..., +Inf], suma
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    le = _labels(self.labelnames, labelvalues, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = _labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {total:.6f}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Todas las métricas en el formato de texto de Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'buho_stage_seconds', 'Duración de cada etapa del pipeline de chat', ('stage', 'detail'))
+REQUEST_SECONDS = registry.histogram(
+    'buho_request_seconds', 'Duración de las peticiones HTTP por endpoint', ('endpoint', 'status'))
+CONTEXT_SOURCE = registry.counter(
+    'buho_context_total', 'De dónde salió el contexto de cada pregunta', ('topic', 'source'))
+LLM_CALLS = registry.counter(
+    'buho_llm_calls_total', 'Llamadas a Groq por modelo y resultado', ('model', 'status'))
+LLM_TOKENS = registry.counter(
+    'buho_llm_tokens_total', 'Tokens consumidos en Groq', ('model', 'kind'))
+
+# Etapas medidas durante la petición actual (para el header Server-Timing)
+_request_timings = ContextVar('buho_request_timings', default=None)
+
+
+def start_request():
+    """Empieza a registrar las etapas de esta petición."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def record_stage(name, seconds, detail=''):
+    STAGE_SECONDS.observe(seconds, name, detail)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, detail, seconds))
+
+
+@contextmanager
+def stage(name, detail=''):
+    """Mide una etapa: `with stage('firestore_get'): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start, detail)
+
+
+def record_llm_usage(model, usage, status='ok'):
+    """Cuenta la llamada a Groq y sus tokens (usage puede ser None)."""
+    LLM_CALLS.inc(model, status)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(model, 'prompt', amount=getattr(usage, 'prompt_tokens', 0) or 0)
+    LLM_TOKENS.inc(model, 'completion', amount=getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def server_timing_header(timings=None, total=None):
+    """Valor del header Server-Timing con las etapas medidas en esta petición."""
+    timings = _request_timings.get() if timings is None else timings
+    parts = []
+    seen = {}
+    for name, detail, seconds in timings or ():
+        # Los nombres se repiten si una etapa corre dos veces: llm, llm-2, ...
+        seen[name] = seen.get(name, 0) + 1
+        entry = name if seen[name] == 1 else f"{name}-{seen[name]}"
+        if detail:
+            entry += f';desc="{_escape(detail)}"'
+        parts.append(f"{entry};dur={seconds * 1000:.1f}")
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
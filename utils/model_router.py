@@ -0,0 +1,334 @@
+import asyncio
+import contextvars
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.context_builder import estimate_tokens
+from utils.deadline import MIN_STAGE_BUDGET, remaining
+from utils.metrics import registry
+from utils.ollama_client import (
+    GROQ_MODEL,
+    GROQ_SMALL_MODEL,
+    ask_ollama,
+    ask_ollama_async,
+    ask_ollama_stream,
+    ask_ollama_stream_async,
+    is_retryable_error,
+)
+
+# "1": se elige el modelo en cada turno; "0": siempre GROQ_MODEL (sin respaldo ni hedging)
+LLM_ROUTING = os.environ.get('LLM_ROUTING', '1') == '1'
+# Preguntas sin datos de la UNAL (tema NINGUNO) de hasta estos tokens van al modelo pequeño...
+LLM_SMALL_MAX_QUESTION_TOKENS = int(os.environ.get('LLM_SMALL_MAX_QUESTION_TOKENS', '40'))
+# ...si el prompt completo (historial incluido) no pasa de estos tokens
+LLM_SMALL_MAX_PROMPT_TOKENS = int(os.environ.get('LLM_SMALL_MAX_PROMPT_TOKENS', '1500'))
+# SLO de latencia por modelo (segundos hasta la respuesta, o hasta el primer token en
+# streaming). Es el timeout de cada llamada: al pasarlo se prueba con el otro modelo.
+# Si el p95 reciente del modelo grande lo supera, los prompts cortos se van al pequeño.
+LLM_SLOS = {
+    GROQ_MODEL: float(os.environ.get('LLM_SLO_LARGE', '15')),
+    GROQ_SMALL_MODEL: float(os.environ.get('LLM_SLO_SMALL', '8')),
+}
+# Hedging: si la respuesta tarda más que el p95 del modelo, se lanza la misma
+# pregunta al otro modelo y gana el primero (cuesta tokens extra; apagado por defecto)
+LLM_HEDGE = os.environ.get('LLM_HEDGE', '0') == '1'
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_WORKERS = int(os.environ.get('LLM_HEDGE_WORKERS', '16'))
+# Latencias recientes que se guardan por modelo para calcular p50/p95
+LLM_LATENCY_WINDOW = 200
+
+LLM_ROUTES = registry.counter(
+    'buho_llm_routes_total', 'Modelo elegido por el router, motivo y resultado', ('model', 'reason', 'outcome'))
+
+_FALLBACK = {GROQ_MODEL: GROQ_SMALL_MODEL, GROQ_SMALL_MODEL: GROQ_MODEL}
+
+
+class ModelRouter:
+    """
+    Elige el modelo de Groq de cada turno según el tema, el tamaño del prompt
+    y la latencia reciente de cada modelo, y lleva la cuenta de las decisiones
+    y sus resultados para poder ajustar la política.
+    """
+
+    def __init__(self, slos=LLM_SLOS):
+        self.slos = dict(slos)
+        # (modelo, 'complete' | 'first_token') -> latencias recientes
+        self._latencies = {}
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def choose(self, topic, prompt, history=None, kind='complete'):
+        """Retorna (modelo, motivo). `kind` es 'first_token' para las respuestas en streaming."""
+        if not LLM_ROUTING:
+            return GROQ_MODEL, 'fixed'
+        prompt_tokens = estimate_tokens(prompt) + sum(
+            estimate_tokens(str(m.get('content', ''))) for m in history or ())
+        if prompt_tokens > LLM_SMALL_MAX_PROMPT_TOKENS:
+            return GROQ_MODEL, 'long_prompt'
+        if topic in (None, 'NINGUNO') and estimate_tokens(prompt) <= LLM_SMALL_MAX_QUESTION_TOKENS:
+            return GROQ_SMALL_MODEL, 'trivial'
+        if self.breaching_slo(GROQ_MODEL, kind):
+            return GROQ_SMALL_MODEL, 'slo'
+        return GROQ_MODEL, 'default'
+
+    def fallback_for(self, model):
+        """El otro modelo, o None si el routing está apagado o a la petición ya no le queda plazo."""
+        left = remaining()
+        if not LLM_ROUTING or (left is not None and left < MIN_STAGE_BUDGET):
+            return None
+        return _FALLBACK.get(model)
+
+    def timeout_for(self, model):
+        """El SLO del modelo, recortado a lo que le queda a la petición."""
+        slo = self.slos.get(model) if LLM_ROUTING else None
+        left = remaining()
+        if left is None:
+            return slo
+        # La respuesta hace falta igual: nunca menos de MIN_STAGE_BUDGET
+        return max(MIN_STAGE_BUDGET, left if slo is None else min(slo, left))
+
+    def observe(self, model, seconds, kind='complete'):
+        with self._lock:
+            window = self._latencies.get((model, kind))
+            if window is None:
+                window = self._latencies[(model, kind)] = deque(maxlen=LLM_LATENCY_WINDOW)
+            window.append(seconds)
+
+    def percentile(self, model, q, kind='complete'):
+        """Percentil `q` (1-99) de las latencias recientes, o None si hay pocas muestras."""
+        with self._lock:
+            samples = list(self._latencies.get((model, kind), ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return statistics.quantiles(samples, n=100)[q - 1]
+
+    def breaching_slo(self, model, kind='complete'):
+        p95 = self.percentile(model, 95, kind)
+        return p95 is not None and p95 > self.slos.get(model, float('inf'))
+
+    def hedge_delay(self, model):
+        """Segundos tras los que conviene lanzar la llamada de respaldo, o None."""
+        if not (LLM_ROUTING and LLM_HEDGE):
+            return None
+        return self.percentile(model, 95)
+
+    def record(self, model, reason, outcome):
+        LLM_ROUTES.inc(model, reason, outcome)
+        with self._lock:
+            key = (model, reason, outcome)
+            self._outcomes[key] = self._outcomes.get(key, 0) + 1
+
+    def stats(self):
+        """Latencias recientes por modelo y conteo de decisiones, para /api/health."""
+        with self._lock:
+            outcomes = dict(self._outcomes)
+            kinds = list(self._latencies)
+        models = {}
+        for model, kind in kinds:
+            models.setdefault(model, {'slo': self.slos.get(model)})[kind] = {
+                'p50': self.percentile(model, 50, kind),
+                'p95': self.percentile(model, 95, kind),
+                'samples': len(self._latencies[(model, kind)]),
+            }
+        return {
+            'enabled': LLM_ROUTING,
+            'hedge': LLM_HEDGE,
+            'models': models,
+            'routes': [{'model': m, 'reason': r, 'outcome': o, 'count': n}
+                       for (m, r, o), n in sorted(outcomes.items())],
+        }
+
+
+router = ModelRouter()
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix='buho-hedge')
+
+
+def _timed_ask(prompt, history, model):
+    start = time.perf_counter()
+    response = ask_ollama(prompt, history=history, model=model, timeout=router.timeout_for(model))
+    if response.get('success'):
+        router.observe(model, time.perf_counter() - start)
+    return response
+
+
+def _submit(prompt, history, model):
+    # Cada hilo con su copia de los contextvars, para que sus etapas lleguen al Server-Timing
+    return _hedge_executor.submit(contextvars.copy_context().run, _timed_ask, prompt, history, model)
+
+
+def _ask_hedged(prompt, history, model, reason, delay):
+    """
+    Retorna (respuesta, modelo que la dio, si se lanzó el respaldo). Si las
+    dos llamadas fallan, la respuesta es la de la última en terminar y la
+    otra queda registrada como 'error'.
+    """
+    primary = _submit(prompt, history, model)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result(), model, False
+
+    backup_model = router.fallback_for(model)
+    if backup_model is None:
+        return primary.result(), model, False
+    backup = _submit(prompt, history, backup_model)
+    pending = {primary: model, backup: backup_model}
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            response, used = future.result(), pending.pop(future)
+            if response.get('success'):
+                # La llamada perdedora sigue en su hilo; solo se ignora su respuesta
+                for loser in pending.values():
+                    router.record(loser, reason, 'hedge_lost')
+                return response, used, True
+            if pending:
+                router.record(used, reason, 'error')
+    return response, used, True
+
+
+def ask_model(prompt, history=None, topic=None):
+    """
+    Como ask_ollama, pero el router elige el modelo; si falla por timeout,
+    429 o 5xx se reintenta una vez con el otro modelo.
+    """
+    model, reason = router.choose(topic, prompt, history)
+    delay = router.hedge_delay(model)
+    if delay is None:
+        response, used, backed_up = _timed_ask(prompt, history, model), model, False
+    else:
+        response, used, backed_up = _ask_hedged(prompt, history, model, reason, delay)
+    if response.get('success'):
+        router.record(used, reason, 'ok' if used == model else 'hedge_won')
+        return response
+
+    # Si el respaldo ya corrió en paralelo, no se vuelve a intentar con él
+    fallback = router.fallback_for(model)
+    if backed_up or fallback is None or not response.get('retryable'):
+        router.record(used, reason, 'error')
+        return response
+
+    router.record(model, reason, 'failed_over')
+    print(f"🔀 {model} no respondió a tiempo; se reintenta con {fallback}")
+    response = _timed_ask(prompt, history, fallback)
+    router.record(fallback, reason, 'fallback' if response.get('success') else 'error')
+    return response
+
+
+async def _timed_ask_async(prompt, history, model):
+    start = time.perf_counter()
+    response = await ask_ollama_async(prompt, history=history, model=model, timeout=router.timeout_for(model))
+    if response.get('success'):
+        router.observe(model, time.perf_counter() - start)
+    return response
+
+
+async def _ask_hedged_async(prompt, history, model, reason, delay):
+    primary = asyncio.ensure_future(_timed_ask_async(prompt, history, model))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result(), model, False
+
+    backup_model = router.fallback_for(model)
+    if backup_model is None:
+        return await primary, model, False
+    backup = asyncio.ensure_future(_timed_ask_async(prompt, history, backup_model))
+    pending = {primary: model, backup: backup_model}
+    while pending:
+        done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            response, used = task.result(), pending.pop(task)
+            if response.get('success'):
+                for loser_task, loser in pending.items():
+                    loser_task.cancel()
+                    router.record(loser, reason, 'hedge_lost')
+                return response, used, True
+            if pending:
+                router.record(used, reason, 'error')
+    return response, used, True
+
+
+async def ask_model_async(prompt, history=None, topic=None):
+    """Versión asíncrona de ask_model; con hedging, la llamada perdedora se cancela."""
+    model, reason = router.choose(topic, prompt, history)
+    delay = router.hedge_delay(model)
+    if delay is None:
+        response, used, backed_up = await _timed_ask_async(prompt, history, model), model, False
+    else:
+        response, used, backed_up = await _ask_hedged_async(prompt, history, model, reason, delay)
+    if response.get('success'):
+        router.record(used, reason, 'ok' if used == model else 'hedge_won')
+        return response
+
+    # Si el respaldo ya corrió en paralelo, no se vuelve a intentar con él
+    fallback = router.fallback_for(model)
+    if backed_up or fallback is None or not response.get('retryable'):
+        router.record(used, reason, 'error')
+        return response
+
+    router.record(model, reason, 'failed_over')
+    print(f"🔀 {model} no respondió a tiempo; se reintenta con {fallback}")
+    response = await _timed_ask_async(prompt, history, fallback)
+    router.record(fallback, reason, 'fallback' if response.get('success') else 'error')
+    return response
+
+
+def ask_model_stream(prompt, history=None, topic=None):
+    """
+    Como ask_ollama_stream, con el modelo elegido por el router. Si falla
+    antes del primer fragmento (timeout, 429, 5xx) se pasa al otro modelo;
+    después ya no, porque el usuario está viendo la respuesta.
+    """
+    model, reason = router.choose(topic, prompt, history, kind='first_token')
+    outcome = 'ok'
+    while True:
+        start = time.perf_counter()
+        started = False
+        try:
+            for token in ask_ollama_stream(prompt, history=history, model=model,
+                                           timeout=router.timeout_for(model)):
+                if not started:
+                    started = True
+                    router.observe(model, time.perf_counter() - start, 'first_token')
+                yield token
+        except Exception as e:
+            fallback = router.fallback_for(model)
+            if started or outcome != 'ok' or fallback is None or not is_retryable_error(e):
+                router.record(model, reason, 'error')
+                raise
+            router.record(model, reason, 'failed_over')
+            print(f"🔀 {model} no respondió a tiempo; se reintenta con {fallback}")
+            model, outcome = fallback, 'fallback'
+            continue
+        router.record(model, reason, outcome)
+        return
+
+
+async def ask_model_stream_async(prompt, history=None, topic=None):
+    """Versión asíncrona de ask_model_stream."""
+    model, reason = router.choose(topic, prompt, history, kind='first_token')
+    outcome = 'ok'
+    while True:
+        start = time.perf_counter()
+        started = False
+        try:
+            async for token in ask_ollama_stream_async(prompt, history=history, model=model,
+                                                       timeout=router.timeout_for(model)):
+                if not started:
+                    started = True
+                    router.observe(model, time.perf_counter() - start, 'first_token')
+                yield token
+        except Exception as e:
+            fallback = router.fallback_for(model)
+            if started or outcome != 'ok' or fallback is None or not is_retryable_error(e):
+                router.record(model, reason, 'error')
+                raise
+            router.record(model, reason, 'failed_over')
+            print(f"🔀 {model} no respondió a tiempo; se reintenta con {fallback}")
+            model, outcome = fallback, 'fallback'
+            continue
+        router.record(model, reason, outcome)
+        return
@@ -1,10 +1,18 @@
 import os
-from groq import Groq
+import time
+
+from utils.deadline import CHAT_LLM_RESERVE, DeadlineExceeded, budget, remaining
+from utils.http_client import get_groq_client, get_async_groq_client
+from utils.metrics import record_llm_usage, record_stage, stage
 
 # Configuración
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
 # Usamos Llama 3.3 70B Versatile, que es MUY inteligente y rápido
 GROQ_MODEL = "llama-3.3-70b-versatile"
+# Modelo pequeño para clasificar y resumir
+GROQ_SMALL_MODEL = "llama-3.1-8b-instant"
+# Timeout de la clasificación con Groq (recortado al plazo de la petición)
+GROQ_CLASSIFY_TIMEOUT = 5
 
 # Personalidad del Búho
 PERSONALIDAD_BUHO = """
@@ -30,7 +38,53 @@ Informacion Adicional:
 """
 
 
-def ask_ollama(prompt, history=None, model=None):
+def build_messages(prompt, history=None):
+    """Arma la lista de mensajes para Groq: personalidad + historial + pregunta."""
+    # 1. System Prompt (Personalidad)
+    messages = [{"role": "system", "content": PERSONALIDAD_BUHO}]
+
+    # 2. Historial (limpiamos el formato para asegurarnos que Groq lo entienda)
+    if history:
+        for msg in history:
+            # Aseguramos que solo pasen roles válidos y contenido strings
+            if "role" in msg and "content" in msg:
+                messages.append({
+                    "role": msg["role"],
+                    "content": str(msg["content"])
+                })
+
+    # 3. Mensaje actual
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _stream_usage(chunk):
+    """Groq manda el uso de tokens en el último fragmento del stream (x_groq.usage)."""
+    x_groq = getattr(chunk, 'x_groq', None)
+    return getattr(x_groq, 'usage', None) if x_groq is not None else None
+
+
+def _with_timeout(client, timeout):
+    """
+    Copia del cliente con otro timeout. Se conservan los reintentos del SDK
+    (un 429 pasajero o una conexión cortada no tumban el turno), salvo que
+    al plazo de la petición no le alcance para todos: entonces queda uno.
+    """
+    if timeout is None:
+        return client
+    left = remaining()
+    if left is not None and left < timeout * (client.max_retries + 1):
+        return client.with_options(timeout=timeout, max_retries=min(1, client.max_retries))
+    return client.with_options(timeout=timeout)
+
+
+def is_retryable_error(error):
+    """True si vale la pena intentar con otro modelo: timeout, 429 o error 5xx de Groq."""
+    from groq import APITimeoutError, InternalServerError, RateLimitError
+    return isinstance(error, (APITimeoutError, InternalServerError, RateLimitError))
+
+
+def ask_ollama(prompt, history=None, model=None, timeout=None):
     """
     NOTA: Aunque la función se llama 'ask_ollama' para no romper app.py,
     ahora se conecta a GROQ (Nube).
@@ -43,45 +97,139 @@ def ask_ollama(prompt, history=None, model=None):
             "error": "Falta la API Key de Groq. Configúrala en los Secrets."
         }
 
+    model = model or GROQ_MODEL
     try:
-        # Inicializamos el cliente de Groq
-        client = Groq(api_key=GROQ_API_KEY)
+        # Cliente de Groq compartido (reutiliza conexiones entre peticiones)
+        client = _with_timeout(get_groq_client(), timeout)
 
-        # Preparamos los mensajes
-        messages = []
+        # Hacemos la petición a la Nube
+        with stage('llm', model):
+            chat_completion = client.chat.completions.create(
+                messages=build_messages(prompt, history),
+                model=model,
+                temperature=0.5,  # Un poco más bajo para ser más preciso con datos
+                max_tokens=1024,
+            )
+        record_llm_usage(model, chat_completion.usage)
 
-        # 1. System Prompt (Personalidad)
-        messages.append({"role": "system", "content": PERSONALIDAD_BUHO})
+        # Obtenemos la respuesta
+        respuesta = chat_completion.choices[0].message.content
+
+        return {"success": True, "content": respuesta, "role": "assistant", "model": model}
 
-        # 2. Historial (limpiamos el formato para asegurarnos que Groq lo entienda)
-        if history:
-            for msg in history:
-                # Aseguramos que solo pasen roles válidos y contenido strings
-                if "role" in msg and "content" in msg:
-                    messages.append({
-                        "role": msg["role"],
-                        "content": str(msg["content"])
-                    })
+    except Exception as e:
+        record_llm_usage(model, None, status='error')
+        print(f"❌ Error con Groq ({model}): {e}")
+        return {"success": False, "error": f"Error en la nube: {str(e)}", "retryable": is_retryable_error(e)}
 
-        # 3. Mensaje actual
-        messages.append({"role": "user", "content": prompt})
 
-        # Hacemos la petición a la Nube
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_MODEL,
-            temperature=0.5,  # Un poco más bajo para ser más preciso con datos
+def ask_ollama_stream(prompt, history=None, model=None, timeout=None):
+    """
+    Igual que ask_ollama, pero en modo streaming: es un generador que va
+    entregando los fragmentos de texto a medida que Groq los produce.
+    Si algo falla lanza la excepción para que el llamador decida qué hacer.
+    """
+    if not GROQ_API_KEY:
+        raise RuntimeError("Falta la API Key de Groq. Configúrala en los Secrets.")
+
+    client = _with_timeout(get_groq_client(), timeout)
+    model = model or GROQ_MODEL
+    start = time.perf_counter()
+    first_token = usage = None
+
+    try:
+        stream = client.chat.completions.create(
+            messages=build_messages(prompt, history),
+            model=model,
+            temperature=0.5,
             max_tokens=1024,
+            stream=True,
         )
 
-        # Obtenemos la respuesta
+        for chunk in stream:
+            usage = _stream_usage(chunk) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    record_stage('llm_first_token', first_token, model)
+                yield delta
+    except Exception:
+        record_llm_usage(model, None, status='error')
+        raise
+
+    record_stage('llm', time.perf_counter() - start, model)
+    record_llm_usage(model, usage)
+
+
+async def ask_ollama_async(prompt, history=None, model=None, timeout=None):
+    """Versión asíncrona de ask_ollama (no bloquea el event loop mientras Groq responde)."""
+    if not GROQ_API_KEY:
+        return {
+            "success": False,
+            "error": "Falta la API Key de Groq. Configúrala en los Secrets."
+        }
+
+    model = model or GROQ_MODEL
+    try:
+        client = _with_timeout(get_async_groq_client(), timeout)
+
+        with stage('llm', model):
+            chat_completion = await client.chat.completions.create(
+                messages=build_messages(prompt, history),
+                model=model,
+                temperature=0.5,
+                max_tokens=1024,
+            )
+        record_llm_usage(model, chat_completion.usage)
+
         respuesta = chat_completion.choices[0].message.content
 
-        return {"success": True, "content": respuesta, "role": "assistant"}
+        return {"success": True, "content": respuesta, "role": "assistant", "model": model}
 
     except Exception as e:
-        print(f"❌ Error con Groq: {e}")
-        return {"success": False, "error": f"Error en la nube: {str(e)}"}
+        record_llm_usage(model, None, status='error')
+        print(f"❌ Error con Groq ({model}): {e}")
+        return {"success": False, "error": f"Error en la nube: {str(e)}", "retryable": is_retryable_error(e)}
+
+
+async def ask_ollama_stream_async(prompt, history=None, model=None, timeout=None):
+    """Versión asíncrona de ask_ollama_stream: generador asíncrono de fragmentos."""
+    if not GROQ_API_KEY:
+        raise RuntimeError("Falta la API Key de Groq. Configúrala en los Secrets.")
+
+    client = _with_timeout(get_async_groq_client(), timeout)
+    model = model or GROQ_MODEL
+    start = time.perf_counter()
+    first_token = usage = None
+
+    try:
+        stream = await client.chat.completions.create(
+            messages=build_messages(prompt, history),
+            model=model,
+            temperature=0.5,
+            max_tokens=1024,
+            stream=True,
+        )
+
+        async for chunk in stream:
+            usage = _stream_usage(chunk) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    record_stage('llm_first_token', first_token, model)
+                yield delta
+    except Exception:
+        record_llm_usage(model, None, status='error')
+        raise
+
+    record_stage('llm', time.perf_counter() - start, model)
+    record_llm_usage(model, usage)
 
 
 def check_ollama_connection():
@@ -98,11 +246,20 @@ def classify_user_intent(user_message):
     Usa un modelo PEQUEÑO y RÁPIDO (Llama 8B) para clasificar la intención del usuario.
     Retorna una categoría: 'ADMISIONES', 'POSGRADOS', 'CALENDARIO', 'PROGRAMAS', 'MATERIAS', o 'NINGUNO'.
     """
+    return classify_user_intents(user_message)[0]
+
+
+def classify_user_intents(user_message):
+    """
+    Como classify_user_intent, pero si la pregunta toca varios temas
+    retorna hasta dos categorías, la más importante primero.
+    """
     if not GROQ_API_KEY:
-        return "NINGUNO"
+        return ["NINGUNO"]
 
     try:
-        client = Groq(api_key=GROQ_API_KEY)
+        # Sin tiempo para preguntarle a Groq se responde sin datos (NINGUNO)
+        client = _with_timeout(get_groq_client(), budget(GROQ_CLASSIFY_TIMEOUT, reserve=CHAT_LLM_RESERVE))
 
         # Prompt estricto para que solo devuelva la categoría
         system_prompt = """
@@ -117,11 +274,12 @@ def classify_user_intent(user_message):
         6. NINGUNO (Si es un saludo, una pregunta general, filosofía, chiste, o no tiene que ver con datos de la web).
 
         REGLA DE ORO: Responde SOLAMENTE con la palabra de la categoría. No digas "La categoría es...". Solo la palabra.
+        Si la pregunta toca dos categorías, responde las dos separadas por coma, la más importante primero (ej: POSGRADOS, ADMISIONES).
         """
 
         completion = client.chat.completions.create(
             # Usamos el modelo 8B Instant (Ultra rápido y ligero)
-            model="llama-3.1-8b-instant",
+            model=GROQ_SMALL_MODEL,
             messages=[{
                 "role": "system",
                 "content": system_prompt
@@ -130,16 +288,66 @@ def classify_user_intent(user_message):
                 "content": user_message
             }],
             temperature=0,  # Temperatura 0 para que sea preciso y robótico
-            max_tokens=10)
+            max_tokens=16)
+        record_llm_usage(GROQ_SMALL_MODEL, completion.usage)
 
-        category = completion.choices[0].message.content.strip().upper()
+        answer = completion.choices[0].message.content.strip().upper()
 
         # Limpieza extra por si la IA se pone creativa (quitamos puntos o espacios)
-        category = category.replace(".", "").replace("'", "").replace('"', "")
+        answer = answer.replace(".", "").replace("'", "").replace('"', "")
+        categories = [c.strip() for c in answer.split(",") if c.strip()] or ["NINGUNO"]
 
-        print(f"🧠 Cerebro Pequeño clasificó: '{user_message}' -> [{category}]")
-        return category
+        print(f"🧠 Cerebro Pequeño clasificó: '{user_message}' -> {categories}")
+        return categories
 
+    except DeadlineExceeded:
+        print(f"⏱️  Sin tiempo para clasificar con Groq: '{user_message}' -> [NINGUNO]")
+        return ["NINGUNO"]
     except Exception as e:
+        record_llm_usage(GROQ_SMALL_MODEL, None, status='error')
         print(f"❌ Error en clasificación: {e}")
-        return "NINGUNO"
+        return ["NINGUNO"]
+
+
+def summarize_conversation(previous_summary, messages):
+    """
+    Usa el modelo pequeño (Llama 8B) para fusionar el resumen anterior con
+    mensajes nuevos. Retorna el resumen actualizado o None si falla.
+    """
+    if not GROQ_API_KEY:
+        return None
+
+    try:
+        client = get_groq_client()
+
+        transcript = "\n".join(
+            f"{'Usuario' if msg.get('role') == 'user' else 'Búho'}: {msg.get('content', '')}"
+            for msg in messages
+        )
+
+        system_prompt = """
+        Resumes conversaciones entre un estudiante y Búho, el asistente de la UNAL.
+        Te doy el resumen que ya existe y los mensajes nuevos. Devuelve UN solo resumen
+        actualizado, en español, de máximo 120 palabras, con los datos concretos que el
+        usuario dio o pidió (carrera, sede, fechas, dudas pendientes). Sin saludos ni relleno.
+        """
+
+        completion = client.chat.completions.create(
+            model=GROQ_SMALL_MODEL,
+            messages=[{
+                "role": "system",
+                "content": system_prompt
+            }, {
+                "role": "user",
+                "content": f"Resumen actual:\n{previous_summary or '(vacío)'}\n\nMensajes nuevos:\n{transcript}"
+            }],
+            temperature=0,
+            max_tokens=300)
+        record_llm_usage(GROQ_SMALL_MODEL, completion.usage)
+
+        return completion.choices[0].message.content.strip()
+
+    except Exception as e:
+        record_llm_usage(GROQ_SMALL_MODEL, None, status='error')
+        print(f"❌ Error al resumir la conversación: {e}")
+        return None
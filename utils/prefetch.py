@@ -0,0 +1,184 @@
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado, cada proceso refresca por su cuenta
+    fcntl = None
+
+from utils.scraper import SCRAPE_CACHE_TTLS, SCRAPERS, is_valid_scrape
+from utils.snapshots import PREFETCH_MODE, snapshot_store
+from utils.metrics import record_stage
+
+# Cada tema se refresca a esta fracción de su TTL, con ±PREFETCH_JITTER de variación
+PREFETCH_FRACTION = 0.5
+PREFETCH_JITTER = 0.1
+# Espera tras un fallo: se duplica en cada fallo seguido, hasta el intervalo normal
+PREFETCH_BACKOFF_BASE = 60
+# Solo un programador por máquina refresca las capturas (candado en su carpeta);
+# los demás procesos reintentan tomarlo cada tanto, por si el que lo tiene muere
+PREFETCH_LOCK_FILE = '.prefetch.lock'
+PREFETCH_LOCK_RETRY = 60
+
+
+class PrefetchScheduler:
+    """
+    Refresca periódicamente la captura de cada tema en segundo plano, con
+    jitter (para que los temas no coincidan) y backoff exponencial si falla.
+    """
+
+    def __init__(self, scrapers=SCRAPERS, store=snapshot_store, intervals=None, clock=time.time):
+        self.scrapers = scrapers
+        self.store = store
+        self._clock = clock
+        self.intervals = {
+            topic: (intervals or {}).get(topic, SCRAPE_CACHE_TTLS.get(topic, 3600) * PREFETCH_FRACTION)
+            for topic in scrapers
+        }
+        self._state = {topic: {'next_run': 0.0, 'failures': 0, 'last_error': None} for topic in scrapers}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def _schedule(self, topic, delay):
+        jitter = 1 + random.uniform(-PREFETCH_JITTER, PREFETCH_JITTER)
+        self._state[topic]['next_run'] = self._clock() + delay * jitter
+
+    def refresh(self, topic):
+        """Corre el scraper del tema y guarda la captura. Retorna True si funcionó."""
+        state = self._state[topic]
+        start = time.perf_counter()
+        try:
+            data = self.scrapers[topic]()
+            record_stage('prefetch', time.perf_counter() - start, topic)
+            if not is_valid_scrape(data):
+                raise RuntimeError(f"el scraper devolvió: {data!r}"[:200])
+            self.store.save(topic, data)
+        except Exception as e:
+            with self._lock:
+                state['failures'] += 1
+                state['last_error'] = str(e)
+                backoff = min(PREFETCH_BACKOFF_BASE * 2 ** (state['failures'] - 1), self.intervals[topic])
+                self._schedule(topic, backoff)
+            print(f"⚠️  Prefetch de {topic} falló ({state['failures']} seguidos), reintento en {backoff:.0f} s: {e}")
+            return False
+
+        with self._lock:
+            state['failures'] = 0
+            state['last_error'] = None
+            self._schedule(topic, self.intervals[topic])
+        print(f"🔄 Captura de {topic} actualizada en {time.perf_counter() - start:.1f} s")
+        return True
+
+    def request_refresh(self, topic):
+        """Adelanta el refresco de un tema (por ejemplo, si todavía no tiene captura)."""
+        if topic not in self._state:
+            return
+        with self._lock:
+            self._state[topic]['next_run'] = 0.0
+        self._wake.set()
+
+    def _due_topics(self):
+        now = self._clock()
+        with self._lock:
+            return [t for t, s in self._state.items() if s['next_run'] <= now]
+
+    def _seconds_to_next(self):
+        with self._lock:
+            next_run = min(s['next_run'] for s in self._state.values())
+        return max(0.0, next_run - self._clock())
+
+    def prime(self):
+        """Programa cada tema según la edad de su captura en disco (arranque en caliente)."""
+        now = self._clock()
+        for topic in self.scrapers:
+            snapshot = self.store.get(topic)
+            with self._lock:
+                if snapshot is None:
+                    self._state[topic]['next_run'] = 0.0
+                else:
+                    age = now - snapshot['fetched_at']
+                    self._schedule(topic, max(0.0, self.intervals[topic] - age))
+
+    def acquire_host_lock(self):
+        """
+        Toma el candado de la carpeta de capturas sin bloquear. Con varios
+        workers en modo inline (o junto a scripts/prefetch_worker.py) solo
+        uno lo consigue, y es el único que scrapea y escribe.
+        """
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        os.makedirs(self.store.root, exist_ok=True)
+        lock_file = open(os.path.join(self.store.root, PREFETCH_LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    @property
+    def is_leader(self):
+        return self._lock_file is not None
+
+    def run_forever(self):
+        waiting = False
+        while not self.acquire_host_lock():
+            if not waiting:
+                print("⏸️  Otro proceso ya refresca las capturas; este solo las lee")
+                waiting = True
+            if self._stop.wait(PREFETCH_LOCK_RETRY):
+                return
+        self.prime()
+        while not self._stop.is_set():
+            for topic in self._due_topics():
+                if self._stop.is_set():
+                    return
+                self.refresh(topic)
+            self._wake.wait(timeout=self._seconds_to_next())
+            self._wake.clear()
+
+    def start(self):
+        """Arranca el programador en un hilo daemon (modo inline)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name='buho-prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            return {
+                topic: {
+                    'next_refresh_in': round(max(0.0, s['next_run'] - now), 1),
+                    'failures': s['failures'],
+                    'last_error': s['last_error'],
+                }
+                for topic, s in self._state.items()
+            }
+
+
+scheduler = PrefetchScheduler()
+
+
+def snapshot_stats():
+    """Edad de cada captura y, si el programador corre aquí, su estado."""
+    stats = {'mode': PREFETCH_MODE, 'topics': snapshot_store.stats()}
+    if PREFETCH_MODE == 'inline':
+        stats['refreshing_here'] = scheduler.is_leader
+    if PREFETCH_MODE == 'inline' and scheduler.is_leader:
+        for topic, state in scheduler.stats().items():
+            stats['topics'].setdefault(topic, {}).update(state)
+    return stats
@@ -0,0 +1,234 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Backend de contadores: "memory" (un solo proceso), "sqlite:///ruta.db"
+# (compartido entre workers de la misma máquina) o "redis://host:6379/0"
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Cada cuánto se barren las claves vencidas (segundos)
+RATE_LIMIT_SWEEP_INTERVAL = 60
+
+
+class MemoryBackend:
+    """Contadores en un dict con expiración; solo sirve dentro de un proceso."""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._data = {}  # key -> (valor, expira_en)
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + RATE_LIMIT_SWEEP_INTERVAL
+
+    def _sweep(self, now):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + RATE_LIMIT_SWEEP_INTERVAL
+        expired = [k for k, (_, expires_at) in self._data.items() if expires_at <= now]
+        for k in expired:
+            del self._data[k]
+
+    def incr(self, key, amount, ttl):
+        now = self._clock()
+        with self._lock:
+            self._sweep(now)
+            value, expires_at = self._data.get(key, (0, 0))
+            if expires_at <= now:
+                value, expires_at = 0, now + ttl
+            value += amount
+            self._data[key] = (value, expires_at)
+            return value
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, 0))
+            return value if expires_at > now else 0
+
+    def set(self, key, value, ttl):
+        now = self._clock()
+        with self._lock:
+            self._sweep(now)
+            self._data[key] = (value, now + ttl)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    Contadores en un archivo SQLite (modo WAL), compartidos por todos los
+    workers de gunicorn que corren en la misma máquina.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._local = threading.local()
+        self._next_sweep = 0
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits ('
+            ' key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS rate_limits_expires ON rate_limits (expires_at)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _sweep(self, conn, now):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + RATE_LIMIT_SWEEP_INTERVAL
+        conn.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+
+    def incr(self, key, amount, ttl):
+        now = self._clock()
+        conn = self._conn()
+        self._sweep(conn, now)
+        row = conn.execute(
+            'INSERT INTO rate_limits (key, value, expires_at) VALUES (:key, :amount, :expires)'
+            ' ON CONFLICT(key) DO UPDATE SET'
+            '  value = CASE WHEN expires_at <= :now THEN :amount ELSE value + :amount END,'
+            '  expires_at = CASE WHEN expires_at <= :now THEN :expires ELSE expires_at END'
+            ' RETURNING value',
+            {'key': key, 'amount': amount, 'expires': now + ttl, 'now': now},
+        ).fetchone()
+        return row[0]
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM rate_limits WHERE key = ? AND expires_at > ?', (key, self._clock())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set(self, key, value, ttl):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO rate_limits (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, self._clock() + ttl),
+        )
+
+    def delete(self, *keys):
+        self._conn().executemany('DELETE FROM rate_limits WHERE key = ?', [(k,) for k in keys])
+
+
+class RedisBackend:
+    """Contadores en Redis (o cualquier servidor que hable su protocolo)."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("Falta el paquete 'redis' para usar RATE_LIMIT_BACKEND=redis://")
+        self._client = redis.Redis.from_url(url)
+
+    def incr(self, key, amount, ttl):
+        pipe = self._client.pipeline()
+        pipe.set(key, 0, ex=math.ceil(ttl), nx=True)
+        pipe.incrby(key, amount)
+        _, value = pipe.execute()
+        return int(value)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return int(value) if value is not None else 0
+
+    def set(self, key, value, ttl):
+        self._client.set(key, int(value), ex=math.ceil(ttl))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+
+def create_backend(spec=None):
+    """Crea el backend según RATE_LIMIT_BACKEND."""
+    spec = spec or RATE_LIMIT_BACKEND
+    if spec.startswith('sqlite:///'):
+        return SQLiteBackend(spec[len('sqlite:///'):])
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(spec)
+    return MemoryBackend()
+
+
+class SlidingWindowCounter:
+    """
+    Contador de ventana deslizante aproximada: guarda solo el conteo de la
+    ventana actual y la anterior, y pondera la anterior por la fracción que
+    todavía se solapa. Memoria y tiempo constantes por clave.
+    """
+
+    def __init__(self, backend, prefix, window, clock=time.time):
+        self.backend = backend
+        self.prefix = prefix
+        self.window = window
+        self._clock = clock
+
+    def _keys(self, key, now):
+        bucket = int(now // self.window)
+        return (f"{self.prefix}:{key}:{bucket}", f"{self.prefix}:{key}:{bucket - 1}",
+                1 - (now - bucket * self.window) / self.window)
+
+    def count(self, key):
+        current, previous, weight = self._keys(key, self._clock())
+        return self.backend.get(previous) * weight + self.backend.get(current)
+
+    def add(self, key):
+        current, _, _ = self._keys(key, self._clock())
+        self.backend.incr(current, 1, ttl=2 * self.window)
+
+    def hit(self, key, limit):
+        """Cuenta un evento si no se supera `limit`. Retorna True si se permitió."""
+        current, previous, weight = self._keys(key, self._clock())
+        count = self.backend.incr(current, 1, ttl=2 * self.window)
+        if self.backend.get(previous) * weight + count > limit:
+            self.backend.incr(current, -1, ttl=2 * self.window)
+            return False
+        return True
+
+    def reset(self, key):
+        current, previous, _ = self._keys(key, self._clock())
+        self.backend.delete(current, previous)
+
+
+class LoginLockout:
+    """Bloquea una cuenta tras demasiados intentos fallidos en la ventana."""
+
+    def __init__(self, backend, max_attempts, duration, clock=time.time):
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.duration = duration
+        self._clock = clock
+        self.failures = SlidingWindowCounter(backend, 'login', duration, clock=clock)
+
+    def locked_for(self, key):
+        """Segundos que le quedan al bloqueo (0 si no está bloqueada)."""
+        locked_until = self.backend.get(f"lock:{key}")
+        return max(0, locked_until - self._clock())
+
+    def lock(self, key):
+        self.backend.set(f"lock:{key}", math.ceil(self._clock() + self.duration), ttl=self.duration)
+
+    def too_many_failures(self, key):
+        return self.failures.count(key) >= self.max_attempts
+
+    def record_failure(self, key):
+        self.failures.add(key)
+
+    def reset(self, key):
+        self.failures.reset(key)
+        self.backend.delete(f"lock:{key}")
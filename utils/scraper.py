@@ -1,12 +1,52 @@
-from bs4 import BeautifulSoup
-import requests
-from utils.ollama_client import classify_user_intent
-from utils.search_tool import search_google
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+
+from utils.http_client import HTTP_TIMEOUT, SCRAPE_READ_DEADLINE, fetch_page
+from utils.html_extract import compile_selectors, page_text_blocks, select_texts
+from utils.intent_classifier import detect_intents
+from utils.search_tool import search_google, search_cache
+from utils.cache import TTLCache
+from utils.search_index import get_index
+from utils.answer_cache import snapshot_version
+from utils.context_select import SCRAPED_CONTEXT_TOKENS, select_context
+from utils.snapshots import PREFETCH_MODE, snapshot_store
+from utils.metrics import CONTEXT_SOURCE, registry, stage
+from utils.deadline import CHAT_LLM_RESERVE, DeadlineExceeded, budget, remaining
+
+
+# Resultados ya extraídos por página: si la caché HTTP dice que la página no
+# cambió (304), se reutilizan en lugar de volver a parsear el HTML
+PARSED_PAGE_TTL = 24 * 3600
+parsed_pages = TTLCache(max_entries=64)
+
+
+def _extract(page, key, extractor):
+    if not page.from_cache:
+        result = extractor(page.content)
+        if not page.truncated:
+            parsed_pages.set((page.url, key), result, ttl=PARSED_PAGE_TTL)
+        return result
+    return parsed_pages.get_or_load((page.url, key), lambda: extractor(page.content),
+                                    ttl=PARSED_PAGE_TTL, cache_if=lambda _: True)
+
+
+def page_texts(url, selectors=None, timeout=5):
+    """
+    Descarga `url` (con caché HTTP y tope de tamaño) y extrae sus textos:
+    los nodos de `selectors`, o el contenido genérico de la página si es None.
+    """
+    # Dentro de una petición de chat, acotado a lo que le queda sin tocar lo de Groq
+    page = fetch_page(url, timeout=budget(timeout, reserve=CHAT_LLM_RESERVE),
+                      deadline=budget(SCRAPE_READ_DEADLINE, reserve=CHAT_LLM_RESERVE))
+    if selectors is None:
+        return _extract(page, None, page_text_blocks)
+    return _extract(page, selectors, lambda content: select_texts(content, selectors))
+
 
-try:
-    from ddgs import DDGS
-except ImportError:
-    from duckduckgo_search import DDGS
+# Tope del texto que devuelve un scraper, para no guardar páginas enormes en
+# las capturas; lo que va al prompt lo decide después select_context()
+SCRAPE_MAX_CHARS = 50000
 
 
 # --- FUNCIÓN NUEVA: EL LECTOR DE PÁGINAS ---
@@ -16,59 +56,33 @@ def visit_and_scrape_url(url):
     """
     try:
         print(f"🕵️‍♂️ Entrando a leer: {url}")
-        headers = {
-            'User-Agent':
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Eliminamos basura (menús, scripts, estilos)
-        for element in soup(["script", "style", "nav", "footer", "header"]):
-            element.decompose()
-
-        # Buscamos tablas (donde suelen estar las fechas) y párrafos
-        content = []
-
-        # 1. Intentar leer tablas (Ideal para calendarios)
-        tables = soup.find_all("table")
-        for table in tables:
-            rows = table.find_all("tr")
-            for row in rows:
-                cols = [
-                    ele.get_text(strip=True)
-                    for ele in row.find_all(["td", "th"])
-                ]
-                if cols:
-                    content.append(" | ".join(cols))
-
-        # 2. Leer párrafos importantes
-        paragraphs = soup.find_all(["p", "li", "h2", "h3"])
-        for p in paragraphs:
-            text = p.get_text(strip=True)
-            if len(text) > 20:  # Solo texto sustancial
-                content.append(text)
-
-        # Unimos todo y cortamos si es muy largo (para no saturar a la IA)
+        # Un solo parseo con lxml: filas de tablas (donde suelen estar las
+        # fechas) y luego párrafos/ítems/títulos, sin menús ni scripts
+        content = page_texts(url, timeout=HTTP_TIMEOUT)
+
+        # Se guarda la página completa; al armar el prompt se eligen los
+        # fragmentos que responden la pregunta (utils/context_select.py)
         full_text = "\n".join(content)
-        return full_text[:4000]  # Devolvemos los primeros 4000 caracteres
+        return full_text[:SCRAPE_MAX_CHARS]
 
     except Exception as e:
         print(f"❌ Error leyendo la página {url}: {e}")
         return None
 
 
+# Selectores que usa cada scraper (se compilan una vez a XPath)
+ADMISIONES_SELECTORS = compile_selectors(".list-group-item")
+POSGRADOS_SELECTORS = compile_selectors("h3, h4, p, .list-group-item")
+PROGRAMAS_SELECTORS = compile_selectors(".list-group-item")
+MATERIAS_SELECTORS = compile_selectors("h3, h4, a, p, .list-group-item")
+
+
 def scrape_admisiones_unal():
     """Extrae información de la página de admisiones de la UNAL."""
     try:
         url = "https://admisiones.unal.edu.co/"
-        response = requests.get(url, timeout=5)
-        soup = BeautifulSoup(response.text, "html.parser")
-        titles = [
-            t.get_text(strip=True) for t in soup.select(".list-group-item")
-        ]
-        return "\n".join(titles[:10])
+        titles = page_texts(url, ADMISIONES_SELECTORS)
+        return "\n".join(titles)[:SCRAPE_MAX_CHARS]
     except Exception as e:
         print(f"Error scraping admisiones: {e}")
         return ""
@@ -78,13 +92,8 @@ def scrape_posgrados_unal():
     """Extrae información de la página de posgrados de la UNAL."""
     try:
         url = "https://posgrados.unal.edu.co/"
-        response = requests.get(url, timeout=5)
-        soup = BeautifulSoup(response.text, "html.parser")
-        titles = [
-            t.get_text(strip=True)
-            for t in soup.select("h3, h4, p, .list-group-item")
-        ]
-        return "\n".join(titles[:15])
+        titles = page_texts(url, POSGRADOS_SELECTORS)
+        return "\n".join(titles)[:SCRAPE_MAX_CHARS]
     except Exception as e:
         print(f"Error scraping posgrados: {e}")
         return ""
@@ -94,13 +103,11 @@ def scrape_programas_unal():
     """Extrae información de programas curriculares de la UNAL."""
     try:
         url = "https://admisiones.unal.edu.co/pregrado/oferta-de-programas-curriculares/"
-        response = requests.get(url, timeout=5)
-        soup = BeautifulSoup(response.text, "html.parser")
         programas = [
-            t.get_text(strip=True) for t in soup.select(".list-group-item")
-            if "Créditos" not in t.get_text()
+            t for t in page_texts(url, PROGRAMAS_SELECTORS)
+            if "Créditos" not in t
         ]
-        return "\n".join(programas[:20])
+        return "\n".join(programas)[:SCRAPE_MAX_CHARS]
     except Exception as e:
         print(f"Error scraping programas: {e}")
         return ""
@@ -110,19 +117,28 @@ def scrape_materias_unal():
     """Extrae información del SIA de la UNAL."""
     try:
         url = "https://sia.unal.edu.co/"
-        response = requests.get(url, timeout=5)
-        soup = BeautifulSoup(response.text, "html.parser")
         materias = [
-            t.get_text(strip=True)
-            for t in soup.select("h3, h4, a, p, .list-group-item")
-            if "Créditos" not in t.get_text()
+            t for t in page_texts(url, MATERIAS_SELECTORS)
+            if "Créditos" not in t
         ]
-        return "\n".join(materias[:20])
+        return "\n".join(materias)[:SCRAPE_MAX_CHARS]
     except Exception as e:
         print(f"Error scraping materias: {e}")
         return ""
 
 
+class DegradedScrape(str):
+    """
+    Texto parcial que un scraper devuelve cuando no pudo leer la fuente (por
+    ejemplo, solo el resumen del buscador). Sirve para responder, pero no se
+    guarda en la caché ni reemplaza una captura buena (ver is_valid_scrape).
+    """
+
+
+# Clave de la URL fijada del calendario (tema:sede)
+CALENDARIO_PIN_KEY = "CALENDARIO:bogota"
+
+
 def scrape_calendario_unal():
     """
     1. Busca en Google.
@@ -134,26 +150,24 @@ def scrape_calendario_unal():
         query = "Calendario Académico Sede Bogotá 2025 fechas detalladas"
         print(f"🔎 Buscando link para: {query}")
 
-        # Usamos DDGS directamente para obtener el link crudo
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=1))
-
-        if not results:
+        # La URL queda fijada para el tema; solo se busca si no hay una vigente
+        resolved = search_cache.resolve_url(CALENDARIO_PIN_KEY, query)
+        if not resolved:
             return "No encontré resultados en la web."
 
-        # Tomamos el primer resultado
-        top_result = results[0]
-        url = top_result['href']
-        snippet = top_result['body']
+        url, snippet = resolved
 
         # PASO CRÍTICO: Entrar a la página
         page_content = visit_and_scrape_url(url)
 
         if page_content:
+            search_cache.pin_succeeded(CALENDARIO_PIN_KEY)
             return f"FUENTE: {url}\n\nCONTENIDO EXTRAÍDO DE LA PÁGINA:\n{page_content}"
         else:
+            # Si la URL fijada deja de leerse, tras varios fallos se vuelve a buscar
+            search_cache.pin_failed(CALENDARIO_PIN_KEY)
             # Si falló la lectura, devolvemos al menos el resumen de Google
-            return f"No pude leer la página completa, pero Google dice esto: {snippet} (Link: {url})"
+            return DegradedScrape(f"No pude leer la página completa, pero Google dice esto: {snippet} (Link: {url})")
 
     except Exception as e:
         print(f"Error en proceso de calendario: {e}")
@@ -174,43 +188,259 @@ def scrape_seguridad_unal():
     else:
         return "No pude leer la página de seguridad en este momento."
 
+# --- CACHÉ DE SCRAPERS ---
+# Las páginas de la UNAL cambian como mucho un par de veces al día, así que
+# guardamos el resultado de cada scraper en memoria. TTL en segundos por tema;
+# durante STALE_TTL se sigue sirviendo lo guardado mientras se refresca en 2º plano.
+SCRAPE_CACHE_TTLS = {
+    "ADMISIONES": 6 * 3600,
+    "POSGRADOS": 6 * 3600,
+    "PROGRAMAS": 24 * 3600,
+    "MATERIAS": 12 * 3600,
+    "SEGURIDAD": 24 * 3600,
+    "CALENDARIO": 12 * 3600,
+}
+SCRAPE_CACHE_STALE_TTL = 3600
+SCRAPE_CACHE_MAX_ENTRIES = 32
+
+# Mensajes de error que devuelven los scrapers y que no queremos guardar
+_SCRAPE_FAILURES = {
+    "No encontré resultados en la web.",
+    "Error buscando calendario.",
+    "No pude leer la página de seguridad en este momento.",
+}
+
+scrape_cache = TTLCache(max_entries=SCRAPE_CACHE_MAX_ENTRIES)
+
+
+def is_valid_scrape(data):
+    """False si el scraper no trajo nada, devolvió uno de sus mensajes de error o un resultado parcial."""
+    return bool(data) and data not in _SCRAPE_FAILURES and not isinstance(data, DegradedScrape)
+
+
+def _cached_scrape(topic, scraper):
+    """Ejecuta el scraper del tema pasando por la caché (con single-flight)."""
+    return scrape_cache.get_or_load(
+        topic,
+        scraper,
+        ttl=SCRAPE_CACHE_TTLS.get(topic, 3600),
+        stale_ttl=SCRAPE_CACHE_STALE_TTL,
+        cache_if=is_valid_scrape,
+        # Si otra petición ya está scrapeando el tema, se la espera solo mientras haya plazo
+        wait_timeout=remaining(CHAT_LLM_RESERVE),
+    )
+
+
+def scrape_cache_stats():
+    """Contadores de aciertos/fallos y edad de cada tema en la caché."""
+    return scrape_cache.stats()
+
+
+# Scraper de cada tema que detecta el clasificador
+SCRAPERS = {
+    "ADMISIONES": scrape_admisiones_unal,
+    "POSGRADOS": scrape_posgrados_unal,
+    "CALENDARIO": scrape_calendario_unal,
+    "PROGRAMAS": scrape_programas_unal,
+    "SEGURIDAD": scrape_seguridad_unal,
+    "MATERIAS": scrape_materias_unal,
+}
+
+
+# --- ÍNDICE LOCAL ---
+# Si existe el índice que arma scripts/build_index.py, se responde con los
+# fragmentos más relevantes de las páginas de cada tema, sin salir a la red.
+TOPIC_SOURCES = {
+    "ADMISIONES": ("https://admisiones.unal.edu.co/",),
+    "POSGRADOS": ("https://posgrados.unal.edu.co/",),
+    "PROGRAMAS": ("https://admisiones.unal.edu.co/pregrado/",),
+    "MATERIAS": ("https://sia.unal.edu.co/",),
+    "CALENDARIO": ("https://unal.edu.co/calendario-academico",),
+    "SEGURIDAD": ("https://dfa.bogota.unal.edu.co/",),
+}
+RETRIEVAL_TOP_K = 5
+RETRIEVAL_MAX_CHARS = 4000
+
+
+def retrieve_passages(user_message, topic, max_chars=RETRIEVAL_MAX_CHARS):
+    """
+    Los fragmentos del índice local más relevantes para la pregunta, dentro
+    de las páginas del tema. Retorna (texto, versión del índice) o None.
+    """
+    index = get_index()
+    if index is None or topic not in TOPIC_SOURCES:
+        return None
+    pages = index.pages_with_prefix(TOPIC_SOURCES[topic])
+    if not pages:
+        return None
+
+    results = index.search(user_message, k=RETRIEVAL_TOP_K, pages=pages)
+    if not results:
+        return None
+
+    passages = []
+    for _, chunk in results:
+        header = f"FUENTE: {chunk['url']}"
+        if chunk['heading']:
+            header += f" ({chunk['heading']})"
+        passages.append(f"{header}\n{chunk['text']}")
+    return "\n\n".join(passages)[:max_chars], index.version
+
+
 def detect_topic_and_scrape(user_message):
     """
         Usa IA para detectar el tema y decide qué scrapear.
         """
-    # 1. Llamamos al modelo pequeño para que decida
-    topic = classify_user_intent(user_message)
+    _, data, _ = classify_and_scrape(user_message)
+    return data
 
-    data = None
 
-    # 2. Ejecutamos el scraper según lo que dijo la IA
-    if topic == "ADMISIONES":
-        print("running scraper: ADMISIONES")
-        data = scrape_admisiones_unal()
+# --- VARIOS TEMAS ---
+# Si la pregunta toca varios temas, sus scrapers corren a la vez en este pool:
+# la latencia es la de la fuente más lenta y no la suma
+SCRAPE_WORKERS = int(os.environ.get('SCRAPE_WORKERS', '8'))
+# Lo máximo que se espera a un tema; si tarda más se responde con los demás
+# (su scraper sigue y deja el resultado en la caché para la próxima)
+SCRAPE_TOPIC_TIMEOUT = float(os.environ.get('SCRAPE_TOPIC_TIMEOUT', '15'))
 
-    elif topic == "POSGRADOS":
-        print("running scraper: POSGRADOS")
-        data = scrape_posgrados_unal()
+_scrape_executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix='buho-scrape')
 
-    elif topic == "CALENDARIO":
-        print("running search: CALENDARIO")
-        # Esto ahora llamará a DuckDuckGo en lugar de Beautiful Soup
-        data = scrape_calendario_unal()
+# Si el clasificador local duda y se le pregunta a Groq, mientras tanto se arma
+# el contexto del tema que adivinó; si Groq dice otra cosa, se descarta
+SPECULATIVE_SCRAPE = os.environ.get('SPECULATIVE_SCRAPE', '1') == '1'
+SPECULATION = registry.counter(
+    'buho_speculative_context_total', 'Contexto adelantado con el tema del clasificador local', ('outcome',))
 
-    elif topic == "PROGRAMAS":
-        print("running scraper: PROGRAMAS")
-        data = scrape_programas_unal()
 
-    elif topic == "SEGURIDAD":
-        print("running scraper: SEGURIDAD")
-        data = scrape_seguridad_unal()
+def _topic_timeout():
+    """Lo que se espera a un tema: SCRAPE_TOPIC_TIMEOUT recortado al plazo de la petición."""
+    left = remaining(CHAT_LLM_RESERVE)
+    return SCRAPE_TOPIC_TIMEOUT if left is None else min(SCRAPE_TOPIC_TIMEOUT, left)
 
-    elif topic == "MATERIAS":
-        print("running scraper: MATERIAS")
-        data = scrape_materias_unal()
 
-    else:
+def classify_and_scrape(user_message, ranked=None):
+    """
+    Igual que detect_topic_and_scrape, pero retorna también el tema y la
+    versión del contenido usado: (tema, datos, versión). Si la pregunta
+    toca varios temas, el tema es "POSGRADOS+ADMISIONES" y los datos de
+    cada uno van juntos, en orden de prioridad. `ranked` es el resultado
+    de rank_locally si ya se calculó.
+    """
+    speculative = {}
+
+    def speculate(guess):
+        if SPECULATIVE_SCRAPE and guess in SCRAPERS:
+            speculative[guess] = _scrape_executor.submit(contextvars.copy_context().run, topic_context,
+                                                         user_message, guess)
+
+    # 1. Clasificador local; solo si duda se llama al modelo pequeño de Groq
+    with stage('classify'):
+        topics = detect_intents(user_message, before_llm=speculate, ranked=ranked)
+
+    if len(topics) == 1 and topics[0] in speculative:
+        SPECULATION.inc('used')
+        topic = topics[0]
+        try:
+            data, version = speculative[topic].result(timeout=_topic_timeout())
+        except FutureTimeout:
+            print(f"⏱️  {topic} no respondió a tiempo; se responde sin contexto")
+            CONTEXT_SOURCE.inc(topic, 'skipped')
+            return topic, None, None
+        except Exception as e:
+            print(f"❌ Error armando el contexto de {topic}: {e}")
+            return topic, None, None
+        return topic, data, version
+    for future in speculative.values():
+        # Si no empezó, no ocupa un hilo del pool; lo que ya bajó queda en la caché
+        future.cancel()
+        SPECULATION.inc('dropped')
+
+    if len(topics) == 1:
+        data, version = topic_context(user_message, topics[0])
+        return topics[0], data, version
+
+    # Cada tema recibe su parte del presupuesto del prompt
+    share = len(topics)
+    futures = {
+        topic: _scrape_executor.submit(contextvars.copy_context().run, topic_context,
+                                       user_message, topic, share)
+        for topic in topics
+    }
+    wait(futures.values(), timeout=_topic_timeout())
+
+    parts, versions = [], []
+    for topic in topics:
+        future = futures[topic]
+        if not future.done():
+            print(f"⏱️  {topic} no respondió a tiempo; se responde con los demás temas")
+            CONTEXT_SOURCE.inc(topic, 'skipped')
+            continue
+        try:
+            data, version = future.result()
+        except Exception as e:
+            print(f"❌ Error armando el contexto de {topic}: {e}")
+            continue
+        if data:
+            parts.append(f"[{topic}]\n{data}")
+            versions.append(version and f"{topic}:{version}")
+    if not parts:
+        return "+".join(topics), None, None
+    # Si falta algún tema o cambia alguno, cambia la versión (y la caché de respuestas)
+    version = None if None in versions else "+".join(versions)
+    return "+".join(topics), "\n\n".join(parts), version
+
+
+def topic_context(user_message, topic, share=1):
+    """
+    El contexto de un tema para la pregunta: (datos, versión). `share` es
+    entre cuántos temas se reparte el presupuesto del prompt.
+    """
+    # 2. Primero el índice local: milisegundos y ninguna petición saliente
+    with stage('retrieve', topic):
+        retrieved = retrieve_passages(user_message, topic, max_chars=RETRIEVAL_MAX_CHARS // share)
+    if retrieved:
+        print(f"📚 Fragmentos del índice local para: {topic}")
+        CONTEXT_SOURCE.inc(topic, 'index')
+        data, version = retrieved
+        return data, f"index-{version}"
+
+    scraper = SCRAPERS.get(topic)
+    if scraper is None:
         print("🤖 Tema 'NINGUNO' o desconocido. No se hace scraping.")
-        return None
-
-    return data
+        CONTEXT_SOURCE.inc(topic, 'none')
+        return None, None
+
+    # 3. Captura guardada por el programador de refrescos: la petición nunca scrapea
+    if PREFETCH_MODE != 'off':
+        snapshot = snapshot_store.get(topic)
+        if snapshot is None:
+            print(f"⏳ Todavía no hay captura de {topic}; se pide un refresco")
+            CONTEXT_SOURCE.inc(topic, 'missing')
+            if PREFETCH_MODE == 'inline':
+                from utils.prefetch import scheduler
+                scheduler.request_refresh(topic)
+            return None, None
+        CONTEXT_SOURCE.inc(topic, 'snapshot')
+        with stage('select', topic):
+            data = select_context(user_message, snapshot['data'], SCRAPED_CONTEXT_TOKENS // share)
+        return data, snapshot['version']
+
+    # 4. Sin capturas: scraper en vivo (con caché en memoria) según lo que dijo la IA
+    print(f"🕷️  Scrapeando en vivo: {topic}")
+    try:
+        with stage('scrape', topic):
+            budget(None, reserve=CHAT_LLM_RESERVE)
+            data = _cached_scrape(topic, scraper)
+    except (DeadlineExceeded, TimeoutError):
+        # Mejor responder sin contexto que pasarse del plazo
+        print(f"⏱️  Sin tiempo para scrapear {topic}; se responde sin contexto")
+        CONTEXT_SOURCE.inc(topic, 'skipped')
+        return None, None
+    CONTEXT_SOURCE.inc(topic, 'live')
+    if not data:
+        return data, None
+
+    version = snapshot_version(data)
+    with stage('select', topic):
+        data = select_context(user_message, data, SCRAPED_CONTEXT_TOKENS // share)
+    return data, version
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Archivo donde se guardan las búsquedas y las URLs fijadas ("" = solo memoria)
+SEARCH_CACHE_PATH = os.environ.get('SEARCH_CACHE_PATH', os.path.join('data', 'search_cache.db'))
+# Resultados de una búsqueda: frescos durante TTL; hasta TTL + STALE_TTL se
+# siguen usando mientras se refrescan en segundo plano
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', str(24 * 3600)))
+SEARCH_CACHE_STALE_TTL = 7 * 24 * 3600
+# URL fijada por tema: se usa sin buscar durante PIN_TTL, se vuelve a
+# resolver en segundo plano pasado PIN_REFRESH_AFTER y se descarta tras
+# PIN_MAX_FAILURES lecturas fallidas seguidas
+PIN_TTL = 30 * 24 * 3600
+PIN_REFRESH_AFTER = 24 * 3600
+PIN_MAX_FAILURES = 2
+
+
+class SearchCache:
+    """
+    Caché persistente (SQLite) de búsquedas web: consulta -> resultados, y
+    tema -> URL canónica fijada, para no buscar en cada pregunta.
+    `searcher(query, max_results)` es la función que de verdad busca.
+    """
+
+    def __init__(self, path, searcher, clock=time.time):
+        self.path = path
+        self._searcher = searcher
+        self._clock = clock
+        self._local = threading.local()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0,
+                       'pin_hits': 0, 'pins': 0, 'pin_evictions': 0, 'errors': 0}
+        self._shared = None
+        if not path:
+            # Sin archivo: una sola base en memoria compartida por todos los hilos
+            self._shared = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS search_results ('
+            ' query TEXT NOT NULL, max_results INTEGER NOT NULL, results TEXT NOT NULL,'
+            ' fetched_at REAL NOT NULL, PRIMARY KEY (query, max_results))'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS pinned_urls ('
+            ' key TEXT PRIMARY KEY, url TEXT NOT NULL, snippet TEXT, query TEXT NOT NULL,'
+            ' pinned_at REAL NOT NULL, failures INTEGER NOT NULL DEFAULT 0)'
+        )
+
+    def _conn(self):
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _in_background(self, name, func, *args):
+        """Ejecuta `func` en un hilo, a lo sumo una vez a la vez por `name`."""
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+            self._stats['refreshes'] += 1
+
+        def run():
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"⚠️  Error refrescando la búsqueda '{name}': {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(name)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # --- Búsquedas ---
+
+    def _fetch(self, query, max_results):
+        """Busca de verdad y guarda el resultado (si trajo algo)."""
+        results = list(self._searcher(query, max_results) or [])
+        if results:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO search_results (query, max_results, results, fetched_at)'
+                ' VALUES (?, ?, ?, ?)',
+                (query, max_results, json.dumps(results, ensure_ascii=False), self._clock()),
+            )
+        return results
+
+    def search(self, query, max_results=3):
+        """Resultados de la búsqueda (lista de dicts de DDGS), desde la caché si se puede."""
+        row = self._conn().execute(
+            'SELECT results, fetched_at FROM search_results WHERE query = ? AND max_results = ?',
+            (query, max_results),
+        ).fetchone()
+        if row is not None:
+            results, fetched_at = json.loads(row[0]), row[1]
+            age = self._clock() - fetched_at
+            if age < SEARCH_CACHE_TTL:
+                self._count('hits')
+                return results
+            if age < SEARCH_CACHE_TTL + SEARCH_CACHE_STALE_TTL:
+                self._count('stale_hits')
+                self._in_background(f"search:{query}:{max_results}", self._fetch, query, max_results)
+                return results
+
+        self._count('misses')
+        try:
+            return self._fetch(query, max_results)
+        except Exception:
+            self._count('errors')
+            raise
+
+    def forget(self, query):
+        self._conn().execute('DELETE FROM search_results WHERE query = ?', (query,))
+
+    # --- URLs fijadas ---
+
+    def _pin(self, key, query, result):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO pinned_urls (key, url, snippet, query, pinned_at, failures)'
+            ' VALUES (?, ?, ?, ?, ?, 0)',
+            (key, result['href'], result.get('body', result.get('snippet', '')), query, self._clock()),
+        )
+        self._count('pins')
+
+    def _repin(self, key, query):
+        """Vuelve a resolver la URL del tema con una búsqueda nueva."""
+        results = self._fetch(query, 1)
+        if results and results[0].get('href'):
+            self._pin(key, query, results[0])
+
+    def resolve_url(self, key, query):
+        """
+        URL canónica para `key` (por ejemplo 'CALENDARIO:bogota'): la fijada
+        si sigue vigente; si no, la primera de la búsqueda `query`, que queda
+        fijada. Retorna (url, resumen del buscador) o None.
+        """
+        row = self._conn().execute(
+            'SELECT url, snippet, pinned_at FROM pinned_urls WHERE key = ?', (key,)
+        ).fetchone()
+        if row is not None:
+            url, snippet, pinned_at = row
+            age = self._clock() - pinned_at
+            if age < PIN_TTL:
+                self._count('pin_hits')
+                if age >= PIN_REFRESH_AFTER:
+                    self._in_background(f"pin:{key}", self._repin, key, query)
+                return url, snippet
+
+        results = self.search(query, max_results=1)
+        if not results or not results[0].get('href'):
+            return None
+        self._pin(key, query, results[0])
+        return results[0]['href'], results[0].get('body', results[0].get('snippet', ''))
+
+    def pin_succeeded(self, key):
+        self._conn().execute('UPDATE pinned_urls SET failures = 0 WHERE key = ?', (key,))
+
+    def pin_failed(self, key):
+        """
+        Registra que la URL fijada no se pudo leer. Tras PIN_MAX_FAILURES
+        fallos seguidos se descarta, junto con la búsqueda que la produjo.
+        """
+        conn = self._conn()
+        conn.execute('UPDATE pinned_urls SET failures = failures + 1 WHERE key = ?', (key,))
+        row = conn.execute('SELECT url, query, failures FROM pinned_urls WHERE key = ?', (key,)).fetchone()
+        if row is not None and row[2] >= PIN_MAX_FAILURES:
+            print(f"🗑️  URL fijada descartada para {key}: {row[0]}")
+            conn.execute('DELETE FROM pinned_urls WHERE key = ?', (key,))
+            self.forget(row[1])
+            self._count('pin_evictions')
+
+    def stats(self):
+        now = self._clock()
+        pins = {
+            key: {'url': url, 'age_seconds': round(now - pinned_at, 1), 'failures': failures}
+            for key, url, pinned_at, failures in self._conn().execute(
+                'SELECT key, url, pinned_at, failures FROM pinned_urls')
+        }
+        with self._lock:
+            return dict(self._stats, pinned=pins)
@@ -0,0 +1,283 @@
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+
+from utils.intent_classifier import normalize_text
+
+# Carpeta donde scripts/build_index.py deja el índice; CURRENT apunta a la versión vigente
+SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR', os.path.join('data', 'search_index'))
+# Cada cuánto se revisa si hay un índice nuevo en disco (segundos)
+SEARCH_INDEX_RELOAD_INTERVAL = 60
+# Parámetros de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Palabras por fragmento al partir las páginas
+CHUNK_WORDS = 120
+
+_STOPWORDS = {
+    'a', 'al', 'ante', 'como', 'con', 'cual', 'cuales', 'de', 'del', 'desde', 'donde', 'e',
+    'el', 'ella', 'en', 'entre', 'es', 'esa', 'ese', 'esta', 'este', 'esto', 'fue', 'ha',
+    'hay', 'la', 'las', 'le', 'les', 'lo', 'los', 'me', 'mi', 'mis', 'muy', 'no', 'o', 'para',
+    'pero', 'por', 'que', 'se', 'ser', 'si', 'sin', 'sobre', 'son', 'su', 'sus', 'te', 'tu',
+    'un', 'una', 'uno', 'unos', 'unas', 'y', 'ya', 'yo',
+}
+
+# Formato de los archivos binarios (enteros sin signo de 32 bits)
+_POSTING_TYPE = 'I'
+
+
+def stem(word):
+    """Recorte de plurales y vocal final: 'clases' y 'clase' quedan iguales."""
+    if len(word) > 4 and word.endswith('es'):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s'):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Términos indexables del texto: normalizados, sin stopwords y recortados."""
+    return [
+        stem(word)
+        for word in re.findall(r"\w+", normalize_text(text))
+        if word not in _STOPWORDS and (not word.isdigit() or len(word) == 4)
+    ]
+
+
+def chunk_blocks(blocks, size=CHUNK_WORDS):
+    """
+    Agrupa los bloques de texto de una página (títulos, párrafos, filas de
+    tabla) en fragmentos de ~`size` palabras. Cada fragmento lleva el último
+    título visto, para que no pierda su contexto.
+    Retorna una lista de dicts {'heading', 'text'}.
+    """
+    chunks = []
+    heading = ''
+    current, words = [], 0
+
+    def flush():
+        nonlocal current, words
+        if current:
+            chunks.append({'heading': heading, 'text': '\n'.join(current)})
+        current, words = [], 0
+
+    for kind, text in blocks:
+        if kind == 'heading':
+            flush()
+            heading = text
+            continue
+        n = len(text.split())
+        if words and words + n > size:
+            flush()
+        current.append(text)
+        words += n
+    flush()
+    return chunks
+
+
+def write_index(path, pages):
+    """
+    Escribe un índice BM25 en la carpeta `path` a partir de las páginas
+    rastreadas ({url: {'title', 'chunks': [...]}}). Archivos:
+
+    - vocab.json: término -> [desplazamiento, df] dentro de postings.bin
+    - postings.bin: pares (fragmento, frecuencia) uint32 agrupados por término
+    - lengths.bin / chunk_pages.bin: largo y página de cada fragmento
+    - chunks.jsonl + chunks.idx: texto de cada fragmento y su desplazamiento
+    - meta.json: número de fragmentos, largo promedio y URLs de las páginas
+    """
+    os.makedirs(path, exist_ok=True)
+    postings = {}
+    lengths = array(_POSTING_TYPE)
+    chunk_pages = array(_POSTING_TYPE)
+    offsets = array('Q')
+    urls = sorted(pages)
+
+    with open(os.path.join(path, 'chunks.jsonl'), 'wb') as out:
+        for page_id, url in enumerate(urls):
+            page = pages[url]
+            for chunk in page.get('chunks', []):
+                chunk_id = len(lengths)
+                terms = tokenize(f"{page.get('title', '')} {chunk['heading']} {chunk['text']}")
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append((chunk_id, tf))
+                lengths.append(len(terms))
+                chunk_pages.append(page_id)
+                offsets.append(out.tell())
+                record = {'url': url, 'title': page.get('title', ''),
+                          'heading': chunk['heading'], 'text': chunk['text']}
+                out.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        offsets.append(out.tell())
+
+    vocab = {}
+    flat = array(_POSTING_TYPE)
+    for term in sorted(postings):
+        vocab[term] = [len(flat) // 2, len(postings[term])]
+        for chunk_id, tf in postings[term]:
+            flat.append(chunk_id)
+            flat.append(tf)
+
+    for name, data in (('postings.bin', flat), ('lengths.bin', lengths),
+                       ('chunk_pages.bin', chunk_pages), ('chunks.idx', offsets)):
+        with open(os.path.join(path, name), 'wb') as out:
+            data.tofile(out)
+
+    with open(os.path.join(path, 'vocab.json'), 'w', encoding='utf-8') as out:
+        json.dump(vocab, out, ensure_ascii=False, separators=(',', ':'))
+
+    meta = {
+        'chunks': len(lengths),
+        'avg_length': (sum(lengths) / len(lengths)) if lengths else 0.0,
+        'urls': urls,
+        'built_at': time.time(),
+    }
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as out:
+        json.dump(meta, out, ensure_ascii=False)
+
+
+def _map(path):
+    """Abre un archivo en solo lectura y lo mapea a memoria (None si está vacío)."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class SearchIndex:
+    """
+    Índice BM25 de solo lectura. Las listas de postings, largos y textos se
+    leen con mmap, así que abrirlo es casi instantáneo y el sistema operativo
+    comparte las páginas entre workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = os.path.basename(os.path.normpath(path))
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, 'vocab.json'), encoding='utf-8') as f:
+            self.vocab = json.load(f)
+
+        self._maps = [_map(os.path.join(path, name)) for name in
+                      ('postings.bin', 'lengths.bin', 'chunk_pages.bin', 'chunks.idx', 'chunks.jsonl')]
+        postings, lengths, chunk_pages, offsets, self._chunks = self._maps
+        self._postings = memoryview(postings).cast(_POSTING_TYPE) if postings else memoryview(b'')
+        self._lengths = memoryview(lengths).cast(_POSTING_TYPE) if lengths else memoryview(b'')
+        self._chunk_pages = memoryview(chunk_pages).cast(_POSTING_TYPE) if chunk_pages else memoryview(b'')
+        self._offsets = memoryview(offsets).cast('Q') if offsets else memoryview(b'')
+        self.urls = self.meta['urls']
+        self._prefix_pages = {}
+
+    def __len__(self):
+        return self.meta['chunks']
+
+    def pages_with_prefix(self, prefixes):
+        """IDs de las páginas cuya URL empieza por alguno de los prefijos."""
+        prefixes = tuple(prefixes)
+        pages = self._prefix_pages.get(prefixes)
+        if pages is None:
+            pages = self._prefix_pages[prefixes] = frozenset(
+                i for i, url in enumerate(self.urls) if url.startswith(prefixes)
+            )
+        return pages
+
+    def chunk(self, chunk_id):
+        start, end = self._offsets[chunk_id], self._offsets[chunk_id + 1]
+        return json.loads(self._chunks[start:end])
+
+    def search(self, query, k=5, pages=None):
+        """
+        Los `k` fragmentos con mejor puntaje BM25 para la consulta, como
+        lista de (puntaje, fragmento). `pages` restringe a esos IDs de página.
+        """
+        n = len(self)
+        if not n:
+            return []
+        avg_length = self.meta['avg_length'] or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            postings = self._postings[2 * offset:2 * (offset + df)]
+            for i in range(0, 2 * df, 2):
+                chunk_id, tf = postings[i], postings[i + 1]
+                if pages is not None and self._chunk_pages[chunk_id] not in pages:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(round(score, 3), self.chunk(chunk_id)) for chunk_id, score in best]
+
+    def close(self):
+        for view in (self._postings, self._lengths, self._chunk_pages, self._offsets):
+            view.release()
+        for mapped in self._maps:
+            if mapped is not None:
+                mapped.close()
+
+
+def current_index_path(root=SEARCH_INDEX_DIR):
+    """Carpeta de la versión vigente según el archivo CURRENT, o None."""
+    try:
+        with open(os.path.join(root, 'CURRENT'), encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(root, name) if name else None
+
+
+def publish_index(root, name):
+    """Marca `name` como versión vigente (reemplazo atómico de CURRENT)."""
+    tmp = os.path.join(root, 'CURRENT.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, 'CURRENT'))
+
+
+_index = None
+_index_path = None
+_next_check = 0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Índice vigente, o None si todavía no se ha construido. Revisa CURRENT
+    cada SEARCH_INDEX_RELOAD_INTERVAL segundos para tomar reconstrucciones
+    sin reiniciar el servidor.
+    """
+    global _index, _index_path, _next_check
+    now = time.monotonic()
+    if now < _next_check:
+        return _index
+    with _index_lock:
+        if now < _next_check:
+            return _index
+        _next_check = now + SEARCH_INDEX_RELOAD_INTERVAL
+        path = current_index_path()
+        if path == _index_path:
+            return _index
+        try:
+            index = SearchIndex(path) if path else None
+        except (OSError, ValueError) as e:
+            print(f"⚠️  No se pudo abrir el índice de búsqueda {path}: {e}")
+            return _index
+        # El índice anterior no se cierra: puede haber búsquedas en curso usándolo
+        _index, _index_path = index, path
+        if index is not None:
+            print(f"📚 Índice de búsqueda cargado: {index.version} ({len(index)} fragmentos)")
+        return _index
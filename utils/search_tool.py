@@ -10,6 +10,25 @@ except ImportError:
         print("❌ Error crítico: No se encuentra la librería de búsqueda.")
         DDGS = None
 
+from utils.deadline import CHAT_LLM_RESERVE, budget
+from utils.search_cache import SEARCH_CACHE_PATH, SearchCache
+
+# Timeout de una búsqueda en DDGS (recortado al plazo de la petición)
+DDGS_TIMEOUT = 5
+
+
+def ddgs_text(query, max_results=3):
+    """Búsqueda de texto en DDGS, sin caché."""
+    print(f"🌎 Buscando en internet: {query}")
+    # La librería DDGS es muy rápida
+    with DDGS(timeout=budget(DDGS_TIMEOUT, reserve=CHAT_LLM_RESERVE)) as ddgs:
+        return list(ddgs.text(query, max_results=max_results))
+
+
+# Búsquedas repetidas y URLs fijadas por tema, persistentes entre reinicios
+search_cache = SearchCache(SEARCH_CACHE_PATH, searcher=ddgs_text)
+
+
 def search_google(query, max_results=3):
     """
     Busca en internet y devuelve un resumen.
@@ -18,10 +37,7 @@ def search_google(query, max_results=3):
         return "Error: Librería de búsqueda no instalada."
 
     try:
-        print(f"🌎 Buscando en internet: {query}")
-        # La librería DDGS es muy rápida
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=max_results))
+        results = search_cache.search(query, max_results=max_results)
 
         if not results:
             return None
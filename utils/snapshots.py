@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+# "inline": el servidor refresca las capturas en un hilo propio (utils/prefetch.py).
+# "worker": las refresca `python -m scripts.prefetch_worker`; el servidor solo lee.
+# "off": sin capturas; los scrapers corren en la petición (con caché en memoria).
+PREFETCH_MODE = os.environ.get('PREFETCH_MODE', 'inline')
+# Carpeta de las capturas de cada tema: <TEMA>/latest.json + versiones anteriores
+SCRAPE_SNAPSHOT_DIR = os.environ.get('SCRAPE_SNAPSHOT_DIR', os.path.join('data', 'snapshots'))
+# Versiones que se conservan por tema
+SNAPSHOT_KEEP_VERSIONS = 5
+# Cada cuánto se relee el disco por si otro proceso (el worker) escribió capturas
+SNAPSHOT_RELOAD_INTERVAL = 30
+
+
+def _write_json(path, payload):
+    # Temporal con nombre único: si dos procesos guardan a la vez, cada uno
+    # reemplaza el archivo con el suyo completo
+    directory, name = os.path.split(path)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix=f".{name}.",
+                                     suffix='.tmp', delete=False) as f:
+        tmp = f.name
+        try:
+            json.dump(payload, f, ensure_ascii=False)
+        except BaseException:
+            f.close()
+            os.remove(tmp)
+            raise
+    os.replace(tmp, path)
+
+
+class SnapshotStore:
+    """
+    Capturas versionadas del resultado de cada scraper en disco. El camino de
+    las peticiones solo lee de aquí (memoria, recargada del disco cada tanto);
+    quien escribe es el programador de refrescos (utils/prefetch.py).
+    """
+
+    def __init__(self, root=SCRAPE_SNAPSHOT_DIR, clock=time.time):
+        self.root = root
+        self._clock = clock
+        self._snapshots = {}  # tema -> {'topic', 'data', 'version', 'fetched_at'}
+        self._mtimes = {}
+        self._next_reload = 0
+        self._lock = threading.Lock()
+
+    def _latest_path(self, topic):
+        return os.path.join(self.root, topic, 'latest.json')
+
+    def reload(self, force=False):
+        """Relee las capturas que cambiaron en disco (como mucho cada SNAPSHOT_RELOAD_INTERVAL)."""
+        now = time.monotonic()
+        if not force and now < self._next_reload:
+            return
+        self._next_reload = now + SNAPSHOT_RELOAD_INTERVAL
+        try:
+            topics = [t for t in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, t))]
+        except OSError:
+            return
+        for topic in topics:
+            path = self._latest_path(topic)
+            try:
+                mtime = os.path.getmtime(path)
+                if self._mtimes.get(topic) == mtime:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            with self._lock:
+                self._snapshots[topic] = snapshot
+                self._mtimes[topic] = mtime
+
+    def get(self, topic):
+        """Última captura del tema, o None si nunca se ha guardado una."""
+        self.reload()
+        with self._lock:
+            return self._snapshots.get(topic)
+
+    def save(self, topic, data):
+        """
+        Guarda el resultado de un refresco. Si el contenido cambió se crea una
+        versión nueva; si no, solo se actualiza la hora en que se comprobó.
+        """
+        version = hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+        fetched_at = self._clock()
+        directory = os.path.join(self.root, topic)
+        os.makedirs(directory, exist_ok=True)
+
+        snapshot = {'topic': topic, 'data': data, 'version': version, 'fetched_at': fetched_at}
+        with self._lock:
+            previous = self._snapshots.get(topic)
+        if previous is None or previous['version'] != version:
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime(fetched_at))
+            _write_json(os.path.join(directory, f"{stamp}-{version}.json"), snapshot)
+            self._prune(directory)
+        _write_json(self._latest_path(topic), snapshot)
+
+        with self._lock:
+            self._snapshots[topic] = snapshot
+            self._mtimes[topic] = os.path.getmtime(self._latest_path(topic))
+        return snapshot
+
+    def _prune(self, directory):
+        versions = sorted(name for name in os.listdir(directory)
+                          if name.endswith('.json') and name != 'latest.json')
+        for name in versions[:-SNAPSHOT_KEEP_VERSIONS]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Versión y antigüedad de la captura de cada tema."""
+        self.reload()
+        now = self._clock()
+        with self._lock:
+            return {
+                topic: {
+                    'version': snap['version'],
+                    'fetched_at': snap['fetched_at'],
+                    'age_seconds': round(now - snap['fetched_at'], 1),
+                }
+                for topic, snap in self._snapshots.items()
+            }
+
+
+snapshot_store = SnapshotStore()
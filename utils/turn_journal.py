@@ -0,0 +1,307 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Journal local de turnos pendientes de escribir en Firestore ("" = escribir de una vez)
+TURN_JOURNAL_PATH = os.environ.get('TURN_JOURNAL_PATH', os.path.join('data', 'turn_journal.db'))
+# Cada cuánto el hilo de fondo junta los turnos nuevos en un batch
+TURN_JOURNAL_FLUSH_INTERVAL = float(os.environ.get('TURN_JOURNAL_FLUSH_INTERVAL', '0.5'))
+# Turnos que se reclaman por vuelta (cada turno son 2 mensajes + 1 update)
+TURN_JOURNAL_BATCH_TURNS = 100
+# Segundos que un proceso tiene reclamados unos turnos antes de que otro los pueda tomar
+TURN_JOURNAL_LEASE = 60
+# Reintentos con backoff exponencial; tras el último el turno queda como fallido
+TURN_JOURNAL_MAX_ATTEMPTS = 10
+TURN_JOURNAL_BACKOFF_BASE = 2
+TURN_JOURNAL_BACKOFF_MAX = 300
+# Días que se recuerda el último messageCount asignado a cada conversación
+TURN_JOURNAL_COUNTS_DAYS = 7
+# Días que se conservan los turnos fallidos (para revisarlos) antes de borrarlos
+TURN_JOURNAL_FAILED_DAYS = 7
+
+
+class TurnDropped(Exception):
+    """
+    El escritor no podrá escribir nunca estos turnos (por ejemplo, la
+    conversación fue borrada): se descartan sin reintentar.
+    """
+
+
+class TurnJournal:
+    """
+    Cola durable (SQLite en modo WAL) de los turnos de chat que todavía no están
+    en Firestore. La petición solo agrega el turno aquí y responde; un hilo los
+    escribe en batches con reintentos, y lo que quede pendiente al reiniciar se
+    reenvía al arrancar. `writer(turns)` es quien escribe de verdad en Firestore
+    y debe ser idempotente (el mismo turno puede llegar dos veces); lanza
+    TurnDropped si los turnos ya no tienen dónde escribirse.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._flush_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {'appended': 0, 'flushed': 0, 'retries': 0, 'failed': 0, 'dropped': 0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS pending_turns ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, turn_id TEXT NOT NULL,'
+            ' conversation_id TEXT NOT NULL, first_seq INTEGER NOT NULL, message_count INTEGER NOT NULL,'
+            ' messages TEXT NOT NULL, updates TEXT NOT NULL, created_at REAL NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL DEFAULT 0,'
+            ' claimed_until REAL NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, last_error TEXT)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS pending_turns_conversation'
+                     ' ON pending_turns (conversation_id, failed)')
+        # Último messageCount asignado en esta máquina, aunque el turno ya se haya
+        # enviado: así otro worker con la conversación en caché no repite secuencias
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS conversation_counts ('
+            ' conversation_id TEXT PRIMARY KEY, message_count INTEGER NOT NULL, updated_at REAL NOT NULL)'
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # FULL: el turno tiene que sobrevivir a un corte de luz, ya se le respondió al usuario
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    # --- Lado de las peticiones ---
+
+    def append(self, conversation_id, base_seq, messages, updates=None):
+        """
+        Guarda un turno. Los números de secuencia siguen a `base_seq` (el
+        messageCount leído de Firestore) o al último asignado en esta máquina.
+        Retorna el nuevo messageCount de la conversación.
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            first_seq = max(base_seq, self.message_count(conversation_id))
+            message_count = first_seq + len(messages)
+            conn.execute(
+                'INSERT OR REPLACE INTO conversation_counts (conversation_id, message_count, updated_at)'
+                ' VALUES (?, ?, ?)',
+                (conversation_id, message_count, self._clock()),
+            )
+            conn.execute(
+                'INSERT INTO pending_turns (turn_id, conversation_id, first_seq, message_count,'
+                ' messages, updates, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (uuid.uuid4().hex, conversation_id, first_seq, message_count,
+                 json.dumps(messages, ensure_ascii=False), json.dumps(updates or {}, ensure_ascii=False),
+                 self._clock()),
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._count('appended')
+        self._wake.set()
+        return message_count
+
+    def message_count(self, conversation_id):
+        """Último messageCount asignado aquí a la conversación (0 si no se conoce)."""
+        row = self._conn().execute(
+            'SELECT MAX(n) FROM (SELECT message_count AS n FROM conversation_counts WHERE conversation_id = ?'
+            ' UNION ALL SELECT MAX(message_count) FROM pending_turns WHERE conversation_id = ? AND failed = 0)',
+            (conversation_id, conversation_id),
+        ).fetchone()
+        return row[0] or 0
+
+    def pending_messages(self, conversation_id):
+        """Mensajes de los turnos pendientes, con el formato de conversation_store."""
+        messages = []
+        rows = self._conn().execute(
+            'SELECT turn_id, first_seq, messages, created_at FROM pending_turns'
+            ' WHERE conversation_id = ? AND failed = 0 ORDER BY first_seq',
+            (conversation_id,),
+        )
+        for turn_id, first_seq, payload, created_at in rows:
+            created = datetime.fromtimestamp(created_at, timezone.utc)
+            for offset, msg in enumerate(json.loads(payload)):
+                messages.append({
+                    'id': f"{turn_id}-{offset}",
+                    'seq': first_seq + offset,
+                    'role': msg['role'],
+                    'content': msg['content'],
+                    'createdAt': created,
+                })
+        return messages
+
+    def discard(self, conversation_id):
+        """Olvida los turnos pendientes de una conversación (por ejemplo, al borrarla)."""
+        conn = self._conn()
+        conn.execute('DELETE FROM pending_turns WHERE conversation_id = ?', (conversation_id,))
+        conn.execute('DELETE FROM conversation_counts WHERE conversation_id = ?', (conversation_id,))
+
+    # --- Lado del hilo que escribe en Firestore ---
+
+    def _claim(self, limit):
+        """Reserva los turnos listos para enviar, para que otro proceso no los mande también."""
+        now = self._clock()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, turn_id, conversation_id, first_seq, message_count, messages, updates,'
+                ' created_at, attempts FROM pending_turns'
+                ' WHERE failed = 0 AND next_attempt <= ? AND claimed_until <= ? ORDER BY id LIMIT ?',
+                (now, now, limit),
+            ).fetchall()
+            conn.executemany('UPDATE pending_turns SET claimed_until = ? WHERE id = ?',
+                             [(now + TURN_JOURNAL_LEASE, row[0]) for row in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [
+            {'id': row[0], 'turn_id': row[1], 'conversation_id': row[2], 'first_seq': row[3],
+             'message_count': row[4], 'messages': json.loads(row[5]), 'updates': json.loads(row[6]),
+             'created_at': row[7], 'attempts': row[8]}
+            for row in rows
+        ]
+
+    def _done(self, turns):
+        self._conn().executemany('DELETE FROM pending_turns WHERE id = ?', [(t['id'],) for t in turns])
+        self._count('flushed', len(turns))
+
+    def _dropped(self, turns, error):
+        self._conn().executemany('DELETE FROM pending_turns WHERE id = ?', [(t['id'],) for t in turns])
+        self._count('dropped', len(turns))
+        for turn in turns:
+            print(f"🗑️  Turno {turn['turn_id']} de {turn['conversation_id']} descartado: {error}")
+
+    def _failed(self, turns, error):
+        now = self._clock()
+        updates = []
+        for turn in turns:
+            attempts = turn['attempts'] + 1
+            backoff = min(TURN_JOURNAL_BACKOFF_BASE ** attempts, TURN_JOURNAL_BACKOFF_MAX)
+            failed = int(attempts >= TURN_JOURNAL_MAX_ATTEMPTS)
+            updates.append((attempts, now + backoff, failed, str(error)[:500], turn['id']))
+            self._count('failed' if failed else 'retries')
+            if failed:
+                print(f"❌ Turno {turn['turn_id']} de {turn['conversation_id']} descartado tras "
+                      f"{attempts} intentos: {error}")
+        self._conn().executemany(
+            'UPDATE pending_turns SET attempts = ?, next_attempt = ?, claimed_until = 0,'
+            ' failed = ?, last_error = ? WHERE id = ?',
+            updates,
+        )
+
+    def flush(self, writer):
+        """Envía todo lo que esté listo. Retorna cuántos turnos quedaron escritos."""
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                turns = self._claim(TURN_JOURNAL_BATCH_TURNS)
+                if not turns:
+                    return flushed
+                try:
+                    writer(turns)
+                except Exception as e:
+                    # Un solo batch por conversación, para que una mala no frene a las demás
+                    print(f"⚠️  Falló el batch de {len(turns)} turnos, se reintenta por conversación: {e}")
+                    flushed += self._flush_by_conversation(turns, writer)
+                    continue
+                self._done(turns)
+                flushed += len(turns)
+                if len(turns) < TURN_JOURNAL_BATCH_TURNS:
+                    self._prune()
+                    return flushed
+
+    def _prune(self):
+        """Borra los turnos fallidos viejos y los contadores de conversaciones inactivas."""
+        now = self._clock()
+        conn = self._conn()
+        conn.execute('DELETE FROM pending_turns WHERE failed = 1 AND created_at < ?',
+                     (now - TURN_JOURNAL_FAILED_DAYS * 86400,))
+        conn.execute(
+            'DELETE FROM conversation_counts WHERE updated_at < ? AND conversation_id NOT IN'
+            ' (SELECT conversation_id FROM pending_turns)',
+            (now - TURN_JOURNAL_COUNTS_DAYS * 86400,),
+        )
+
+    def _flush_by_conversation(self, turns, writer):
+        groups = {}
+        for turn in turns:
+            groups.setdefault(turn['conversation_id'], []).append(turn)
+        flushed = 0
+        for group in groups.values():
+            try:
+                writer(group)
+            except TurnDropped as e:
+                self._dropped(group, e)
+                continue
+            except Exception as e:
+                self._failed(group, e)
+                continue
+            self._done(group)
+            flushed += len(group)
+        return flushed
+
+    def _run(self, writer):
+        while not self._stop.is_set():
+            try:
+                self.flush(writer)
+            except Exception as e:
+                print(f"❌ Error en el journal de turnos: {e}")
+            self._wake.wait(timeout=TURN_JOURNAL_FLUSH_INTERVAL)
+            self._wake.clear()
+            # Deja que se junten los turnos que llegan casi a la vez
+            self._stop.wait(TURN_JOURNAL_FLUSH_INTERVAL / 5)
+
+    def start(self, writer):
+        """Arranca el hilo que escribe en Firestore; primero reenvía lo que quedó pendiente."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(writer,), name='buho-journal', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop, writer)
+        return self
+
+    def stop(self, writer=None):
+        """Detiene el hilo y, si se pasa `writer`, intenta un último envío."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if writer is not None:
+            try:
+                self.flush(writer)
+            except Exception as e:
+                print(f"⚠️  Turnos sin enviar al cerrar (se reenviarán al arrancar): {e}")
+
+    def stats(self):
+        row = self._conn().execute(
+            'SELECT SUM(failed = 0), SUM(failed = 1), MIN(CASE WHEN failed = 0 THEN created_at END)'
+            ' FROM pending_turns'
+        ).fetchone()
+        pending, failed, oldest = row[0] or 0, row[1] or 0, row[2]
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(pending=pending, failed_pending=failed,
+                     oldest_pending_seconds=round(self._clock() - oldest, 1) if oldest else None)
+        return stats
+
+
+turn_journal = TurnJournal(TURN_JOURNAL_PATH) if TURN_JOURNAL_PATH else None